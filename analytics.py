@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+from issuers import read_holdings
+
+'''
+Array-based analysis over the cached daily closes.
+
+The per-ticker {date: close} series in history_cache.json are aligned into
+one dates x tickers price matrix, and everything here works on that matrix
+with numpy, so many allocations or strategies are evaluated together as a
+single matrix product rather than one loop per candidate.
+'''
+
+TRADING_DAYS = 252
+
+def history_series(cache, ticker, column='close'):
+    # {date: value}; extra columns such as 'adjclose' fall back to the close where missing
+    if column != 'close':
+        series = cache.get('_columns', {}).get(column, {}).get(ticker)
+        if series:
+            return series
+    return cache.get(ticker, {})
+
+def price_matrix(cache, tickers, column='close'):
+    """Aligned closes for tickers: (dates, T x N array).
+
+    Gaps (a holiday on one exchange, a missed fetch) carry the previous close
+    forward; dates before every ticker has a first price are dropped.
+    """
+    frame = pd.DataFrame({t: pd.Series(history_series(cache, t, column), dtype=float) for t in tickers})
+    if frame.empty:
+        return [], np.empty((0, len(tickers)))
+    frame = frame[frame.index.str.len() == 10].sort_index().ffill().dropna()
+    return list(frame.index), frame.to_numpy()
+
+def daily_returns(prices):
+    return prices[1:] / prices[:-1] - 1
+
+def max_drawdown(values):
+    # deepest fall from a running peak, per column, as a negative fraction
+    peaks = np.maximum.accumulate(values, axis=0)
+    return (values / peaks - 1).min(axis=0)
+
+def risk_stats(weights, returns):
+    """Historical risk and return of each allocation, rebalanced daily.
+
+    weights is K x N (one allocation per row), returns is T x N. Returns a dict
+    of length-K arrays: annualised return and volatility, and max drawdown.
+    """
+    portfolio_returns = returns @ weights.T          # T x K
+    growth = np.cumprod(1 + portfolio_returns, axis=0)
+    years = len(returns) / TRADING_DAYS
+    return {
+        'return': growth[-1] ** (1 / years) - 1 if years else np.zeros(len(weights)),
+        'volatility': portfolio_returns.std(axis=0) * np.sqrt(TRADING_DAYS),
+        'drawdown': max_drawdown(np.vstack([np.ones(len(weights)), growth])),
+    }
+
+def exposure_matrix(portfolio, column, data_dir=''):
+    """Look-through exposure of each ETF: (labels, N x S array of fractions).
+
+    column is a classified holdings column, 'Sector' or 'Country'. ETFs
+    without a holdings file have a zero row.
+    """
+    frames = []
+    for i, p in enumerate(portfolio):
+        if not p.holdings_file:
+            continue
+        df = read_holdings(data_dir + p.holdings_file, p.issuer)
+        frames.append(pd.DataFrame({'row': i, 'label': df[column].replace('', 'Other'), 'weight': df['Weight'] / 100}))
+    if not frames:
+        return [], np.zeros((len(portfolio), 0))
+    grouped = pd.concat(frames).groupby(['row', 'label'])['weight'].sum().unstack(fill_value=0)
+    grouped = grouped.reindex(range(len(portfolio)), fill_value=0)
+    return list(grouped.columns), grouped.to_numpy()
+
+def allocation_candidates(labels, values, amount, samples=0, seed=0):
+    """Candidate allocations after investing amount on top of current values.
+
+    labels name the ETFs in the order of values. Returns (names, K x N weights):
+    the current portfolio, the whole amount into each ETF in turn, the amount
+    split to move towards equal weight, a full rebalance to equal weight, and
+    samples random allocations (named '').
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    total = values.sum() + amount
+    names, rows = ['Current'], [values / values.sum() if values.sum() else np.full(n, 1 / n)]
+
+    # whole amount into one ETF: one candidate per ETF, built at once
+    rows.extend((values + amount * np.eye(n)) / total)
+    names.extend(f'+${amount:,.0f} into {label}' for label in labels)
+
+    # top up the most underweight ETFs first, without selling anything
+    shortfall = np.maximum(total / n - values, 0)
+    top_up = shortfall * amount / shortfall.sum() if shortfall.sum() else np.full(n, amount / n)
+    rows.append((values + top_up) / total)
+    names.append(f'+${amount:,.0f} towards equal weight')
+
+    rows.append(np.full(n, 1 / n))
+    names.append('Rebalance to equal weight')
+
+    if samples:
+        rows.extend(np.random.default_rng(seed).dirichlet(np.ones(n), samples))
+        names.extend([''] * samples)
+    return names, np.array(rows)
+
+def cash_flows(trades, dates, tickers):
+    """Net cash paid in on each of the aligned dates, from the purchase ledger.
+
+    A trade on a non-trading day (or before the first aligned date) lands on
+    the next aligned date. Returns (flows, per-ticker flows as T x N).
+    """
+    columns = {t: i for i, t in enumerate(tickers)}
+    by_ticker = np.zeros((len(dates), len(tickers)))
+    dates = np.asarray(dates)
+    for t in trades:
+        i = columns.get(t['ticker'])
+        if i is None:
+            continue
+        row = min(np.searchsorted(dates, t['date']), len(dates) - 1)
+        by_ticker[row, i] += t['total'] if t['units'] > 0 else -t['total']
+    return by_ticker.sum(axis=1), by_ticker
+
+def contribution_values(flows, prices, weights):
+    """Value over time of investing each day's flow across the ETFs by weights.
+
+    weights is K x N, one strategy per row, each buying at that day's close and
+    never rebalancing. Returns a T x K array. Withdrawals sell in the same
+    proportions.
+    """
+    units = np.cumsum(flows[:, None, None] * weights[None, :, :] / prices[:, None, :], axis=0)   # T x K x N
+    return np.einsum('tkn,tn->tk', units, prices)
+
+def rebalanced_values(flows, prices, weights, rebalance_rows):
+    """Value over time of investing flows by weights and rebalancing to them.
+
+    rebalance_rows are the aligned-date indexes to rebalance on. Between
+    rebalances the holdings are bought as in contribution_values; each
+    rebalance resets the units to the target weights.
+    """
+    units = np.zeros(prices.shape[1])
+    values = np.empty(len(prices))
+    bounds = [0, *sorted(r for r in set(rebalance_rows) if 0 < r < len(prices)), len(prices)]
+    for start, end in zip(bounds, bounds[1:]):
+        if start:
+            units = weights * (units @ prices[start]) / prices[start]
+        segment = units + np.cumsum(flows[start:end, None] * weights / prices[start:end], axis=0)
+        values[start:end] = (segment * prices[start:end]).sum(axis=1)
+        units = segment[-1]
+    return values
+
+def dca_flows(flows, rows):
+    """The same net cash as flows, paid in equal instalments on the aligned-date indexes rows."""
+    schedule = np.zeros(len(flows))
+    np.add.at(schedule, list(rows), np.sum(flows) / len(rows))
+    return schedule
+
+def month_starts(dates):
+    # indexes of the first aligned date in each calendar month
+    months = np.array([d[:7] for d in dates])
+    return np.flatnonzero(np.r_[True, months[1:] != months[:-1]]).tolist()
+
+def align(dates, source_dates, values):
+    # values (rows on source_dates) as of each of dates, carrying the last row forward; NaN before the first
+    rows = np.searchsorted(np.asarray(source_dates), np.asarray(dates), side='right') - 1
+    out = np.asarray(values, dtype=float)[np.maximum(rows, 0)]
+    out[rows < 0] = np.nan
+    return out
+
+def mix_index(prices, weights):
+    # growth of a daily-rebalanced mix of the price columns, starting at 1
+    returns = daily_returns(prices) @ np.asarray(weights, dtype=float)
+    return np.r_[1.0, np.cumprod(1 + returns)]
+
+def time_weighted_returns(values, flows):
+    # daily returns of a value series with the day's cash flow taken out
+    previous = values[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = (values[1:] - flows[1:]) / previous - 1
+    return np.where(previous > 0, returns, np.nan)
+
+def tracking_stats(portfolio_returns, benchmark_returns):
+    """Annualised return difference and tracking error of two daily return series.
+
+    Only days where both have a return count.
+    """
+    both = ~(np.isnan(portfolio_returns) | np.isnan(benchmark_returns))
+    p, b = portfolio_returns[both], benchmark_returns[both]
+    if len(p) < 2:
+        return {'difference': np.nan, 'tracking_error': np.nan}
+    years = len(p) / TRADING_DAYS
+    annualise = lambda r: np.prod(1 + r) ** (1 / years) - 1
+    return {
+        'difference': annualise(p) - annualise(b),
+        'tracking_error': (p - b).std() * np.sqrt(TRADING_DAYS),
+    }
@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+import time
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+'''
+Coordination for cache files shared by several server workers (e.g. gunicorn -w 4).
+
+Writers take an exclusive lock on <file>.lock, re-read the file and merge before
+replacing it, so concurrent refreshes cannot drop each other's data. Readers never
+lock: files are only ever swapped in whole with os.replace, and parsed contents are
+memoised per file version so repeated reads within a render are free.
+'''
+
+class LockTimeout(TimeoutError):
+    """A lock could not be taken within its timeout (or at once, when not blocking)."""
+
+class FileLock:
+    """Advisory inter-process lock held on a companion '<path>.lock' file.
+
+    Use as a context manager, which raises LockTimeout rather than entering
+    without the lock. With blocking=False the lock is tried once; call
+    acquire() directly to check the result instead of raising.
+    """
+
+    def __init__(self, path, blocking=True, timeout=None, poll=0.1):
+        self.lock_path = path + '.lock'
+        self.blocking = blocking
+        self.timeout = timeout
+        self.poll = poll
+        self.fd = None
+        self.acquired = False
+
+    def _try_lock(self):
+        try:
+            if os.name == 'nt':
+                msvcrt.locking(self.fd, msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self):
+        self.fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while not self._try_lock():
+            if not self.blocking or (deadline is not None and time.monotonic() > deadline):
+                os.close(self.fd)
+                self.fd = None
+                return False
+            time.sleep(self.poll)
+        self.acquired = True
+        return True
+
+    def release(self):
+        if self.fd is None:
+            return
+        if self.acquired:
+            if os.name == 'nt':
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.fd = None
+        self.acquired = False
+
+    def __enter__(self):
+        if not self.acquire():
+            raise LockTimeout(self.lock_path)
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+def atomic_write_json(path, data, **kwargs):
+    # tmp name is unique per process and thread so concurrent writers never share it
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp, path)
+
+_snapshots = {}
+
+def read_json_snapshot(path, default=None):
+    """Parsed contents of a JSON file, memoised until the file is replaced.
+
+    The returned object is shared between callers and must not be mutated.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return {} if default is None else default
+    version = (st.st_mtime_ns, st.st_size, getattr(st, 'st_ino', 0))
+    cached = _snapshots.get(path)
+    if cached and cached[0] == version:
+        return cached[1]
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {} if default is None else default
+    _snapshots[path] = (version, data)
+    return data
+
+def read_json(path):
+    # private, mutable copy - for read-modify-write under a FileLock
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+SHARE_WINDOW = 10   # seconds a finished call's result is shared with later callers
+FLIGHT_TIMEOUT = 120   # seconds to wait for a call in flight before giving up on it
+
+class SingleFlight:
+    """Coalesces overlapping calls to an expensive refresh, across threads and workers.
+
+    The first caller runs the function while holding the lock for `path`.
+    Callers that arrive while it is in flight wait for it and share its
+    outcome instead of repeating it, as do callers arriving within `window`
+    seconds of it finishing. The finish time is kept in '<path>.done' so other
+    processes see it; the outcome itself is whatever the function left in the
+    shared caches. A caller that has waited `timeout` seconds for a call in
+    flight gets LockTimeout instead, so one stuck fetch can't hang every worker.
+    """
+
+    def __init__(self, path, window=SHARE_WINDOW, timeout=FLIGHT_TIMEOUT):
+        self.path = path
+        self.stamp_path = path + '.done'
+        self.window = window
+        self.timeout = timeout
+        self.mutex = threading.Lock()
+
+    def last_finished(self):
+        try:
+            return os.path.getmtime(self.stamp_path)
+        except OSError:
+            return 0
+
+    def run(self, fn, *args, force=False, **kwargs):
+        """Call fn unless an overlapping or very recent call can be shared.
+
+        With force, wait out any call in flight but always run fn afterwards.
+        Returns True if this caller ran fn; raises LockTimeout if the call in
+        flight outlasts the timeout.
+        """
+        arrived = time.time()
+        deadline = time.monotonic() + self.timeout
+        if not self.mutex.acquire(timeout=self.timeout):
+            raise LockTimeout(self.path)
+        try:
+            with FileLock(self.path, timeout=max(deadline - time.monotonic(), 0)):
+                finished = self.last_finished()
+                if not force and (finished >= arrived or arrived - finished < self.window):
+                    return False
+                fn(*args, **kwargs)
+                # only a completed call is shared; after a failure the next caller retries
+                with open(self.stamp_path, 'w'):
+                    pass
+                os.utime(self.stamp_path)
+        finally:
+            self.mutex.release()
+        return True
@@ -0,0 +1,172 @@
+import re
+
+'''
+Sector and country classification for ETF holdings.
+
+Issuers label sectors with their own taxonomies (GICS sectors, GICS industries,
+ICB subsectors) and countries either by name or by ISO code. Everything is
+mapped onto the 11 GICS sectors and ISO 3166 country names, so rollups across
+issuers add up under one label. The lookup tables are built once at import
+with normalised keys (case, quotes and whitespace don't matter), and applied
+to whole columns at a time.
+'''
+
+GICS_SECTORS = [
+    'Energy', 'Materials', 'Industrials', 'Consumer Discretionary', 'Consumer Staples',
+    'Health Care', 'Financials', 'Information Technology', 'Communication Services',
+    'Utilities', 'Real Estate',
+]
+
+# issuer sector and industry labels -> GICS sector
+SECTOR_ALIASES = {
+    'Energy': [
+        'Oil, Gas & Coal', 'Oil Gas & Consumable Fuels', 'Oil, Gas & Consumable Fuels',
+        'Energy Equipment & Services', 'Alternative Energy', 'Non-Renewable Energy',
+    ],
+    'Materials': [
+        'Metals & Mining', 'Precious Metals & Mining', 'Industrial Metals & Mining', 'Chemicals',
+        'Construction Materials', 'Containers & Packaging', 'Paper & Forest Products',
+        'Industrial Materials', 'Basic Materials', 'Basic Resources',
+    ],
+    'Industrials': [
+        'Construction & Engineering', 'Construction & Materials', 'Machinery', 'Aerospace & Defense',
+        'Industrial Transportation', 'General Industrials', 'Electronic & Electrical Equipment',
+        'Industrial Engineering', 'Industrial Support Services', 'Commercial Services & Supplies',
+        'Professional Services', 'Transportation', 'Capital Goods', 'Building Products',
+        'Electrical Equipment', 'Industrial Conglomerates', 'Trading Companies & Distributors',
+        'Air Freight & Logistics', 'Airlines', 'Road & Rail', 'Ground Transportation',
+        'Marine Transportation', 'Transportation Infrastructure',
+    ],
+    'Consumer Discretionary': [
+        'Retailers', 'Leisure Goods', 'Travel & Leisure', 'Textiles, Apparel & Luxury Goods',
+        'Automobiles & Parts', 'Automobiles', 'Automobile Components', 'Auto Components',
+        'Hotels, Restaurants & Leisure', 'Household Durables', 'Specialty Retail',
+        'Broadline Retail', 'Consumer Durables & Apparel', 'Diversified Consumer Services',
+        'Consumer Discretionary Distribution & Retail', 'Distributors',
+    ],
+    'Consumer Staples': [
+        'Consumer Staples Distribution & Retail', 'Beverages', 'Food Producers', 'Food Products',
+        'Personal Care, Drug & Grocery Stores', 'Personal Goods', 'Consumer Services',
+        'Household Products', 'Personal Care Products', 'Tobacco', 'Food, Beverage & Tobacco',
+        'Food & Staples Retailing',
+    ],
+    'Health Care': [
+        'Healthcare', 'Health Care Providers & Services', 'Health Care Providers',
+        'Health Care Equipment & Supplies', 'Health Care Equipment & Services',
+        'Pharmaceuticals & Biotechnology', 'Pharmaceuticals', 'Biotechnology',
+        'Life Sciences Tools & Services', 'Medical Equipment & Services',
+    ],
+    'Financials': [
+        'Banks', 'Insurance', 'Life Insurance', 'Non-life Insurance', 'Finance & Credit Services',
+        'Investment Banking & Brokerage Services', 'Financial Services', 'Capital Markets',
+        'Consumer Finance', 'Diversified Financials', 'Closed End Investments',
+    ],
+    'Information Technology': [
+        'Technology', 'Software & Computer Services', 'Technology Hardware & Equipment', 'Software',
+        'Software & Services', 'IT Services', 'Semiconductors & Semiconductor Equipment',
+        'Semiconductors', 'Electronic Equipment, Instruments & Components',
+        'Communications Equipment',
+    ],
+    'Communication Services': [
+        'Telecommunications Service Providers', 'Telecommunications Equipment',
+        'Diversified Telecommunication Services', 'Wireless Telecommunication Services',
+        'Media', 'Entertainment', 'Interactive Media & Services', 'Media & Entertainment',
+        'Telecommunication Services', 'Telecommunications',
+    ],
+    'Utilities': [
+        'Electricity', 'Electric Utilities', 'Gas, Water & Multi-utilities', 'Gas Utilities',
+        'Water Utilities', 'Multi-Utilities', 'Independent Power and Renewable Electricity Producers',
+    ],
+    'Real Estate': [
+        'Real Estate Management & Development', 'Real Estate Investment & Services',
+        'Real Estate Investment Trusts', 'Equity Real Estate Investment Trusts (REITs)', 'REITs',
+    ],
+}
+
+# ISO 3166 alpha-2 codes for the markets ETF holdings are listed or domiciled in
+COUNTRIES = {
+    'AE': 'United Arab Emirates', 'AR': 'Argentina', 'AT': 'Austria', 'AU': 'Australia',
+    'BD': 'Bangladesh', 'BE': 'Belgium', 'BM': 'Bermuda', 'BR': 'Brazil', 'CA': 'Canada',
+    'CH': 'Switzerland', 'CL': 'Chile', 'CN': 'China', 'CO': 'Colombia', 'CW': 'Curacao',
+    'CY': 'Cyprus', 'CZ': 'Czech Republic', 'DE': 'Germany', 'DK': 'Denmark', 'EG': 'Egypt',
+    'ES': 'Spain', 'FI': 'Finland', 'FR': 'France', 'GB': 'United Kingdom', 'GG': 'Guernsey',
+    'GR': 'Greece', 'HK': 'Hong Kong', 'HU': 'Hungary', 'ID': 'Indonesia', 'IE': 'Ireland',
+    'IL': 'Israel', 'IM': 'Isle of Man', 'IN': 'India', 'IS': 'Iceland', 'IT': 'Italy',
+    'JE': 'Jersey', 'JO': 'Jordan', 'JP': 'Japan', 'KE': 'Kenya', 'KR': 'South Korea',
+    'KW': 'Kuwait', 'KY': 'Cayman Islands', 'KZ': 'Kazakhstan', 'LU': 'Luxembourg',
+    'MA': 'Morocco', 'MO': 'Macau', 'MT': 'Malta', 'MX': 'Mexico', 'MY': 'Malaysia',
+    'NG': 'Nigeria', 'NL': 'Netherlands', 'NO': 'Norway', 'NZ': 'New Zealand', 'PA': 'Panama',
+    'PE': 'Peru', 'PH': 'Philippines', 'PK': 'Pakistan', 'PL': 'Poland', 'PR': 'Puerto Rico',
+    'PT': 'Portugal', 'QA': 'Qatar', 'RO': 'Romania', 'RU': 'Russia', 'SA': 'Saudi Arabia',
+    'SE': 'Sweden', 'SG': 'Singapore', 'TH': 'Thailand', 'TR': 'Turkey', 'TW': 'Taiwan',
+    'US': 'United States', 'VG': 'British Virgin Islands', 'VN': 'Vietnam', 'ZA': 'South Africa',
+}
+
+# other spellings issuers use for country names
+COUNTRY_ALIASES = {
+    'United States': ['United States of America', 'USA', 'U.S.'],
+    'United Kingdom': ['Great Britain', 'UK', 'England'],
+    'South Korea': ['Korea', 'Korea, Republic of', 'Korea (South)', 'Republic of Korea'],
+    'Hong Kong': ['Hong Kong SAR', 'Hong Kong, China'],
+    'Taiwan': ['Taiwan, Province of China', 'Chinese Taipei'],
+    'China': ["People's Republic of China", 'China (Mainland)'],
+    'Russia': ['Russian Federation'],
+    'Turkey': ['Türkiye', 'Turkiye'],
+    'Czech Republic': ['Czechia'],
+    'Netherlands': ['The Netherlands', 'Holland'],
+    'Macau': ['Macao'],
+    'Vietnam': ['Viet Nam'],
+    'Curacao': ['Curaçao'],
+}
+
+def _normalize(text):
+    return re.sub(r'\s+', ' ', text.strip().strip('"\'').strip()).casefold()
+
+def normalize_keys(values):
+    # vectorized _normalize over a Series
+    return (values.fillna('').astype(str).str.strip().str.strip('"\'')
+            .str.replace(r'\s+', ' ', regex=True).str.strip().str.casefold())
+
+def _lookup(aliases):
+    # normalised label -> canonical label, canonical names included
+    table = {}
+    for canonical, names in aliases.items():
+        for name in [canonical, *names]:
+            table[_normalize(name)] = canonical
+    return table
+
+SECTOR_LOOKUP = _lookup(SECTOR_ALIASES)
+# name columns sometimes hold bare codes too
+COUNTRY_LOOKUP = _lookup({name: [code, *COUNTRY_ALIASES.get(name, [])] for code, name in COUNTRIES.items()})
+COUNTRY_CODES = {name: code for code, name in COUNTRIES.items()}
+
+_reported = {}   # kind -> values already reported as unmapped
+
+def report_unmapped(kind, values, label=''):
+    # print each unmapped value once per session rather than on every refresh
+    seen = _reported.setdefault(kind, set())
+    new = sorted(set(values) - seen - {''})
+    if new:
+        seen.update(new)
+        print(f'{label or "holdings"}: no {kind} classification for {", ".join(new)}')
+    return new
+
+def classify(values, lookup, kind, label=''):
+    """Map a Series of labels onto canonical ones; unmapped labels are kept as given."""
+    raw = values.fillna('').astype(str).str.strip().str.strip('"\'').str.strip()
+    mapped = normalize_keys(raw).map(lookup)
+    report_unmapped(kind, raw[mapped.isna()].unique(), label)
+    return mapped.fillna(raw)
+
+def classify_sectors(values, label=''):
+    return classify(values, SECTOR_LOOKUP, 'sector', label)
+
+def classify_countries(values, codes=False, label=''):
+    """Canonical country names and ISO codes for a Series of country names or codes."""
+    if codes:
+        code = values.fillna('').astype(str).str.strip().str.upper()
+        names = code.map(COUNTRIES)
+        report_unmapped('country code', code[names.isna()].unique(), label)
+        return names.fillna(code), code
+    names = classify(values, COUNTRY_LOOKUP, 'country', label)
+    return names, names.map(COUNTRY_CODES).fillna('')
@@ -1,24 +1,38 @@
 import csv
 import json
 import os
+import sys
+import threading
+import time
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from datetime import datetime, date, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import dash
 from dash import html, dcc, Output, Input, callback_context
-import plotly.graph_objs as go
-import plotly.io as pio
 from yahooquery import Ticker as Ticker
-import plotly.express as px
-
-# Apply a consistent hover label style across all figures
-pio.templates["portdash"] = go.layout.Template(
-    layout=dict(hoverlabel=dict(bgcolor='black', font=dict(color='white', size=13)))
-)
-pio.templates.default = "plotly+portdash"
-
-app = dash.Dash(__name__)
+from quotes import QUOTE_TTL, STALE_WHILE_REVALIDATE, quote_is_fresh, is_trading_day, asx_now
+from lookthrough import (constituent_index, read_constituents, constituent_quotes, apply_changes,
+                         build_treemap, treemap_focus_from_click)
+from issuers import ISSUERS, read_holdings
+from overlap import weight_matrix, overlap_stats, concentration
+from analytics import (price_matrix, daily_returns, risk_stats, exposure_matrix, allocation_candidates,
+                       cash_flows, contribution_values, rebalanced_values, dca_flows, month_starts,
+                       align, mix_index, time_weighted_returns, tracking_stats)
+from projection import project
+from rolling_stats import RollingStats, WINDOWS
+from holdings_sync import HoldingsSync, default_holdings_url
+from cachelock import FileLock, LockTimeout, SingleFlight, atomic_write_json, read_json, read_json_snapshot
+from store import open_store
+from ledger import PositionIndex, DividendIndex, file_version
+from dataflow import Dataflow
+from figures import (figure, empty_figure, title, scatter, bar, heatmap, hline, vline, array, colorscale,
+                     PALETTE, LEGEND, MARGIN, ROUND_DIGITS)
+
+# graphs such as the look-through treemap are created inside graph-container after startup
+app = dash.Dash(__name__, suppress_callback_exceptions=True)
 
 @dataclass
 class Holding:
@@ -38,55 +52,102 @@ class Holding:
     grand_total_pct: float = 0
     grand_total_val: float = 0
     holdings_file: str = None
+    holdings_url: str = None
 
-# ETF data
-portfolio = []
-# summary_data holds the overall totals across the entire portfolio
-summary_data = Holding(ticker="Total...")
+@dataclass(frozen=True)
+class PortfolioState:
+    # one published snapshot: the ETFs, the totals across the entire portfolio, and its version.
+    # Holdings are never mutated once published.
+    version: int
+    holdings: tuple
+    summary: Holding
+
+# the newest snapshot this worker has seen, rebound in a single assignment.
+# Callbacks resolve it once (use_latest_portfolio) and pass that state to everything they render.
+current = PortfolioState(None, (), Holding(ticker="Total..."))
 
 # Data directory: set PORTDASH_DATA env var to override, e.g. a samba mount point
 DATA_DIR = os.environ.get('PORTDASH_DATA', os.path.dirname(os.path.abspath(__file__))) + os.sep
 
+# computed portfolio state shared by all workers (see store.py)
+portfolio_store = open_store(DATA_DIR)
+refresh_flight = SingleFlight(DATA_DIR + 'yahoo_refresh')
+# held for the whole of a history backfill; refreshes skip their history update while it is taken
+BACKFILL_LOCK = DATA_DIR + 'history_backfill'
+
 HISTORY_START = "2024-10-31"
 HISTORY_CHUNKS = 10
+# first-run backfill: parallel requests, spaced to stay inside Yahoo's rate limit
+BOOTSTRAP_WORKERS = 4
+BOOTSTRAP_REQUEST_INTERVAL = 0.25
+
+# benchmarks to compare against: name -> {yahoo symbol: weight}, mixes rebalanced daily.
+# Their history is fetched into history_cache.json alongside the ETFs'. All are total-return
+# series (the ASX 200 accumulation index, adjusted ETF closes) to match the portfolio's reinvested returns.
+BENCHMARKS = {
+    'ASX 200': {'^AXJT': 1.0},
+    '60/40 ASX 200 / Bonds': {'^AXJT': 0.6, 'VAF.AX': 0.4},
+}
+
+# rolling volatility/return/beta panels are measured against this index
+ROLLING_BENCHMARK = '^AXJO'
+
+# what-if simulator: the contribution to test, and how many random allocations to plot around it
+WHAT_IF_AMOUNT = 10000
+WHAT_IF_SAMPLES = 2000
+
+# Monte Carlo projection: planned monthly contribution, horizon and simulation size
+PROJECTION_CONTRIBUTION = 1000
+PROJECTION_YEARS = 30
+PROJECTION_PATHS = 10000
+PROJECTION_METHOD = 'bootstrap'   # or 'normal' for returns drawn from a fitted distribution
+PROJECTION_SEED = 0
+PROJECTION_WORKERS = 0            # > 1 runs the paths in a process pool
+
+# incrementally maintained rolling statistics, advanced whenever new closes are cached
+rolling_stats = RollingStats(DATA_DIR + 'rolling_stats.json', ROLLING_BENCHMARK)
 
 def get_cache_path():
     return DATA_DIR + 'history_cache.json'
 
+def get_constituent_cache_path():
+    return DATA_DIR + 'constituent_cache.json'
+
 def should_auto_refresh():
-    if datetime.now().hour < 18:
+    # once per ASX trading day, after the evening's closing prices have settled - in Sydney time, wherever the host is
+    now = asx_now()
+    if now.hour < 18 or not is_trading_day(now.date()):
         return False
     try:
         with open(DATA_DIR + 'auto_refresh.json') as f:
             last = date.fromisoformat(json.load(f).get('last_date', '2000-01-01'))
-            return last < date.today()
+            return last < now.date()
     except (FileNotFoundError, json.JSONDecodeError, ValueError):
         return True
 
 def mark_auto_refreshed():
-    tmp = DATA_DIR + 'auto_refresh.json.tmp'
-    with open(tmp, 'w') as f:
-        json.dump({'last_date': date.today().isoformat()}, f)
-    os.replace(tmp, DATA_DIR + 'auto_refresh.json')
+    path = DATA_DIR + 'auto_refresh.json'
+    with FileLock(path):
+        atomic_write_json(path, {'last_date': asx_now().date().isoformat()})
+
+def quotes_are_fresh(holdings):
+    # every holding has a cached quote still inside its market-hours TTL
+    cached = load_price_cache()
+    return all(quote_is_fresh(((cached.get(etf.ticker) or {}).get('quote') or {}).get('fetched', 0)) for etf in holdings)
 
 def load_price_cache():
-    try:
-        with open(DATA_DIR + 'price_cache.json', 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+    return read_json_snapshot(DATA_DIR + 'price_cache.json')
 
 def save_price_cache(prices):
-    tmp = DATA_DIR + 'price_cache.json.tmp'
-    with open(tmp, 'w') as f:
-        json.dump(prices, f)
-    os.replace(tmp, DATA_DIR + 'price_cache.json')
+    path = DATA_DIR + 'price_cache.json'
+    with FileLock(path):
+        atomic_write_json(path, prices)
 
-def apply_price_cache():
+def apply_price_cache(holdings, summary):
     prices = load_price_cache()
     if not prices:
         return
-    for etf in portfolio:
+    for etf in holdings:
         if etf.ticker not in prices:
             continue
         p = prices[etf.ticker]
@@ -99,73 +160,280 @@ def apply_price_cache():
             etf.total_change_pct = etf.total_change_val / etf.total_paid * 100
             etf.div_pct          = etf.div_val / etf.total_paid * 100
             etf.grand_total_pct  = etf.grand_total_val / etf.total_paid * 100
-    if summary_data.current_value == 0:
-        summary_data.daily_change_val = sum(e.daily_change_val for e in portfolio)
-        summary_data.total_change_val = sum(e.total_change_val for e in portfolio)
-        summary_data.total_paid       = sum(e.total_paid for e in portfolio)
-        summary_data.current_value    = sum(e.current_value for e in portfolio)
-        summary_data.div_val          = sum(e.div_val for e in portfolio)
-        summary_data.grand_total_val  = summary_data.total_change_val + summary_data.div_val
-        if summary_data.current_value:
-            for etf in portfolio:
-                etf.weight = etf.current_value / summary_data.current_value
-            summary_data.daily_change_pct = summary_data.daily_change_val / summary_data.current_value * 100
-        if summary_data.total_paid:
-            summary_data.div_pct         = summary_data.div_val / summary_data.total_paid * 100
-            summary_data.total_change_pct = summary_data.total_change_val / summary_data.total_paid * 100
-            summary_data.grand_total_pct  = summary_data.grand_total_val / summary_data.total_paid * 100
+    if summary.current_value == 0:
+        summary.daily_change_val = sum(e.daily_change_val for e in holdings)
+        summary.total_change_val = sum(e.total_change_val for e in holdings)
+        summary.total_paid       = sum(e.total_paid for e in holdings)
+        summary.current_value    = sum(e.current_value for e in holdings)
+        summary.div_val          = sum(e.div_val for e in holdings)
+        summary.grand_total_val  = summary.total_change_val + summary.div_val
+        if summary.current_value:
+            for etf in holdings:
+                etf.weight = etf.current_value / summary.current_value
+            summary.daily_change_pct = summary.daily_change_val / summary.current_value * 100
+        if summary.total_paid:
+            summary.div_pct         = summary.div_val / summary.total_paid * 100
+            summary.total_change_pct = summary.total_change_val / summary.total_paid * 100
+            summary.grand_total_pct  = summary.grand_total_val / summary.total_paid * 100
+
+def sync_holdings_files(holdings, force=False):
+    # conditional download of issuer holdings CSVs; unchanged files are left untouched
+    syncer = HoldingsSync(DATA_DIR)
+    changed = []
+    for etf in holdings:
+        url = etf.holdings_url or default_holdings_url(etf.ticker, etf.issuer)
+        if url and etf.holdings_file and syncer.sync(url, etf.holdings_file, force):
+            changed.append(etf.ticker)
+    return changed
+
+def start_holdings_sync(holdings):
+    # off the refresh path; a finished sync shows up through the holdings file mtimes
+    lock = FileLock(DATA_DIR + 'holdings_sync', blocking=False)
+    if not lock.acquire():
+        return False
+
+    def run():
+        try:
+            sync_holdings_files(holdings)
+        except Exception as e:
+            print(f"Holdings sync failed: {e}")
+        finally:
+            lock.release()
+
+    threading.Thread(target=run, daemon=True).start()
+    return True
+
+def holdings_versions(holdings):
+    # holdings files are only rewritten when their content changes, so mtimes identify versions
+    versions = []
+    for etf in holdings:
+        try:
+            versions.append(os.path.getmtime(DATA_DIR + etf.holdings_file))
+        except (OSError, TypeError):
+            versions.append(None)
+    return tuple(versions)
 
 def load_history_cache():
-    try:
-        with open(get_cache_path(), 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+    # shared read-only snapshot, re-parsed only when the file is replaced
+    return read_json_snapshot(get_cache_path())
+
+def _merge_dicts(dst, src):
+    for key, value in src.items():
+        if isinstance(value, dict) and isinstance(dst.get(key), dict):
+            _merge_dicts(dst[key], value)
+        else:
+            dst[key] = value
+
+def _would_change(dst, src):
+    # True if _merge_dicts(dst, src) would change anything in dst
+    for key, value in src.items():
+        if isinstance(value, dict) and isinstance(dst.get(key), dict):
+            if _would_change(dst[key], value):
+                return True
+        elif key not in dst or dst[key] != value:
+            return True
+    return False
 
 def save_history_cache(cache):
+    # merge into whatever is on disk now, so concurrent writers keep each other's chunks
     path = get_cache_path()
-    tmp_path = path + '.tmp'
-    with open(tmp_path, 'w') as f:
-        json.dump(cache, f)
-    os.replace(tmp_path, path)
+    with FileLock(path):
+        merged = read_json(path)
+        chunks_on_disk = merged.get('_meta', {}).get('fetch_chunks_done', 0)
+        _merge_dicts(merged, cache)
+        if '_meta' in merged:
+            merged['_meta']['fetch_chunks_done'] = max(chunks_on_disk, merged['_meta'].get('fetch_chunks_done', 0))
+        atomic_write_json(path, merged)
 
 def _fetch_and_cache(cache, tickers, start_str, end_str):
+    # returns False if the request failed, True otherwise (including an empty range)
     try:
         hist = Ticker(tickers).history(start=start_str, end=end_str, interval='1d')
         if isinstance(hist, str) or hist is None or (hasattr(hist, 'empty') and hist.empty):
             print(f"No history data for {start_str} to {end_str}")
-            return
-        for (symbol, dt), row in hist.iterrows():
-            date_str = str(dt)[:10]
-            cache.setdefault(symbol, {})[date_str] = row['close']
+            return True
+        _ingest_history(cache, hist)
+        return True
     except Exception as e:
         print(f"Error fetching history {start_str}-{end_str}: {e}")
+        return False
 
-def update_history_cache():
-    if not portfolio:
+# extra yahooquery history columns kept under cache['_columns'][column][symbol]
+HISTORY_EXTRA_COLUMNS = ['adjclose', 'volume', 'dividends']
+
+def _ingest_history(cache, hist):
+    # bulk-convert a (symbol, date) MultiIndex history frame into the cache, one dict update per symbol
+    frame = hist.reset_index()
+    # same 'YYYY-MM-DD' key as str(dt)[:10]: local date for timestamps, as-is for date objects
+    dates = frame['date']
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        frame['date'] = dates.to_numpy().astype('datetime64[D]').astype(str)
+    else:
+        frame['date'] = dates.astype(str).str[:10]
+    extras = [c for c in HISTORY_EXTRA_COLUMNS if c in frame.columns]
+    columns = cache.setdefault('_columns', {}) if extras else {}
+    for symbol, group in frame.groupby('symbol', sort=False):
+        dates = group['date'].tolist()
+        cache.setdefault(symbol, {}).update(zip(dates, group['close'].tolist()))
+        for col in extras:
+            values = group[col]
+            keep = values.notna() & (values != 0) if col == 'dividends' else values.notna()
+            columns.setdefault(col, {}).setdefault(symbol, {}).update(
+                zip(group['date'][keep].tolist(), values[keep].tolist())
+            )
+
+def history_chunk_bounds(today=None):
+    # (start, end) of each of the HISTORY_CHUNKS fetch windows
+    today = today or date.today()
+    start = date.fromisoformat(HISTORY_START)
+    chunk_days = max(1, (today - start).days // HISTORY_CHUNKS)
+    return [
+        (start + timedelta(days=i * chunk_days), min(start + timedelta(days=(i + 1) * chunk_days), today))
+        for i in range(HISTORY_CHUNKS)
+    ]
+
+def history_tickers(holdings):
+    # the ETFs plus every benchmark component and the rolling-beta index, each once
+    tickers = [etf.ticker for etf in holdings]
+    for weights in [*BENCHMARKS.values(), {ROLLING_BENCHMARK: 1.0}]:
+        tickers += [t for t in weights if t not in tickers]
+    return tickers
+
+def rolling_tickers(holdings):
+    return [etf.ticker for etf in holdings] + [ROLLING_BENCHMARK]
+
+def update_history_cache(holdings):
+    if not holdings:
         return
-    cache = load_history_cache()
+    cache = read_json(get_cache_path())
+    meta_on_disk = dict(cache.get('_meta', {}))
     meta = cache.setdefault('_meta', {'fetch_chunks_done': 0})
-    tickers = [etf.ticker for etf in portfolio]
+    # fetched rows are collected apart from the cache, so an unchanged refresh can leave the file alone
+    fetched = {}
+    tickers = history_tickers(holdings)
 
     today = date.today()
-    start = date.fromisoformat(HISTORY_START)
-    total_days = (today - start).days
-    chunk_days = max(1, total_days // HISTORY_CHUNKS)
     chunks_done = meta.get('fetch_chunks_done', 0)
 
     if chunks_done < HISTORY_CHUNKS:
-        chunk_start = start + timedelta(days=chunks_done * chunk_days)
-        chunk_end = min(start + timedelta(days=(chunks_done + 1) * chunk_days), today)
+        chunk_start, chunk_end = history_chunk_bounds(today)[chunks_done]
         print(f"Fetching history chunk {chunks_done + 1}/{HISTORY_CHUNKS}: {chunk_start} to {chunk_end}")
-        _fetch_and_cache(cache, tickers, chunk_start.isoformat(), chunk_end.isoformat())
+        _fetch_and_cache(fetched, tickers, chunk_start.isoformat(), chunk_end.isoformat())
         meta['fetch_chunks_done'] = chunks_done + 1
+    else:
+        # tickers added after the backfill finished (a new ETF or benchmark) get their whole history once
+        missing = [t for t in tickers if t not in cache]
+        if missing:
+            print(f"Backfilling history for {', '.join(missing)}")
+            _fetch_and_cache(fetched, missing, HISTORY_START, today.isoformat())
+
+    # closing prices can't change again until the ASX next trades, so the
+    # trailing week follows the same freshness rule as quotes
+    if quote_is_fresh(meta.get('trailing_fetched', 0)) and all(t in cache or t in fetched for t in tickers):
+        print("Trailing week is current until the next ASX session")
+    else:
+        trailing_start = (today - timedelta(days=7)).isoformat()
+        print(f"Refreshing trailing week from {trailing_start}")
+        fetched_at = time.time()
+        if _fetch_and_cache(fetched, tickers, trailing_start, today.isoformat()):
+            meta['trailing_fetched'] = fetched_at
+
+    # rewriting the file would invalidate every artefact built from it, so only save real changes
+    if _would_change(cache, fetched) or meta != meta_on_disk:
+        _merge_dicts(cache, fetched)
+        save_history_cache(cache)
+    else:
+        print("History cache unchanged")
+    # only writes when there are closes it hasn't folded in yet, e.g. on an install that predates the stats
+    rolling_stats.update(cache, rolling_tickers(holdings))
+
+def get_bootstrap_progress_path():
+    return DATA_DIR + 'bootstrap_progress.json'
+
+def load_bootstrap_progress():
+    return read_json_snapshot(get_bootstrap_progress_path())
+
+def bootstrap_history_cache(holdings, progress=None):
+    """Fetch the whole history window in one pass, for a fresh install.
 
-    trailing_start = (today - timedelta(days=7)).isoformat()
-    print(f"Refreshing trailing week from {trailing_start}")
-    _fetch_and_cache(cache, tickers, trailing_start, today.isoformat())
+    Every (ticker, chunk) pair is requested concurrently, with request starts
+    spaced BOOTSTRAP_REQUEST_INTERVAL apart. Each result is merged into the
+    cache as it arrives, and progress is written to bootstrap_progress.json
+    so any worker can report it. Returns True if every request succeeded.
+    """
+    tickers = history_tickers(holdings)
+    today = date.today()
+    windows = history_chunk_bounds(today)
+    # the final window runs to today, so the trailing-week refresh is covered too
+    windows[-1] = (windows[-1][0], today)
+    tasks = [(ticker, i) for i in range(len(windows)) for ticker in tickers]
+
+    schedule_lock = threading.Lock()
+    next_slot = [time.monotonic()]
+
+    def fetch(ticker, i):
+        with schedule_lock:
+            wait = next_slot[0] - time.monotonic()
+            next_slot[0] = max(next_slot[0], time.monotonic()) + BOOTSTRAP_REQUEST_INTERVAL
+        if wait > 0:
+            time.sleep(wait)
+        partial = {}
+        ok = _fetch_and_cache(partial, [ticker], windows[i][0].isoformat(), windows[i][1].isoformat())
+        if partial:
+            save_history_cache(partial)
+        return ok
+
+    def report(done, failed):
+        state = {'running': done < len(tasks), 'done': done, 'failed': failed, 'total': len(tasks),
+                 'updated': datetime.now().isoformat(timespec='seconds')}
+        atomic_write_json(get_bootstrap_progress_path(), state)
+        if progress:
+            progress(state)
+
+    print(f"Backfilling history: {len(tickers)} tickers x {len(windows)} chunks")
+    report(0, 0)
+    failed_chunks = set()
+    with ThreadPoolExecutor(max_workers=BOOTSTRAP_WORKERS) as pool:
+        futures = {pool.submit(fetch, ticker, i): (ticker, i) for ticker, i in tasks}
+        for done, future in enumerate(as_completed(futures), start=1):
+            if not future.result():
+                failed_chunks.add(futures[future][1])
+            report(done, len(failed_chunks))
+
+    # chunks are only counted as loaded up to the first one with a failed request
+    chunks_done = min(failed_chunks) if failed_chunks else HISTORY_CHUNKS
+    save_history_cache({'_meta': {'fetch_chunks_done': chunks_done}})
+    rolling_stats.update(read_json(get_cache_path()), rolling_tickers(holdings))
+    print(f"History backfill finished: {chunks_done}/{HISTORY_CHUNKS} chunks complete")
+    return not failed_chunks
+
+def start_history_bootstrap():
+    # run the backfill in a background thread, holding the backfill lock so no history update overlaps
+    lock = FileLock(BACKFILL_LOCK, blocking=False)
+    if not lock.acquire():
+        return False
+    # replaces any earlier run's outcome before the first poll can read it
+    atomic_write_json(get_bootstrap_progress_path(), {'running': True, 'done': 0, 'failed': 0, 'total': 0})
 
-    save_history_cache(cache)
+    def run():
+        error = None
+        try:
+            bootstrap_history_cache(load_portfolio())
+        except Exception as e:
+            error = str(e)
+            print(f"History backfill failed: {e}")
+        finally:
+            # never leave the progress poll waiting on a backfill that has stopped
+            state = dict(load_bootstrap_progress(), running=False)
+            if error:
+                state['error'] = error
+            atomic_write_json(get_bootstrap_progress_path(), state)
+            lock.release()
+
+    threading.Thread(target=run, daemon=True).start()
+    return True
 
 def _normalise_ticker(raw):
     raw = raw.strip()
@@ -223,29 +491,60 @@ def load_dividends():
         pass
     return dividends
 
-def make_history_graph():
+# every cached artefact below is recomputed only when one of its declared inputs changes
+flow = Dataflow()
+flow.source('purchases', lambda state: file_version(DATA_DIR + 'purchases.csv'))
+flow.source('dividends', lambda state: file_version(DATA_DIR + 'dividends.csv'))
+flow.source('history', lambda state: file_version(get_cache_path()))
+flow.source('rolling', lambda state: file_version(rolling_stats.path))
+flow.source('holdings', lambda state: holdings_versions(state.holdings))
+# the ETFs and what was paid for them; prices and weights come with the published snapshot
+flow.source('config', lambda state: tuple((e.ticker, e.name, e.issuer, e.holdings_file, e.units, e.total_paid) for e in state.holdings))
+flow.source('prices', lambda state: state.version)
+flow.source('constituent_quotes', lambda state: int(time.time() // QUOTE_TTL))
+
+flow.derived('positions', ['purchases'], lambda state: PositionIndex(load_purchases()))
+# depends on purchases too, for yield on cost
+flow.derived('dividend_index', ['dividends', 'positions'], lambda state: DividendIndex(load_dividends(), get_position_index()))
+flow.derived('price_matrix', ['history'], lambda state, tickers, column: price_matrix(load_history_cache(), list(tickers), column))
+flow.derived('overlap_matrix', ['holdings', 'config'], lambda state: weight_matrix(state.holdings, DATA_DIR))
+flow.derived('exposures', ['holdings', 'config'],
+             lambda state: {column: exposure_matrix(state.holdings, column, DATA_DIR) for column in ('Sector', 'Country')})
+
+def get_position_index():
+    return flow.get('positions')
+
+def get_dividend_index():
+    return flow.get('dividend_index')
+
+def get_price_matrix(tickers, column='close'):
+    return flow.get('price_matrix', tuple(tickers), column)
+
+def make_history_graph(state):
     cache = load_history_cache()
-    tickers = [etf.ticker for etf in portfolio]
-    portfolio_tickers = {etf.ticker for etf in portfolio}
-    purchases = [t for t in load_purchases() if t['ticker'] in portfolio_tickers]
-    dividends = load_dividends()
-    use_purchases = bool(purchases)
+    tickers = [etf.ticker for etf in state.holdings]
+    portfolio_tickers = {etf.ticker for etf in state.holdings}
+    positions = get_position_index()
+    dividends = get_dividend_index()
+    use_purchases = positions.holds_any(portfolio_tickers)
 
     all_dates = set()
     for ticker in tickers:
         all_dates.update(cache.get(ticker, {}).keys())
 
     sorted_dates = sorted(d for d in all_dates if len(d) == 10)  # skip _meta key
+    cumulative_dividends_over = dividends.cumulative_total_over(sorted_dates)
+
+    if use_purchases:
+        units_by_etf = {etf.ticker: positions.units_over(etf.ticker, sorted_dates) for etf in state.holdings}
+        costs = positions.total_cost_over(portfolio_tickers, sorted_dates)
 
     points = []
-    for d in sorted_dates:
+    for i, d in enumerate(sorted_dates):
         total = 0
         skip = False
-        for etf in portfolio:
-            if use_purchases:
-                units = sum(t['units'] for t in purchases if t['ticker'] == etf.ticker and t['date'] <= d)
-            else:
-                units = etf.units
+        for etf in state.holdings:
+            units = units_by_etf[etf.ticker][i] if use_purchases else etf.units
             if units == 0:
                 continue  # not yet purchased, legitimately absent
             if d not in cache.get(etf.ticker, {}):
@@ -255,60 +554,48 @@ def make_history_graph():
         if skip or total == 0:
             continue
 
-        cost_basis = sum(
-            (float(t.get('total', 0)) if t['units'] > 0 else -float(t.get('total', 0)))
-            for t in purchases if t['date'] <= d
-        ) if use_purchases else sum(etf.total_paid for etf in portfolio)
-
-        cumulative_dividends = sum(dv['amount'] for dv in dividends if dv['date'] <= d)
+        cost_basis = costs[i] if use_purchases else sum(etf.total_paid for etf in state.holdings)
 
-        points.append((d, total, cost_basis, total + cumulative_dividends))
+        points.append((d, total, cost_basis, total + cumulative_dividends_over[i]))
 
     chunks_done = cache.get('_meta', {}).get('fetch_chunks_done', 0)
     coverage = f" ({chunks_done}/{HISTORY_CHUNKS} history chunks loaded)" if chunks_done < HISTORY_CHUNKS else ""
 
     if not points:
-        fig = go.Figure()
-        fig.update_layout(
-            plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-            title=dict(text=f"Total Portfolio Value Over Time — no data yet, click Refresh{coverage}", font=dict(size=14)),
-        )
-        return fig
+        return empty_figure(f"Total Portfolio Value Over Time — no data yet, click Refresh{coverage}")
 
     dates, totals, costs, total_returns = zip(*points)
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=list(dates), y=list(totals), name="Portfolio Value",
+    traces = [scatter(
+        dates, totals, name="Portfolio Value",
         mode='lines', line=dict(color='#636EFA', width=2),
         hovertemplate='%{x}<br>$%{y:,.0f}<extra>Portfolio Value</extra>',
-    ))
+    )]
     if use_purchases:
-        fig.add_trace(go.Scatter(
-            x=list(dates), y=list(costs), name="Cost Basis",
+        traces.append(scatter(
+            dates, costs, name="Cost Basis",
             mode='lines', line=dict(color='#888', width=1.5),
             hovertemplate='%{x}<br>$%{y:,.0f}<extra>Cost Basis</extra>',
         ))
-    if dividends:
-        fig.add_trace(go.Scatter(
-            x=list(dates), y=list(total_returns), name="Total Return (inc. dividends)",
+    if dividends.dates:
+        traces.append(scatter(
+            dates, total_returns, name="Total Return (inc. dividends)",
             mode='lines', line=dict(color='#00CC96', width=2),
             hovertemplate='%{x}<br>$%{y:,.0f}<extra>Total Return</extra>',
         ))
-    fig.update_layout(
-        plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-        title=dict(text=f"Total Portfolio Value Over Time{coverage}", font=dict(size=20)),
-        yaxis=dict(title="Value (AUD)", tickformat="$,.0f", gridcolor="#444"),
-        xaxis=dict(title="Date", gridcolor="#444"),
+    return figure(
+        traces,
+        title=title(f"Total Portfolio Value Over Time{coverage}"),
+        yaxis=dict(title=dict(text="Value (AUD)"), tickformat="$,.0f", gridcolor="#444"),
+        xaxis=dict(title=dict(text="Date"), gridcolor="#444"),
         showlegend=False,
-        margin=dict(t=50, l=80, r=20, b=50),
+        margin=MARGIN,
     )
-    return fig
 
-def make_profit_graph():
+def make_profit_graph(state):
     cache = load_history_cache()
-    portfolio_tickers = {etf.ticker for etf in portfolio}
-    purchases = [t for t in load_purchases() if t['ticker'] in portfolio_tickers]
-    dividends = load_dividends()
+    portfolio_tickers = {etf.ticker for etf in state.holdings}
+    positions = get_position_index()
+    purchases = [t for t in positions.ledger if t['ticker'] in portfolio_tickers]
     use_purchases = bool(purchases)
 
     all_dates = set()
@@ -316,16 +603,18 @@ def make_profit_graph():
         all_dates.update(cache.get(ticker, {}).keys())
 
     sorted_dates = sorted(d for d in all_dates if len(d) == 10)
+    cumulative_dividends_over = get_dividend_index().cumulative_total_over(sorted_dates)
+
+    if use_purchases:
+        units_by_etf = {etf.ticker: positions.units_over(etf.ticker, sorted_dates) for etf in state.holdings}
+        costs = positions.total_cost_over(portfolio_tickers, sorted_dates)
 
     points = []
-    for d in sorted_dates:
+    for i, d in enumerate(sorted_dates):
         total = 0
         skip = False
-        for etf in portfolio:
-            if use_purchases:
-                units = sum(t['units'] for t in purchases if t['ticker'] == etf.ticker and t['date'] <= d)
-            else:
-                units = etf.units
+        for etf in state.holdings:
+            units = units_by_etf[etf.ticker][i] if use_purchases else etf.units
             if units == 0:
                 continue
             if d not in cache.get(etf.ticker, {}):
@@ -335,36 +624,27 @@ def make_profit_graph():
         if skip or total == 0:
             continue
 
-        cost_basis = sum(
-            t['total'] if t['units'] > 0 else -t['total']
-            for t in purchases if t['date'] <= d
-        ) if use_purchases else sum(etf.total_paid for etf in portfolio)
+        cost_basis = costs[i] if use_purchases else sum(etf.total_paid for etf in state.holdings)
 
-        cumulative_dividends = sum(dv['amount'] for dv in dividends if dv['date'] <= d)
-        profit = total - cost_basis + cumulative_dividends
+        profit = total - cost_basis + cumulative_dividends_over[i]
         points.append((d, profit))
 
     chunks_done = cache.get('_meta', {}).get('fetch_chunks_done', 0)
     coverage = f" ({chunks_done}/{HISTORY_CHUNKS} history chunks loaded)" if chunks_done < HISTORY_CHUNKS else ""
 
     if not points:
-        fig = go.Figure()
-        fig.update_layout(
-            plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-            title=dict(text=f"Portfolio Profit Over Time — no data yet, click Refresh{coverage}", font=dict(size=14)),
-        )
-        return fig
+        return empty_figure(f"Portfolio Profit Over Time — no data yet, click Refresh{coverage}")
 
     dates, profits = zip(*points)
     profit_by_date = dict(zip(dates, profits))
 
-    fig = go.Figure(go.Scatter(
-        x=list(dates), y=list(profits),
+    traces = [scatter(
+        dates, profits,
         mode='lines', line=dict(color='#00CC96', width=2),
         fill='tozeroy',
         fillcolor='rgba(0,204,150,0.15)',
         hovertemplate='%{x}<br>$%{y:,.0f}<extra>Profit</extra>',
-    ))
+    )]
 
     # Group purchases by date for investment markers
     if use_purchases:
@@ -381,8 +661,8 @@ def make_profit_graph():
                 marker_profits.append(profit_by_date[d])
                 marker_labels.append('<br>'.join(labels))
         if marker_dates:
-            fig.add_trace(go.Scatter(
-                x=marker_dates, y=marker_profits,
+            traces.append(scatter(
+                marker_dates, marker_profits,
                 mode='markers',
                 marker=dict(color='yellow', size=8, symbol='circle',
                             line=dict(color='#333', width=1)),
@@ -390,23 +670,21 @@ def make_profit_graph():
                 customdata=marker_labels,
             ))
 
-    fig.add_hline(y=0, line=dict(color='#555', width=1))
-    fig.update_layout(
-        plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-        title=dict(text=f"Portfolio Profit Over Time{coverage}", font=dict(size=20)),
-        yaxis=dict(title="Profit (AUD)", tickformat="$,.0f", gridcolor="#444"),
-        xaxis=dict(title="Date", gridcolor="#444"),
+    return figure(
+        traces,
+        title=title(f"Portfolio Profit Over Time{coverage}"),
+        yaxis=dict(title=dict(text="Profit (AUD)"), tickformat="$,.0f", gridcolor="#444"),
+        xaxis=dict(title=dict(text="Date"), gridcolor="#444"),
         showlegend=False,
-        margin=dict(t=50, l=80, r=20, b=50),
+        margin=MARGIN,
+        shapes=[hline(0, color='#555', width=1)],
     )
-    return fig
 
-def make_etf_returns_graph():
+def make_etf_returns_graph(state):
     cache = load_history_cache()
-    portfolio_tickers = {etf.ticker for etf in portfolio}
-    all_purchases = [t for t in load_purchases() if t['ticker'] in portfolio_tickers]
-    use_purchases = bool(all_purchases)
-    palette = ['#636EFA', '#EF553B', '#00CC96', '#FECB52', '#AB63FA', '#FFA15A']
+    portfolio_tickers = {etf.ticker for etf in state.holdings}
+    positions = get_position_index()
+    use_purchases = positions.holds_any(portfolio_tickers)
 
     all_dates = set()
     for ticker in portfolio_tickers:
@@ -416,17 +694,16 @@ def make_etf_returns_graph():
     chunks_done = cache.get('_meta', {}).get('fetch_chunks_done', 0)
     coverage = f" ({chunks_done}/{HISTORY_CHUNKS} history chunks loaded)" if chunks_done < HISTORY_CHUNKS else ""
 
-    fig = go.Figure()
-    for i, etf in enumerate(portfolio):
-        etf_purchases = [t for t in all_purchases if t['ticker'] == etf.ticker]
+    traces = []
+    for i, etf in enumerate(state.holdings):
+        if use_purchases:
+            units_over = positions.units_over(etf.ticker, sorted_dates)
+            costs_over = positions.cost_over(etf.ticker, sorted_dates)
         points = []
-        for d in sorted_dates:
+        for j, d in enumerate(sorted_dates):
             if use_purchases:
-                units = sum(t['units'] for t in etf_purchases if t['date'] <= d)
-                cost_basis = sum(
-                    t['total'] if t['units'] > 0 else -t['total']
-                    for t in etf_purchases if t['date'] <= d
-                )
+                units = units_over[j]
+                cost_basis = costs_over[j]
             else:
                 units = etf.units
                 cost_basis = etf.total_paid
@@ -440,208 +717,159 @@ def make_etf_returns_graph():
         if points:
             dates, returns = zip(*points)
             label = etf.ticker.split('.')[0]
-            fig.add_trace(go.Scatter(
-                x=list(dates), y=list(returns),
+            traces.append(scatter(
+                dates, returns,
                 mode='lines', name=label,
-                line=dict(color=palette[i % len(palette)], width=2),
+                line=dict(color=PALETTE[i % len(PALETTE)], width=2),
                 hovertemplate='%{x}<br>%{y:.2f}%<extra>' + label + '</extra>',
             ))
 
-    fig.add_hline(y=0, line=dict(color='#555', width=1))
-    fig.update_layout(
-        plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-        title=dict(text=f"Cumulative Return by ETF{coverage}", font=dict(size=20)),
-        yaxis=dict(title="Return (%)", gridcolor="#444", ticksuffix="%"),
-        xaxis=dict(title="Date", gridcolor="#444"),
-        legend=dict(bgcolor="#333", bordercolor="#555", borderwidth=1),
-        margin=dict(t=50, l=80, r=20, b=50),
+    return figure(
+        traces,
+        title=title(f"Cumulative Return by ETF{coverage}"),
+        yaxis=dict(title=dict(text="Return (%)"), gridcolor="#444", ticksuffix="%"),
+        xaxis=dict(title=dict(text="Date"), gridcolor="#444"),
+        legend=LEGEND,
+        margin=MARGIN,
+        shapes=[hline(0, color='#555', width=1)],
     )
-    return fig
 
-def make_cumulative_dividends_graph():
-    portfolio_tickers = {etf.ticker for etf in portfolio}
-    dividends = sorted(
-        [d for d in load_dividends() if d['ticker'] in portfolio_tickers],
-        key=lambda d: d['date']
-    )
-    if not dividends:
-        fig = go.Figure()
-        fig.update_layout(
-            plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-            title=dict(text="Cumulative Dividends — no data found", font=dict(size=14)),
-        )
-        return fig
-
-    palette = ['#636EFA', '#EF553B', '#00CC96', '#FECB52', '#AB63FA', '#FFA15A']
-    tickers = sorted({d['ticker'] for d in dividends})
-    all_dates = sorted({d['date'] for d in dividends})
-
-    fig = go.Figure()
-    running_total = []
-    portfolio_cumulative = 0
+def make_cumulative_dividends_graph(state):
+    dividends = get_dividend_index()
+    tickers = sorted(etf.ticker for etf in state.holdings if etf.ticker in dividends.amounts)
+    if not tickers:
+        return empty_figure("Cumulative Dividends — no data found")
 
+    traces = []
     for i, ticker in enumerate(tickers):
         label = ticker.split('.')[0]
-        cumulative = 0
-        dates, amounts = [], []
-        for d in all_dates:
-            payment = sum(dv['amount'] for dv in dividends if dv['ticker'] == ticker and dv['date'] == d)
-            if payment:
-                cumulative += payment
-                dates.append(d)
-                amounts.append(cumulative)
+        ticker_dates, payments, cumulatives, _, _ = dividends.series([ticker])
+        dates = [d for d, p in zip(ticker_dates, payments) if p]
+        amounts = [c for c, p in zip(cumulatives, payments) if p]
         if dates:
-            fig.add_trace(go.Scatter(
-                x=dates, y=amounts, name=label,
-                mode='lines+markers', line=dict(color=palette[i % len(palette)], width=2, shape='hv'),
+            traces.append(scatter(
+                dates, amounts, name=label,
+                mode='lines+markers', line=dict(color=PALETTE[i % len(PALETTE)], width=2, shape='hv'),
                 marker=dict(size=6),
                 hovertemplate='%{x}<br>$%{y:,.2f}<extra>' + label + '</extra>',
             ))
 
     # Portfolio total line
-    cumulative = 0
-    dates, amounts = [], []
-    for d in all_dates:
-        payment = sum(dv['amount'] for dv in dividends if dv['date'] == d)
-        if payment:
-            cumulative += payment
-            dates.append(d)
-            amounts.append(cumulative)
-    fig.add_trace(go.Scatter(
-        x=dates, y=amounts, name="Total",
+    all_dates, payments, cumulatives, _, _ = dividends.series(tickers)
+    dates = [d for d, p in zip(all_dates, payments) if p]
+    amounts = [c for c, p in zip(cumulatives, payments) if p]
+    traces.append(scatter(
+        dates, amounts, name="Total",
         mode='lines+markers', line=dict(color='white', width=2, dash='dot', shape='hv'),
         marker=dict(size=6),
         hovertemplate='%{x}<br>$%{y:,.2f}<extra>Total</extra>',
     ))
 
-    fig.update_layout(
-        plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-        title=dict(text="Cumulative Dividends Received", font=dict(size=20)),
-        yaxis=dict(title="Cumulative Amount (AUD)", tickformat="$,.0f", gridcolor="#444"),
-        xaxis=dict(title="Date", gridcolor="#444"),
-        legend=dict(bgcolor="#333", bordercolor="#555", borderwidth=1),
-        margin=dict(t=50, l=80, r=20, b=50),
+    return figure(
+        traces,
+        title=title("Cumulative Dividends Received"),
+        yaxis=dict(title=dict(text="Cumulative Amount (AUD)"), tickformat="$,.0f", gridcolor="#444"),
+        xaxis=dict(title=dict(text="Date"), gridcolor="#444"),
+        legend=LEGEND,
+        margin=MARGIN,
     )
-    return fig
 
-def make_avg_cost_graph():
-    portfolio_tickers = {etf.ticker for etf in portfolio}
-    all_purchases = sorted(
-        [t for t in load_purchases() if t['ticker'] in portfolio_tickers],
-        key=lambda t: t['date']
-    )
-    if not all_purchases:
-        fig = go.Figure()
-        fig.update_layout(
-            plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-            title=dict(text="Average Cost Per Unit — no purchases data found", font=dict(size=14)),
-        )
-        return fig
+def make_avg_cost_graph(state):
+    portfolio_tickers = {etf.ticker for etf in state.holdings}
+    positions = get_position_index()
+    if not positions.holds_any(portfolio_tickers):
+        return empty_figure("Average Cost Per Unit — no purchases data found")
 
-    palette = ['#636EFA', '#EF553B', '#00CC96', '#FECB52', '#AB63FA', '#FFA15A']
-    tickers = sorted({t['ticker'] for t in all_purchases})
+    tickers = sorted(t for t in portfolio_tickers if t in positions.trades)
 
-    fig = go.Figure()
+    traces = []
     for i, ticker in enumerate(tickers):
         label = ticker.split('.')[0]
-        cumulative_units = 0
-        cumulative_cost = 0
         dates, avg_costs = [], []
-        for t in [p for p in all_purchases if p['ticker'] == ticker]:
-            cumulative_units += t['units']
-            cumulative_cost += t['total'] if t['units'] > 0 else -t['total']
+        for d, cumulative_units, cumulative_cost in positions.running_position(ticker):
             if cumulative_units > 0:
-                dates.append(t['date'])
+                dates.append(d)
                 avg_costs.append(cumulative_cost / cumulative_units)
         if dates:
-            fig.add_trace(go.Scatter(
-                x=dates, y=avg_costs, name=label,
-                mode='lines+markers', line=dict(color=palette[i % len(palette)], width=2, shape='hv'),
+            traces.append(scatter(
+                dates, avg_costs, name=label,
+                mode='lines+markers', line=dict(color=PALETTE[i % len(PALETTE)], width=2, shape='hv'),
                 marker=dict(size=6),
                 hovertemplate='%{x}<br>$%{y:,.4f}<extra>' + label + '</extra>',
             ))
 
-    fig.update_layout(
-        plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-        title=dict(text="Average Cost Per Unit by ETF", font=dict(size=20)),
-        yaxis=dict(title="Avg Cost Per Unit (AUD)", tickformat="$,.2f", gridcolor="#444"),
-        xaxis=dict(title="Date", gridcolor="#444"),
-        legend=dict(bgcolor="#333", bordercolor="#555", borderwidth=1),
-        margin=dict(t=50, l=80, r=20, b=50),
+    return figure(
+        traces,
+        title=title("Average Cost Per Unit by ETF"),
+        yaxis=dict(title=dict(text="Avg Cost Per Unit (AUD)"), tickformat="$,.2f", gridcolor="#444"),
+        xaxis=dict(title=dict(text="Date"), gridcolor="#444"),
+        legend=LEGEND,
+        margin=MARGIN,
     )
-    return fig
 
-def make_avg_cost_normalised_graph():
-    portfolio_tickers = {etf.ticker for etf in portfolio}
-    all_purchases = sorted(
-        [t for t in load_purchases() if t['ticker'] in portfolio_tickers],
-        key=lambda t: t['date']
-    )
-    if not all_purchases:
-        fig = go.Figure()
-        fig.update_layout(
-            plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-            title=dict(text="Normalised Average Cost — no purchases data found", font=dict(size=14)),
-        )
-        return fig
+def make_avg_cost_normalised_graph(state):
+    portfolio_tickers = {etf.ticker for etf in state.holdings}
+    positions = get_position_index()
+    if not positions.holds_any(portfolio_tickers):
+        return empty_figure("Normalised Average Cost — no purchases data found")
 
-    palette = ['#636EFA', '#EF553B', '#00CC96', '#FECB52', '#AB63FA', '#FFA15A']
-    tickers = sorted({t['ticker'] for t in all_purchases})
+    tickers = sorted(t for t in portfolio_tickers if t in positions.trades)
 
-    fig = go.Figure()
+    traces = []
     for i, ticker in enumerate(tickers):
         label = ticker.split('.')[0]
-        cumulative_units = 0
-        cumulative_cost = 0
         baseline = None
         dates, normalised = [], []
-        for t in [p for p in all_purchases if p['ticker'] == ticker]:
-            cumulative_units += t['units']
-            cumulative_cost += t['total'] if t['units'] > 0 else -t['total']
+        for d, cumulative_units, cumulative_cost in positions.running_position(ticker):
             if cumulative_units > 0:
                 avg = cumulative_cost / cumulative_units
                 if baseline is None:
                     baseline = avg
-                dates.append(t['date'])
+                dates.append(d)
                 normalised.append(avg / baseline * 100)
         if dates:
-            fig.add_trace(go.Scatter(
-                x=dates, y=normalised, name=label,
-                mode='lines+markers', line=dict(color=palette[i % len(palette)], width=2, shape='hv'),
+            traces.append(scatter(
+                dates, normalised, name=label,
+                mode='lines+markers', line=dict(color=PALETTE[i % len(PALETTE)], width=2, shape='hv'),
                 marker=dict(size=6),
                 hovertemplate='%{x}<br>%{y:.2f}%<extra>' + label + '</extra>',
             ))
 
-    fig.add_hline(y=100, line=dict(color='#555', width=1, dash='dash'))
-    fig.update_layout(
-        plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-        title=dict(text="Average Cost Per Unit — Normalised to First Purchase", font=dict(size=20)),
-        yaxis=dict(title="Avg Cost (% of first purchase)", ticksuffix="%", gridcolor="#444"),
-        xaxis=dict(title="Date", gridcolor="#444"),
-        legend=dict(bgcolor="#333", bordercolor="#555", borderwidth=1),
-        margin=dict(t=50, l=80, r=20, b=50),
+    return figure(
+        traces,
+        title=title("Average Cost Per Unit — Normalised to First Purchase"),
+        yaxis=dict(title=dict(text="Avg Cost (% of first purchase)"), ticksuffix="%", gridcolor="#444"),
+        xaxis=dict(title=dict(text="Date"), gridcolor="#444"),
+        legend=LEGEND,
+        margin=MARGIN,
+        shapes=[hline(100, color='#555', width=1, dash='dash')],
     )
-    return fig
 
-def _compute_daily_pnl():
+# the portfolio's daily value series, shared by the monthly and yearly heatmaps
+@flow.derived('value_series', ['history', 'positions', 'dividend_index', 'config'])
+def _compute_daily_pnl(state):
     """Returns list of (date_str, pct_change_of_portfolio_value)."""
     cache = load_history_cache()
-    portfolio_tickers = {etf.ticker for etf in portfolio}
-    purchases = [t for t in load_purchases() if t['ticker'] in portfolio_tickers]
-    dividends = load_dividends()
-    use_purchases = bool(purchases)
+    portfolio_tickers = {etf.ticker for etf in state.holdings}
+    positions = get_position_index()
+    use_purchases = positions.holds_any(portfolio_tickers)
 
     all_dates = set()
     for ticker in portfolio_tickers:
         all_dates.update(cache.get(ticker, {}).keys())
     sorted_dates = sorted(d for d in all_dates if len(d) == 10)
+    cumulative_dividends_over = get_dividend_index().cumulative_total_over(sorted_dates)
+
+    if use_purchases:
+        units_by_etf = {etf.ticker: positions.units_over(etf.ticker, sorted_dates) for etf in state.holdings}
+        costs = positions.total_cost_over(portfolio_tickers, sorted_dates)
 
     rows = []  # (date, profit, total_value)
-    for d in sorted_dates:
+    for i, d in enumerate(sorted_dates):
         total = 0
         skip = False
-        for etf in portfolio:
-            units = sum(t['units'] for t in purchases if t['ticker'] == etf.ticker and t['date'] <= d) if use_purchases else etf.units
+        for etf in state.holdings:
+            units = units_by_etf[etf.ticker][i] if use_purchases else etf.units
             if units == 0:
                 continue
             if d not in cache.get(etf.ticker, {}):
@@ -650,12 +878,8 @@ def _compute_daily_pnl():
             total += units * cache[etf.ticker][d]
         if skip or total == 0:
             continue
-        cost_basis = sum(
-            t['total'] if t['units'] > 0 else -t['total']
-            for t in purchases if t['date'] <= d
-        ) if use_purchases else sum(etf.total_paid for etf in portfolio)
-        cum_divs = sum(dv['amount'] for dv in dividends if dv['date'] <= d)
-        rows.append((d, total - cost_basis + cum_divs, total))
+        cost_basis = costs[i] if use_purchases else sum(etf.total_paid for etf in state.holdings)
+        rows.append((d, total - cost_basis + cumulative_dividends_over[i], total))
 
     out = []
     for i in range(1, len(rows)):
@@ -665,14 +889,6 @@ def _compute_daily_pnl():
             out.append((rows[i][0], pct))
     return out
 
-def _empty_heatmap_fig(title):
-    fig = go.Figure()
-    fig.update_layout(
-        plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-        title=dict(text=title, font=dict(size=14)),
-    )
-    return fig
-
 PNL_COLORSCALE = [
     [0.0,   '#5a0000'],   # max loss — dark red
     [0.4,   '#d62728'],   # bright red
@@ -683,10 +899,10 @@ PNL_COLORSCALE = [
     [1.0,   '#005a00'],   # max gain — dark green
 ]
 
-def make_monthly_heatmap():
-    daily = _compute_daily_pnl()
+def make_monthly_heatmap(state):
+    daily = flow.get('value_series', state=state)
     if not daily:
-        return _empty_heatmap_fig("Daily Movements (Last Month) — no data, click Refresh")
+        return empty_figure("Daily Movements (Last Month) — no data, click Refresh")
 
     cells = {}
     for d_str, pct in daily:
@@ -695,7 +911,7 @@ def make_monthly_heatmap():
             cells[dt] = pct
 
     if not cells:
-        return _empty_heatmap_fig("Daily Movements (Last Month) — no data")
+        return empty_figure("Daily Movements (Last Month) — no data")
 
     latest = max(cells.keys())
     latest_monday = latest - timedelta(days=latest.weekday())
@@ -717,27 +933,25 @@ def make_monthly_heatmap():
     valid = [v for row in z for v in row if v is not None]
     extreme = max(abs(v) for v in valid) if valid else 1
 
-    fig = go.Figure(go.Heatmap(
-        z=z, x=weekday_labels, y=row_labels,
-        text=text_grid, texttemplate='%{text}',
-        textfont=dict(color='black', size=14, family='Arial Black'),
-        colorscale=PNL_COLORSCALE, zmin=-extreme, zmax=extreme, zmid=0,
-        customdata=hover_grid, hovertemplate='%{customdata}<extra></extra>',
-        xgap=3, ygap=3,
-    ))
-    fig.update_layout(
-        plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-        title=dict(text="Daily Portfolio Movements — Last Month", font=dict(size=20)),
+    return figure(
+        [heatmap(
+            z, x=weekday_labels, y=row_labels,
+            text=text_grid, texttemplate='%{text}',
+            textfont=dict(color='black', size=14, family='Arial Black'),
+            colorscale=PNL_COLORSCALE, zmin=-extreme, zmax=extreme, zmid=0,
+            customdata=hover_grid, hovertemplate='%{customdata}<extra></extra>',
+            xgap=3, ygap=3,
+        )],
+        title=title("Daily Portfolio Movements — Last Month"),
         margin=dict(t=50, l=120, r=20, b=50),
         yaxis=dict(autorange='reversed'),
         hoverlabel=dict(bgcolor='black', font=dict(color='white', size=13)),
     )
-    return fig
 
-def make_yearly_heatmap():
-    daily = _compute_daily_pnl()
+def make_yearly_heatmap(state):
+    daily = flow.get('value_series', state=state)
     if not daily:
-        return _empty_heatmap_fig("Daily Movements (Last Year) — no data, click Refresh")
+        return empty_figure("Daily Movements (Last Year) — no data, click Refresh")
 
     cutoff = date.today() - timedelta(days=365)
     cells = {}
@@ -747,7 +961,7 @@ def make_yearly_heatmap():
             cells[dt] = pct
 
     if not cells:
-        return _empty_heatmap_fig("Daily Movements (Last Year) — no data")
+        return empty_figure("Daily Movements (Last Year) — no data")
 
     by_month = {}
     for d, pct in sorted(cells.items()):
@@ -771,26 +985,24 @@ def make_yearly_heatmap():
     valid = [v for row in z for v in row if v is not None]
     extreme = max(abs(v) for v in valid) if valid else 1
 
-    fig = go.Figure(go.Heatmap(
-        z=z, y=row_labels,
-        x=list(range(1, max_days + 1)),
-        colorscale=PNL_COLORSCALE, zmin=-extreme, zmax=extreme, zmid=0,
-        customdata=hover, hovertemplate='%{customdata}<extra></extra>',
-        xgap=2, ygap=2,
-    ))
-    fig.update_layout(
-        plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-        title=dict(text="Daily Portfolio Movements — Last Year", font=dict(size=20)),
-        margin=dict(t=50, l=80, r=20, b=50),
+    return figure(
+        [heatmap(
+            z, y=row_labels,
+            x=list(range(1, max_days + 1)),
+            colorscale=PNL_COLORSCALE, zmin=-extreme, zmax=extreme, zmid=0,
+            customdata=hover, hovertemplate='%{customdata}<extra></extra>',
+            xgap=2, ygap=2,
+        )],
+        title=title("Daily Portfolio Movements — Last Year"),
+        margin=MARGIN,
         yaxis=dict(autorange='reversed'),
-        xaxis=dict(title="Trading Day of Month", dtick=1),
+        xaxis=dict(title=dict(text="Trading Day of Month"), dtick=1),
         hoverlabel=dict(bgcolor='black', font=dict(color='white', size=13)),
     )
-    return fig
 
-def make_correlation_heatmap():
+def make_correlation_heatmap(state):
     cache = load_history_cache()
-    tickers = [etf.ticker for etf in portfolio]
+    tickers = [etf.ticker for etf in state.holdings]
     labels = [t.split('.')[0] for t in tickers]
 
     # Build price series per ETF
@@ -805,12 +1017,7 @@ def make_correlation_heatmap():
     )
 
     if len(common_dates) < 10:
-        fig = go.Figure()
-        fig.update_layout(
-            plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-            title=dict(text="Correlation — insufficient overlapping data, click Refresh", font=dict(size=14)),
-        )
-        return fig
+        return empty_figure("Correlation — insufficient overlapping data, click Refresh")
 
     # Compute daily returns and correlation matrix
     df = pd.DataFrame(
@@ -835,25 +1042,62 @@ def make_correlation_heatmap():
                 showarrow=False,
             ))
 
-    fig = go.Figure(go.Heatmap(
-        z=z, x=labels, y=labels,
-        colorscale='RdYlGn', zmin=-1, zmax=1,
-        hovertemplate='%{y} / %{x}<br>Correlation: %{z:.2f}<extra></extra>',
-    ))
-    fig.update_layout(
-        plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-        title=dict(text="ETF Return Correlation", font=dict(size=20)),
-        margin=dict(t=50, l=80, r=20, b=50),
+    return figure(
+        [heatmap(
+            z, x=labels, y=labels,
+            colorscale=colorscale('RdYlGn'), zmin=-1, zmax=1,
+            hovertemplate='%{y} / %{x}<br>Correlation: %{z:.2f}<extra></extra>',
+        )],
+        title=title("ETF Return Correlation"),
+        margin=MARGIN,
         xaxis=dict(side="bottom"),
         annotations=annotations,
     )
-    return fig
 
-def make_drawdown_graph():
+def make_overlap_heatmap(state):
+    matrix = flow.get('overlap_matrix', state=state)
+    if len(matrix.etfs) < 2:
+        return empty_figure("Overlap — needs holdings files for at least two ETFs")
+
+    stats = overlap_stats(matrix)
+    total = sum(p.weight for p in state.holdings)
+    conc = concentration(matrix, {p.ticker: p.weight / total for p in state.holdings} if total else {})
+    labels = [t.split('.')[0] for t in matrix.etfs]
+
+    z = (stats['overlap'] * 100).tolist()
+    customdata = [
+        [[int(stats['shared'][i][j]), stats['cosine'][i][j]] for j in range(len(labels))]
+        for i in range(len(labels))
+    ]
+    annotations = [
+        dict(x=col_label, y=row_label, text=f"{z[i][j]:.0f}%",
+             font=dict(color='white' if z[i][j] > 60 else 'black', size=13), showarrow=False)
+        for i, row_label in enumerate(labels) for j, col_label in enumerate(labels)
+    ]
+    effective = ', '.join(f"{label} {conc['per_etf'][t]:.0f}" for label, t in zip(labels, matrix.etfs))
+
+    return figure(
+        [heatmap(
+            z, x=labels, y=labels, customdata=customdata,
+            colorscale=colorscale('Blues'), zmin=0, zmax=100,
+            hovertemplate='%{y} / %{x}<br>Overlap: %{z:.1f}%<br>Shared holdings: %{customdata[0]}'
+                          '<br>Weight similarity: %{customdata[1]:.2f}<extra></extra>',
+        )],
+        title=title(
+            f"ETF Holdings Overlap — {conc['portfolio']:.0f} effective holdings, "
+            f"{conc['duplicated_weight']:.0%} of the portfolio held through more than one ETF"
+            f"<br><sup>Effective holdings per ETF: {effective}</sup>", 16),
+        margin=dict(t=80, l=80, r=20, b=50),
+        xaxis=dict(side="bottom"),
+        yaxis=dict(autorange='reversed'),
+        annotations=annotations,
+    )
+
+def make_drawdown_graph(state):
     cache = load_history_cache()
-    portfolio_tickers = {etf.ticker for etf in portfolio}
-    purchases = [t for t in load_purchases() if t['ticker'] in portfolio_tickers]
-    use_purchases = bool(purchases)
+    portfolio_tickers = {etf.ticker for etf in state.holdings}
+    positions = get_position_index()
+    use_purchases = positions.holds_any(portfolio_tickers)
 
     all_dates = set()
     for ticker in portfolio_tickers:
@@ -861,12 +1105,15 @@ def make_drawdown_graph():
 
     sorted_dates = sorted(d for d in all_dates if len(d) == 10)
 
+    if use_purchases:
+        units_by_etf = {etf.ticker: positions.units_over(etf.ticker, sorted_dates) for etf in state.holdings}
+
     points = []
-    for d in sorted_dates:
+    for i, d in enumerate(sorted_dates):
         total = 0
         skip = False
-        for etf in portfolio:
-            units = sum(t['units'] for t in purchases if t['ticker'] == etf.ticker and t['date'] <= d) if use_purchases else etf.units
+        for etf in state.holdings:
+            units = units_by_etf[etf.ticker][i] if use_purchases else etf.units
             if units == 0:
                 continue
             if d not in cache.get(etf.ticker, {}):
@@ -880,12 +1127,7 @@ def make_drawdown_graph():
     coverage = f" ({chunks_done}/{HISTORY_CHUNKS} history chunks loaded)" if chunks_done < HISTORY_CHUNKS else ""
 
     if not points:
-        fig = go.Figure()
-        fig.update_layout(
-            plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-            title=dict(text=f"Drawdown — no data yet, click Refresh{coverage}", font=dict(size=14)),
-        )
-        return fig
+        return empty_figure(f"Drawdown — no data yet, click Refresh{coverage}")
 
     dates, values = zip(*points)
     peak = 0
@@ -894,36 +1136,308 @@ def make_drawdown_graph():
         peak = max(peak, v)
         drawdowns.append((v - peak) / peak * 100)
 
-    fig = go.Figure(go.Scatter(
-        x=list(dates), y=drawdowns,
-        mode='lines', line=dict(color='#EF553B', width=2),
-        fill='tozeroy', fillcolor='rgba(239,85,59,0.15)',
-        hovertemplate='%{x}<br>%{y:.2f}%<extra>Drawdown</extra>',
-    ))
-    fig.add_hline(y=0, line=dict(color='#555', width=1))
-    fig.update_layout(
-        plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-        title=dict(text=f"Portfolio Drawdown From Peak{coverage}", font=dict(size=20)),
-        yaxis=dict(title="Drawdown (%)", gridcolor="#444", ticksuffix="%"),
-        xaxis=dict(title="Date", gridcolor="#444"),
+    return figure(
+        [scatter(
+            dates, drawdowns,
+            mode='lines', line=dict(color='#EF553B', width=2),
+            fill='tozeroy', fillcolor='rgba(239,85,59,0.15)',
+            hovertemplate='%{x}<br>%{y:.2f}%<extra>Drawdown</extra>',
+        )],
+        title=title(f"Portfolio Drawdown From Peak{coverage}"),
+        yaxis=dict(title=dict(text="Drawdown (%)"), gridcolor="#444", ticksuffix="%"),
+        xaxis=dict(title=dict(text="Date"), gridcolor="#444"),
         showlegend=False,
-        margin=dict(t=50, l=80, r=20, b=50),
+        margin=MARGIN,
+        shapes=[hline(0, color='#555', width=1)],
     )
-    return fig
 
-def make_dividend_efficiency_graph():
-    total_divs = summary_data.div_val
-    total_value = summary_data.current_value
-    if total_divs == 0 or total_value == 0:
-        fig = go.Figure()
-        fig.update_layout(
-            plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-            title=dict(text="Dividend Efficiency — no data", font=dict(size=14)),
+def _top_exposures(labels, row, count=3):
+    order = np.argsort(row)[::-1][:count]
+    return ', '.join(f"{labels[k]} {row[k]:.0%}" for k in order if row[k] > 0)
+
+def make_what_if_graph(state):
+    tickers = [etf.ticker for etf in state.holdings]
+    values = [etf.current_value for etf in state.holdings]
+    if not tickers or sum(values) == 0:
+        return empty_figure("What-if Allocations — no prices yet, click Refresh")
+    dates, prices = get_price_matrix(tickers)
+    if len(dates) < 20:
+        return empty_figure("What-if Allocations — insufficient overlapping history, click Refresh")
+
+    labels = [t.split('.')[0] for t in tickers]
+    names, weights = allocation_candidates(labels, values, WHAT_IF_AMOUNT, WHAT_IF_SAMPLES)
+    stats = risk_stats(weights, daily_returns(prices))
+    exposures = flow.get('exposures', state=state)
+    sector_labels, sector_exposure = exposures['Sector']
+    country_labels, country_exposure = exposures['Country']
+    sectors, countries = weights @ sector_exposure, weights @ country_exposure
+
+    x, y = stats['volatility'] * 100, stats['return'] * 100
+    named = [k for k, name in enumerate(names) if name]
+    sampled = [k for k, name in enumerate(names) if not name]
+
+    def describe(k, detail):
+        lines = [', '.join(f"{label} {w:.0%}" for label, w in zip(labels, weights[k]))]
+        if detail:
+            lines += [
+                f"Max drawdown {stats['drawdown'][k]:.1%}",
+                f"Sectors: {_top_exposures(sector_labels, sectors[k])}",
+                f"Countries: {_top_exposures(country_labels, countries[k])}",
+            ]
+        return '<br>'.join(lines)
+
+    traces = [scatter(
+        x[sampled], y[sampled], mode='markers', name='Random allocations',
+        marker=dict(color='#555', size=4, opacity=0.5),
+        customdata=[describe(k, False) for k in sampled],
+        hovertemplate='Volatility %{x:.1f}%<br>Return %{y:.1f}% p.a.<br>%{customdata}<extra></extra>',
+    )]
+    for n, k in enumerate(named):
+        traces.append(scatter(
+            x[[k]], y[[k]], mode='markers', name=names[k],
+            marker=dict(color=PALETTE[n % len(PALETTE)], size=12, symbol='star' if k == 0 else 'circle',
+                        line=dict(color='#222', width=1)),
+            customdata=[describe(k, True)],
+            hovertemplate=f'{names[k]}<br>' + 'Volatility %{x:.1f}%<br>Return %{y:.1f}% p.a.<br>%{customdata}<extra></extra>',
+        ))
+
+    return figure(
+        traces,
+        title=title(f"What-if Allocations — {dates[0]} to {dates[-1]}"),
+        xaxis=dict(title=dict(text="Annualised Volatility (%)"), gridcolor="#444", ticksuffix="%"),
+        yaxis=dict(title=dict(text="Annualised Return (%)"), gridcolor="#444", ticksuffix="%"),
+        legend=LEGEND,
+        margin=MARGIN,
+    )
+
+@flow.derived('projection', ['price_matrix'])
+def projection_bands(state, tickers, weights, start_value, dividend_yield, years, paths, method, contribution, seed, workers):
+    # the arguments are the cache key, rounded so a small price move reuses the last run
+    _, prices = get_price_matrix(tickers)
+    returns = daily_returns(prices) @ np.array(weights)
+    return project(returns, start_value, years, paths, method, contribution, dividend_yield, seed, workers)
+
+def make_projection_graph(state):
+    tickers = [etf.ticker for etf in state.holdings]
+    start_value = state.summary.current_value
+    if not tickers or start_value == 0:
+        return empty_figure("Projected Value — no prices yet, click Refresh")
+    dates, prices = get_price_matrix(tickers)
+    if len(dates) < 60:
+        return empty_figure("Projected Value — insufficient overlapping history, click Refresh")
+
+    weights = np.array([etf.current_value for etf in state.holdings]) / start_value
+
+    # dividends over the last year, reinvested at the same yield
+    div_dates, amounts, _, _, _ = get_dividend_index().series(tickers)
+    year_ago = (date.today() - timedelta(days=365)).isoformat()
+    dividend_yield = sum(a for d, a in zip(div_dates, amounts) if d > year_ago) / start_value
+
+    bands = flow.get(
+        'projection', tuple(tickers), tuple(float(w) for w in weights.round(4)), round(start_value),
+        round(dividend_yield, 4), PROJECTION_YEARS, PROJECTION_PATHS, PROJECTION_METHOD,
+        PROJECTION_CONTRIBUTION, PROJECTION_SEED, PROJECTION_WORKERS,
+    )
+
+    months = pd.date_range(date.today().replace(day=1), periods=len(bands[50]), freq='MS').strftime('%Y-%m-%d').tolist()
+    hidden = dict(width=0)
+    traces = [
+        scatter(months, bands[95], mode='lines', line=hidden, hoverinfo='skip', showlegend=False),
+        scatter(months, bands[5], mode='lines', line=hidden, fill='tonexty', fillcolor='rgba(99,110,250,0.15)',
+                name='5th-95th percentile', hovertemplate='%{x}<br>5th percentile $%{y:,.0f}<extra></extra>'),
+        scatter(months, bands[75], mode='lines', line=hidden, hoverinfo='skip', showlegend=False),
+        scatter(months, bands[25], mode='lines', line=hidden, fill='tonexty', fillcolor='rgba(99,110,250,0.3)',
+                name='25th-75th percentile', hovertemplate='%{x}<br>25th percentile $%{y:,.0f}<extra></extra>'),
+        scatter(months, bands[50], mode='lines', name='Median', line=dict(color='#636EFA', width=2),
+                hovertemplate='%{x}<br>Median $%{y:,.0f}<extra></extra>'),
+        scatter(months, bands['invested'], mode='lines', name='Invested', line=dict(color='#888', width=1.5, dash='dash'),
+                hovertemplate='%{x}<br>Invested $%{y:,.0f}<extra></extra>'),
+    ]
+    return figure(
+        traces,
+        title=title(
+            f"Projected Value — {PROJECTION_PATHS:,} paths, ${PROJECTION_CONTRIBUTION:,.0f}/month, "
+            f"{dividend_yield:.1%} dividends reinvested", 18),
+        yaxis=dict(title=dict(text="Value (AUD)"), tickformat="$,.0f", gridcolor="#444"),
+        xaxis=dict(title=dict(text="Date"), gridcolor="#444"),
+        legend=LEGEND,
+        margin=MARGIN,
+    )
+
+def make_backtest_graph(state):
+    tickers = [etf.ticker for etf in state.holdings]
+    if not tickers:
+        return empty_figure("Strategy Backtest — no portfolio loaded")
+    dates, prices = get_price_matrix(tickers)
+    positions = get_position_index()
+    if len(dates) < 2 or not positions.holds_any(tickers):
+        return empty_figure("Strategy Backtest — needs price history and purchases, click Refresh")
+
+    labels = [t.split('.')[0] for t in tickers]
+    flows, _ = cash_flows(positions.ledger, dates, tickers)
+    n = len(tickers)
+    units = np.array([positions.units_over(t, dates) for t in tickers]).T
+    if not flows.any():
+        # a ledger without totals: value each purchase at that day's close instead
+        flows = (np.diff(units, axis=0, prepend=0) * prices).sum(axis=1)
+
+    # the allocation strategies invest the same cash on the same days as the actual purchases
+    strategies = [('Actual purchases', (units * prices).sum(axis=1))]
+    buy_and_hold = contribution_values(flows, prices, np.vstack([np.full(n, 1 / n), np.eye(n)]))
+    strategies.append(('Equal weight', buy_and_hold[:, 0]))
+    strategies.append(('Equal weight, rebalanced monthly', rebalanced_values(flows, prices, np.full(n, 1 / n), month_starts(dates))))
+    strategies.extend((f'All into {label}', buy_and_hold[:, i + 1]) for i, label in enumerate(labels))
+
+    # the DCA schedule pays the same total in equal monthly instalments from the first purchase to the last
+    paid = np.flatnonzero(flows)
+    if paid.size:
+        dca_rows = [paid[0]] + [r for r in month_starts(dates) if paid[0] < r <= paid[-1]]
+        dca = dca_flows(flows, dca_rows)
+        strategies.append(('Fixed monthly DCA, equal weight', contribution_values(dca, prices, np.full((1, n), 1 / n))[:, 0]))
+
+    traces = []
+    for i, (name, values) in enumerate(strategies):
+        traces.append(scatter(
+            dates, values, mode='lines', name=f'{name} (${values[-1]:,.0f})',
+            line=dict(color=PALETTE[i % len(PALETTE)], width=3 if i == 0 else 1.5),
+            hovertemplate='%{x}<br>$%{y:,.0f}<extra>' + name + '</extra>',
+        ))
+    traces.append(scatter(
+        dates, np.cumsum(flows), mode='lines', name='Invested',
+        line=dict(color='#888', width=1.5, dash='dash'),
+        hovertemplate='%{x}<br>$%{y:,.0f}<extra>Invested</extra>',
+    ))
+    if paid.size:
+        traces.append(scatter(
+            dates, np.cumsum(dca), mode='lines', name='Invested (DCA)',
+            line=dict(color='#888', width=1, dash='dot'),
+            hovertemplate='%{x}<br>$%{y:,.0f}<extra>Invested (DCA)</extra>',
+        ))
+    return figure(
+        traces,
+        title=title("Strategy Backtest — same contributions, different allocations and schedules"),
+        yaxis=dict(title=dict(text="Value (AUD)"), tickformat="$,.0f", gridcolor="#444"),
+        xaxis=dict(title=dict(text="Date"), gridcolor="#444"),
+        legend=LEGEND,
+        margin=MARGIN,
+    )
+
+def make_benchmark_graph(state):
+    tickers = [etf.ticker for etf in state.holdings]
+    if not tickers:
+        return empty_figure("Portfolio vs Benchmarks — no portfolio loaded")
+    dates, prices = get_price_matrix(tickers)
+    positions = get_position_index()
+    if len(dates) < 2 or not positions.holds_any(tickers):
+        return empty_figure("Portfolio vs Benchmarks — needs price history and purchases, click Refresh")
+
+    # each purchase is valued at the same close as the position it adds, so buying moves no return
+    units = np.array([positions.units_over(t, dates) for t in tickers]).T
+    holdings_value = (units * prices).sum(axis=1)
+    flows = (np.diff(units, axis=0, prepend=0) * prices).sum(axis=1)
+    received = np.asarray(get_dividend_index().cumulative_total_over(dates), dtype=float)
+    dividends = np.diff(received, prepend=received[0])
+    first = int(np.argmax(holdings_value > 0))
+    dates, holdings_value, flows, dividends = dates[first:], holdings_value[first:], flows[first:], dividends[first:]
+
+    # total return with dividends reinvested, the same basis as the benchmarks' adjusted series
+    portfolio_returns = time_weighted_returns(holdings_value, flows - dividends)
+    growth = np.r_[1.0, np.cumprod(1 + np.nan_to_num(portfolio_returns))]
+    value = contribution_values(flows, growth[:, None], np.ones((1, 1)))[:, 0]
+
+    traces = [scatter(
+        dates, value, mode='lines', name=f'Portfolio (${value[-1]:,.0f})',
+        line=dict(color=PALETTE[0], width=3),
+        hovertemplate='%{x}<br>$%{y:,.0f}<extra>Portfolio</extra>',
+    )]
+    notes = []
+    for i, (name, weights) in enumerate(BENCHMARKS.items(), start=1):
+        bench_dates, bench_prices = get_price_matrix(list(weights), 'adjclose')
+        index = align(dates, bench_dates, mix_index(bench_prices, list(weights.values()))) if len(bench_dates) > 1 else None
+        if index is None or np.isnan(index[flows != 0]).any():
+            notes.append(f"{name}: no history yet")
+            continue
+        # the same cash, on the same days, into the benchmark
+        replay = contribution_values(flows, np.nan_to_num(index, nan=1.0)[:, None], np.ones((1, 1)))[:, 0]
+        stats = tracking_stats(portfolio_returns, index[1:] / index[:-1] - 1)
+        ahead = round(value[-1] - replay[-1])
+        notes.append(
+            f"vs {name}: {'+' if ahead >= 0 else '-'}${abs(ahead):,.0f}, {stats['difference']:+.1%} p.a., "
+            f"tracking error {stats['tracking_error']:.1%}"
+        )
+        traces.append(scatter(
+            dates, replay, mode='lines', name=f'{name} (${replay[-1]:,.0f})',
+            line=dict(color=PALETTE[i % len(PALETTE)], width=1.5),
+            hovertemplate='%{x}<br>$%{y:,.0f}<extra>' + name + '</extra>',
+        ))
+    traces.append(scatter(
+        dates, np.cumsum(flows), mode='lines', name='Invested',
+        line=dict(color='#888', width=1.5, dash='dash'),
+        hovertemplate='%{x}<br>$%{y:,.0f}<extra>Invested</extra>',
+    ))
+    return figure(
+        traces,
+        title=title("Portfolio vs Benchmarks (dividends reinvested)<br><sup>" + ' | '.join(notes) + "</sup>", 18),
+        yaxis=dict(title=dict(text="Value (AUD)"), tickformat="$,.0f", gridcolor="#444"),
+        xaxis=dict(title=dict(text="Date"), gridcolor="#444"),
+        legend=LEGEND,
+        margin=dict(t=80, l=80, r=20, b=50),
+    )
+
+ROLLING_PANELS = [
+    ('volatility', 'Volatility', dict(tickformat='.0%')),
+    ('return', 'Return', dict(tickformat='.0%')),
+    ('beta', 'Beta', dict()),
+]
+
+def make_rolling_graph(state):
+    tickers = [etf.ticker for etf in state.holdings]
+    if not tickers:
+        return empty_figure("Rolling Statistics — no portfolio loaded")
+
+    # only reads the maintained series; every history update advances them (update_history_cache)
+    traces = []
+    for i, ticker in enumerate(tickers):
+        label = ticker.split('.')[0]
+        for n in WINDOWS:
+            series = rolling_stats.series(ticker, n)
+            if not series or not series['dates']:
+                continue
+            for row, (key, name, _) in enumerate(ROLLING_PANELS, start=1):
+                traces.append(scatter(
+                    series['dates'], series[key], mode='lines', name=f'{label} {n}d',
+                    legendgroup=f'{label} {n}d', showlegend=row == 1,
+                    visible=True if n == 90 else 'legendonly',
+                    line=dict(color=PALETTE[i % len(PALETTE)], width=1.5, dash={30: 'dot', 90: 'solid', 250: 'dash'}[n]),
+                    xaxis='x', yaxis='y' if row == 1 else f'y{row}',
+                    hovertemplate='%{x}<br>' + name + ' %{y:.2f}<extra>' + f'{label} {n}d' + '</extra>',
+                ))
+    if not traces:
+        return empty_figure("Rolling Statistics — not enough history yet, click Refresh")
+
+    axes = {}
+    for row, (_, name, fmt) in enumerate(ROLLING_PANELS, start=1):
+        top = 1 - (row - 1) / len(ROLLING_PANELS)
+        axes['yaxis' if row == 1 else f'yaxis{row}'] = dict(
+            title=dict(text=name), domain=[top - 1 / len(ROLLING_PANELS) + 0.04, top], gridcolor="#444", anchor='x', **fmt,
         )
-        return fig
+    return figure(
+        traces,
+        title=title(f"Rolling Statistics (annualised volatility, beta vs {ROLLING_BENCHMARK})"),
+        xaxis=dict(title=dict(text="Date"), gridcolor="#444"),
+        legend=LEGEND,
+        margin=MARGIN,
+        **axes,
+    )
+
+def make_dividend_efficiency_graph(state):
+    total_divs = state.summary.div_val
+    total_value = state.summary.current_value
+    if total_divs == 0 or total_value == 0:
+        return empty_figure("Dividend Efficiency — no data")
 
     ratios = {}
-    for etf in portfolio:
+    for etf in state.holdings:
         div_contribution_pct = etf.div_val / total_divs * 100
         weight_pct = etf.current_value / total_value * 100
         if weight_pct == 0:
@@ -935,65 +1449,82 @@ def make_dividend_efficiency_graph():
     vals = [x[1] for x in ratios]
     colours = ['#00CC96' if v >= 1 else '#EF553B' for v in vals]
 
-    fig = go.Figure(go.Bar(
-        x=vals, y=etfs, orientation='h',
-        marker=dict(color=colours),
-        hovertemplate='%{y}<br>Ratio: %{x:.2f}<extra></extra>',
-    ))
-    fig.add_vline(x=1.0, line=dict(color='#888', width=1, dash='dash'))
-    fig.update_layout(
-        plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-        title=dict(text="Dividend Efficiency by ETF", font=dict(size=20)),
-        xaxis=dict(title="Dividend Contribution / Portfolio Weight", gridcolor="#444"),
+    return figure(
+        [bar(
+            vals, etfs, orientation='h',
+            marker=dict(color=colours),
+            hovertemplate='%{y}<br>Ratio: %{x:.2f}<extra></extra>',
+        )],
+        title=title("Dividend Efficiency by ETF"),
+        xaxis=dict(title=dict(text="Dividend Contribution / Portfolio Weight"), gridcolor="#444"),
         margin=dict(t=50, l=100, r=20, b=50),
         yaxis=dict(autorange='reversed', ticklabelposition="outside", ticklen=10, automargin=True),
+        shapes=[vline(1.0, color='#888', width=1, dash='dash')],
     )
-    return fig
-
-def make_dividends_bar_graph():
-    portfolio_tickers = {etf.ticker for etf in portfolio}
-    dividends = [d for d in load_dividends() if d['ticker'] in portfolio_tickers]
-    if not dividends:
-        fig = go.Figure()
-        fig.update_layout(
-            plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-            title=dict(text="Dividend Payments — no data found", font=dict(size=14)),
-        )
-        return fig
+
+def make_dividends_bar_graph(state):
+    dividends = get_dividend_index()
+    tickers = sorted(etf.ticker for etf in state.holdings if etf.ticker in dividends.amounts)
+    if not tickers:
+        return empty_figure("Dividend Payments — no data found")
 
     # Group by ticker so each gets its own coloured bar series
-    tickers = sorted({d['ticker'] for d in dividends})
-    all_dates = sorted({d['date'] for d in dividends})
-    palette = ['#636EFA', '#EF553B', '#00CC96', '#FECB52', '#AB63FA', '#FFA15A']
-    ticker_colours = {t: palette[i % len(palette)] for i, t in enumerate(tickers)}
+    all_dates = dividends.payment_dates(tickers)
+    ticker_colours = {t: PALETTE[i % len(PALETTE)] for i, t in enumerate(tickers)}
 
-    fig = go.Figure()
+    traces = []
     for ticker in tickers:
         label = ticker.split('.')[0]
-        amounts = []
-        for d in all_dates:
-            total = sum(dv['amount'] for dv in dividends if dv['ticker'] == ticker and dv['date'] == d)
-            amounts.append(total if total else None)
-        fig.add_trace(go.Bar(
-            x=all_dates, y=amounts, name=label,
-            marker_color=ticker_colours[ticker],
+        amounts = [total if total else None for total in dividends.payments(ticker, all_dates)]
+        traces.append(bar(
+            all_dates, amounts, name=label,
+            marker=dict(color=ticker_colours[ticker]),
             hovertemplate='%{x}<br>$%{y:,.2f}<extra>' + label + '</extra>',
         ))
 
-    fig.update_layout(
-        plot_bgcolor="#222", paper_bgcolor="#222", font=dict(color="#ccc"),
-        title=dict(text="Dividend Payments Over Time", font=dict(size=20)),
+    return figure(
+        traces,
+        title=title("Dividend Payments Over Time"),
         barmode='stack',
-        yaxis=dict(title="Amount (AUD)", tickformat="$,.0f", gridcolor="#444"),
-        xaxis=dict(title="Date", gridcolor="#444"),
-        legend=dict(bgcolor="#333", bordercolor="#555", borderwidth=1),
-        margin=dict(t=50, l=80, r=20, b=50),
+        yaxis=dict(title=dict(text="Amount (AUD)"), tickformat="$,.0f", gridcolor="#444"),
+        xaxis=dict(title=dict(text="Date"), gridcolor="#444"),
+        legend=LEGEND,
+        margin=MARGIN,
+    )
+
+def make_dividend_income_graph(state):
+    dividends = get_dividend_index()
+    tickers = [etf.ticker for etf in state.holdings if etf.ticker in dividends.amounts]
+    dates, _, _, trailing, yield_on_cost = dividends.series(tickers)
+    if not dates:
+        return empty_figure("Trailing 12-Month Dividend Income — no data found")
+
+    traces = [scatter(
+        dates, trailing, name="Trailing 12M Income",
+        mode='lines+markers', line=dict(color='#00CC96', width=2, shape='hv'),
+        marker=dict(size=6),
+        hovertemplate='%{x}<br>$%{y:,.2f}<extra>Trailing 12M</extra>',
+    )]
+    if yield_on_cost and any(y is not None for y in yield_on_cost):
+        traces.append(scatter(
+            dates, yield_on_cost, name="Yield on Cost", yaxis='y2',
+            mode='lines+markers', line=dict(color='#FECB52', width=2, dash='dot', shape='hv'),
+            marker=dict(size=6),
+            hovertemplate='%{x}<br>%{y:.2f}%<extra>Yield on Cost</extra>',
+        ))
+    return figure(
+        traces,
+        title=title("Trailing 12-Month Dividend Income"),
+        yaxis=dict(title=dict(text="Income (AUD)"), tickformat="$,.0f", gridcolor="#444"),
+        yaxis2=dict(title=dict(text="Yield on Cost (%)"), ticksuffix="%", overlaying='y', side='right', showgrid=False),
+        xaxis=dict(title=dict(text="Date"), gridcolor="#444"),
+        legend=LEGEND,
+        margin=dict(t=50, l=80, r=80, b=50),
     )
-    return fig
 
 def load_portfolio():
-    global portfolio
-    portfolio = []
+    # returns a fresh working set of holdings; publish_portfolio makes it visible to callbacks
+    holdings = []
 
     # Load static config: ticker → issuer + holdings file
     config = {}
@@ -1003,30 +1534,24 @@ def load_portfolio():
                 config[row['Ticker'].strip()] = {
                     'issuer': row['Issuer'].strip(),
                     'holdings_file': row['HoldingsFile'].strip(),
+                    'holdings_url': (row.get('HoldingsURL') or '').strip() or None,
                 }
     except FileNotFoundError:
         print("etf_config.csv not found")
-        return
+        return holdings
 
-    # Derive units and cost basis from purchases
-    units_by_ticker = {t: 0.0 for t in config}
-    paid_by_ticker  = {t: 0.0 for t in config}
-    for trade in load_purchases():
-        t = trade['ticker']
-        if t not in config:
-            continue
-        units_by_ticker[t] += trade['units']
-        paid_by_ticker[t]  += trade['total'] if trade['units'] > 0 else -trade['total']
+    # Derive units and cost basis held today from purchases
+    positions = get_position_index()
+    today = date.today().isoformat()
+    units_by_ticker = {t: positions.units_at(t, today) for t in config}
+    paid_by_ticker  = {t: positions.cost_at(t, today) for t in config}
 
     # Derive dividends from dividends.csv
-    div_by_ticker = {t: 0.0 for t in config}
-    for div in load_dividends():
-        t = div['ticker']
-        if t in config:
-            div_by_ticker[t] += div['amount']
+    dividend_totals = get_dividend_index().ticker_totals
+    div_by_ticker = {t: dividend_totals.get(t, 0.0) for t in config}
 
     for ticker, cfg in config.items():
-        portfolio.append(Holding(
+        holdings.append(Holding(
             ticker=ticker,
             name=ticker,
             units=int(round(units_by_ticker[ticker])),
@@ -1034,8 +1559,11 @@ def load_portfolio():
             div_val=div_by_ticker[ticker],
             issuer=cfg['issuer'],
             holdings_file=cfg['holdings_file'],
+            holdings_url=cfg['holdings_url'],
         ))
 
+    return holdings
+
 def format_change(pct, val):
     sign = "▲" if val > 0 else "▼" if val < 0 else ""
     color = "springgreen" if val > 0 else "tomato" if val < 0 else "white"
@@ -1082,7 +1610,7 @@ app.layout = html.Div(
                     id="etf-container",
                     className="etf-container",
                     children=[
-                        generate_etf_row(etf) for etf in portfolio] + [generate_etf_row(summary_data)]
+                        generate_etf_row(etf) for etf in current.holdings] + [generate_etf_row(current.summary)]
                 ),
 
                 # Right column
@@ -1097,6 +1625,7 @@ app.layout = html.Div(
                                 {"label": "Total % Impact by ETF", "value": "total-impact"},
                                 {"label": "Total Holdings by Weight", "value": "weights"},
                                 {"label": "Top Individual Holdings", "value": "top-holdings"},
+                                {"label": "Look-through Daily Movers", "value": "lookthrough"},
                                 {"label": "Top Individual Countries", "value": "top-countries"},
                                 {"label": "Top Individual Sectors", "value": "top-sectors"},
                                 {"label": "ETF Comparative Efficiency", "value": "efficiency"},
@@ -1104,12 +1633,19 @@ app.layout = html.Div(
                                 {"label": "Profit Over Time", "value": "profit"},
                                 {"label": "Dividend Payments", "value": "dividends-bar"},
                                 {"label": "Dividend Efficiency by ETF", "value": "dividends-efficiency"},
+                                {"label": "Trailing 12-Month Dividend Income", "value": "dividends-t12m"},
                                 {"label": "Drawdown From Peak", "value": "drawdown"},
                                 {"label": "Cumulative Return by ETF", "value": "etf-returns"},
                                 {"label": "Cumulative Dividends", "value": "cumulative-dividends"},
                                 {"label": "Average Cost Per Unit", "value": "avg-cost"},
                                 {"label": "Average Cost Per Unit (Normalised)", "value": "avg-cost-norm"},
                                 {"label": "ETF Return Correlation", "value": "correlation"},
+                                {"label": "ETF Holdings Overlap", "value": "overlap"},
+                                {"label": "What-if Allocations", "value": "what-if"},
+                                {"label": "Projected Value (Monte Carlo)", "value": "projection"},
+                                {"label": "Strategy Backtest", "value": "backtest"},
+                                {"label": "Portfolio vs Benchmarks", "value": "benchmarks"},
+                                {"label": "Rolling Statistics", "value": "rolling"},
                                 {"label": "Daily Movements (Last Month)", "value": "monthly-heatmap"},
                                 {"label": "Daily Movements (Last Year)", "value": "yearly-heatmap"},
                                 
@@ -1128,18 +1664,46 @@ app.layout = html.Div(
         html.Div(
             [
                 html.Button("Refresh", id="refresh-button", style={"padding": "0.5rem 1rem", "fontSize": "1rem"}),
-                html.Div(id="status-line", style={"color": "#ccc", "alignSelf": "center"})
+                html.Div(id="status-line", style={"color": "#ccc", "alignSelf": "center"}),
+                html.Button("Backfill History", id="bootstrap-button", style={"padding": "0.5rem 1rem", "fontSize": "1rem"}),
+                html.Div(id="bootstrap-status", style={"color": "#ccc", "alignSelf": "center"}),
+                dcc.Interval(id="bootstrap-poll", interval=2000, disabled=True),
             ],
             style={"display": "flex", "alignItems": "center", "gap": "1rem", "marginBottom": "1rem"}
         )
     ],
 )
 
-def fetch_etf_data():
+def get_cached_yahoo_data(tickers, allow_stale=False):
+    """get_yahoo_data behind the market-hours-aware quote cache in price_cache.json.
+
+    A quote stays fresh for a minute while the ASX trades and until the next
+    open otherwise, so refreshes on evenings, weekends and public holidays make
+    no request. With allow_stale, expired quotes up to STALE_WHILE_REVALIDATE
+    old are returned as-is and the second return value is True, asking the
+    caller to revalidate in the background.
+    """
+    cached = load_price_cache()
+    quotes = {t: cached[t]['quote'] for t in tickers if (cached.get(t) or {}).get('quote')}
+    now = time.time()
+    if len(quotes) == len(tickers):
+        if all(quote_is_fresh(q['fetched'], now) for q in quotes.values()):
+            return quotes, False
+        if allow_stale and all(now - q['fetched'] < STALE_WHILE_REVALIDATE for q in quotes.values()):
+            return quotes, True
+
+    fetched_at = time.time()
+    quotes = get_yahoo_data(tickers)
+    for q in quotes.values():
+        q['fetched'] = fetched_at
+    return quotes, False
+
+def fetch_etf_data(holdings, summary, allow_stale=False):
+    # returns True if stale cached quotes were used and should be revalidated
     print('Updating ETF data.')
-    curr_prices = get_yahoo_data([etf.ticker for etf in portfolio])
+    curr_prices, stale = get_cached_yahoo_data([etf.ticker for etf in holdings], allow_stale)
 
-    for etf in portfolio:
+    for etf in holdings:
         if etf.ticker not in curr_prices:
             print(f"Warning: no price data for {etf.ticker}, skipping")
             continue
@@ -1156,31 +1720,125 @@ def fetch_etf_data():
             etf.div_pct = etf.div_val / etf.total_paid * 100
             etf.grand_total_pct = (etf.current_value + etf.div_val - etf.total_paid) / etf.total_paid * 100
 
-    summary_data.daily_change_val = sum(etf.daily_change_val for etf in portfolio)
-    summary_data.total_change_val = sum(etf.total_change_val for etf in portfolio)
-    summary_data.total_paid = sum(etf.total_paid for etf in portfolio)
-    summary_data.current_value = sum(etf.current_value for etf in portfolio)
-    summary_data.div_val = sum(etf.div_val for etf in portfolio)
-    summary_data.grand_total_val = summary_data.total_change_val + summary_data.div_val
+    summary.daily_change_val = sum(etf.daily_change_val for etf in holdings)
+    summary.total_change_val = sum(etf.total_change_val for etf in holdings)
+    summary.total_paid = sum(etf.total_paid for etf in holdings)
+    summary.current_value = sum(etf.current_value for etf in holdings)
+    summary.div_val = sum(etf.div_val for etf in holdings)
+    summary.grand_total_val = summary.total_change_val + summary.div_val
 
-    if summary_data.current_value != 0:
-        for etf in portfolio:
-            etf.weight = etf.current_value / summary_data.current_value
-        summary_data.daily_change_pct = (summary_data.daily_change_val / summary_data.current_value) * 100
+    if summary.current_value != 0:
+        for etf in holdings:
+            etf.weight = etf.current_value / summary.current_value
+        summary.daily_change_pct = (summary.daily_change_val / summary.current_value) * 100
 
-    if summary_data.total_paid != 0:
-        summary_data.div_pct = summary_data.div_val / summary_data.total_paid * 100
-        summary_data.total_change_pct = (summary_data.total_change_val / summary_data.total_paid) * 100
-        summary_data.grand_total_pct = (summary_data.grand_total_val / summary_data.total_paid) * 100
+    if summary.total_paid != 0:
+        summary.div_pct = summary.div_val / summary.total_paid * 100
+        summary.total_change_pct = (summary.total_change_val / summary.total_paid) * 100
+        summary.grand_total_pct = (summary.grand_total_val / summary.total_paid) * 100
 
     save_price_cache({
         etf.ticker: {
             'daily_change_pct': etf.daily_change_pct,
             'daily_change_val': etf.daily_change_val,
             'current_value':    etf.current_value,
+            'quote':            curr_prices.get(etf.ticker),
         }
-        for etf in portfolio
+        for etf in holdings
     })
+    return stale
+
+def publish_portfolio(holdings, summary):
+    # make a fully computed working set the current state for every worker
+    global current
+    snap = portfolio_store.publish([asdict(h) for h in holdings], asdict(summary))
+    current = state = PortfolioState(snap.version, tuple(holdings), summary)
+    return state
+
+def use_latest_portfolio():
+    """The newest published snapshot, as one immutable PortfolioState.
+
+    Callbacks resolve this once and pass it to everything they render, so every
+    worker renders the same numbers and a publish part way through a render
+    can't mix two versions. The first caller on a fresh install builds the
+    snapshot from the config and the price cache.
+    """
+    global current
+    snap = portfolio_store.latest()
+    if snap is None:
+        holdings, summary = load_portfolio(), Holding(ticker="Total...")
+        apply_price_cache(holdings, summary)
+        return publish_portfolio(holdings, summary)
+    state = current
+    if snap.version != state.version:
+        state = current = PortfolioState(snap.version, tuple(Holding(**h) for h in snap.holdings), Holding(**snap.summary))
+    return state
+
+def _refresh_from_yahoo(auto, allow_stale):
+    # another worker may have finished the daily refresh while we were waiting
+    if auto and not should_auto_refresh():
+        return
+    holdings, summary = load_portfolio(), Holding(ticker="Total...")
+    start_holdings_sync(holdings)
+    if fetch_etf_data(holdings, summary, allow_stale):
+        # the revalidation carries the auto flag, so it records the daily refresh once quotes are fresh
+        threading.Thread(target=_revalidate_quotes, args=(auto,), daemon=True).start()
+    backfill = FileLock(BACKFILL_LOCK, blocking=False)
+    if backfill.acquire():
+        try:
+            update_history_cache(holdings)
+        finally:
+            backfill.release()
+    else:
+        print("History backfill running, skipping the history update")
+    publish_portfolio(holdings, summary)
+    # stale or missing quotes leave the day unrecorded, so the next daily check tries again
+    if auto and quotes_are_fresh(holdings):
+        mark_auto_refreshed()
+
+def _revalidate_quotes(auto):
+    try:
+        refresh_flight.run(_refresh_from_yahoo, auto, False, force=True)
+    except LockTimeout:
+        print("Quote revalidation skipped: another refresh is still running")
+
+def refresh_from_yahoo(auto=False, allow_stale=False):
+    """Reload the portfolio, fetch prices and history, and sync holdings in the background.
+
+    Concurrent callers in any thread or worker are coalesced: one does the
+    fetch and publishes the fresh state to the shared store, the rest wait
+    for it, and callers within a few seconds of it finishing reuse it too.
+    With allow_stale, recently expired cached quotes are published straight
+    away and refetched in a background thread. Returns True if this caller
+    did the refresh; either way callers should then use_latest_portfolio().
+    Raises LockTimeout if a refresh in flight is stuck past FLIGHT_TIMEOUT.
+    """
+    return refresh_flight.run(_refresh_from_yahoo, auto, allow_stale)
+
+@app.callback(
+    Output("bootstrap-status", "children"),
+    Output("bootstrap-poll", "disabled"),
+    Input("bootstrap-button", "n_clicks"),
+    Input("bootstrap-poll", "n_intervals"),
+    prevent_initial_call=True,
+)
+def handle_bootstrap(n_clicks, n_poll):
+    if dash.callback_context.triggered_id == "bootstrap-button":
+        if not start_history_bootstrap():
+            return "History backfill or update already running — try again shortly", True
+        return "Starting history backfill…", False
+
+    state = load_bootstrap_progress()
+    if not state:
+        return dash.no_update, False
+    if state.get('error'):
+        return f"History backfill failed: {state['error']}", True
+    text = f"History backfill: {state.get('done', 0)}/{state.get('total', 0)} requests"
+    if state.get('failed'):
+        text += f", {state['failed']} chunk(s) failed"
+    if state['running']:
+        return text, False
+    return text + " — done, refresh to redraw", True
 
 @app.callback(
     Output("status-line", "children"),
@@ -1201,173 +1859,132 @@ def handle_all(n_clicks, n_startup, n_yahoo, n_daily, graph_mode):
     graph = dash.no_update
 
     if triggered == "startup-trigger":
-        load_portfolio()
-        apply_price_cache()
+        state = use_latest_portfolio()
         status = "Loading live prices…"
-        container = [generate_etf_header()] + [generate_etf_row(etf) for etf in portfolio] + [generate_etf_row(summary_data)]
+        container = [generate_etf_header()] + [generate_etf_row(etf) for etf in state.holdings] + [generate_etf_row(state.summary)]
 
     elif triggered == "daily-check":
         if not should_auto_refresh():
             return dash.no_update, dash.no_update, dash.no_update
-        load_portfolio()
-        fetch_etf_data()
-        update_history_cache()
-        mark_auto_refreshed()
-        status = f"Auto-refreshed at {datetime.now().strftime('%I:%M:%S %p').lstrip('0')}"
-        container = [generate_etf_header()] + [generate_etf_row(etf) for etf in portfolio] + [generate_etf_row(summary_data)]
+        try:
+            refresh_from_yahoo(auto=True, allow_stale=True)
+            status = f"Auto-refreshed at {datetime.now().strftime('%I:%M:%S %p').lstrip('0')}"
+        except LockTimeout:
+            status = "Another refresh is taking too long — showing the last published prices"
+        state = use_latest_portfolio()
+        container = [generate_etf_header()] + [generate_etf_row(etf) for etf in state.holdings] + [generate_etf_row(state.summary)]
 
     elif triggered in ["refresh-button", "yahoo-refresh"]:
-        load_portfolio()
-        fetch_etf_data()
-        update_history_cache()
-        status = f"Last refreshed at {datetime.now().strftime('%I:%M:%S %p').lstrip('0')}"
-        container = [generate_etf_header()] + [generate_etf_row(etf) for etf in portfolio] + [generate_etf_row(summary_data)]
+        # the page-load refresh may show recent stale quotes; the button always wants fresh ones
+        try:
+            refresh_from_yahoo(allow_stale=triggered == "yahoo-refresh")
+            status = f"Last refreshed at {datetime.now().strftime('%I:%M:%S %p').lstrip('0')}"
+        except LockTimeout:
+            status = "Another refresh is taking too long — showing the last published prices"
+        state = use_latest_portfolio()
+        container = [generate_etf_header()] + [generate_etf_row(etf) for etf in state.holdings] + [generate_etf_row(state.summary)]
+
+    if triggered == "graph-selector":
+        state = use_latest_portfolio()
 
     if triggered in ["refresh-button", "startup-trigger", "yahoo-refresh", "daily-check", "graph-selector"]:
-        if graph_mode == "daily-impact":
-            graph = dcc.Graph(figure=make_impact_graph())
-        elif graph_mode == "total-impact":
-            graph = dcc.Graph(figure=make_impact_graph('total'))
-        elif graph_mode == "weights":
-            graph = dcc.Graph(figure=make_weights_treemap())
-        elif graph_mode == "top-holdings":
-            graph = dcc.Graph(figure=make_top_holdings_graph())
-        elif graph_mode == "top-countries":
-            graph = dcc.Graph(figure=make_top_countries_graph())
-        elif graph_mode == "top-sectors":
-            graph = dcc.Graph(figure=make_top_sectors_graph())
-        elif graph_mode == "efficiency":
-            graph = dcc.Graph(figure=make_efficiency_graph())
-        elif graph_mode == "history":
-            graph = dcc.Graph(figure=make_history_graph())
-        elif graph_mode == "profit":
-            graph = dcc.Graph(figure=make_profit_graph())
-        elif graph_mode == "dividends-bar":
-            graph = dcc.Graph(figure=make_dividends_bar_graph())
-        elif graph_mode == "dividends-efficiency":
-            graph = dcc.Graph(figure=make_dividend_efficiency_graph())
-        elif graph_mode == "drawdown":
-            graph = dcc.Graph(figure=make_drawdown_graph())
-        elif graph_mode == "etf-returns":
-            graph = dcc.Graph(figure=make_etf_returns_graph())
-        elif graph_mode == "cumulative-dividends":
-            graph = dcc.Graph(figure=make_cumulative_dividends_graph())
-        elif graph_mode == "avg-cost":
-            graph = dcc.Graph(figure=make_avg_cost_graph())
-        elif graph_mode == "avg-cost-norm":
-            graph = dcc.Graph(figure=make_avg_cost_normalised_graph())
-        elif graph_mode == "correlation":
-            graph = dcc.Graph(figure=make_correlation_heatmap())
-        elif graph_mode == "monthly-heatmap":
-            graph = dcc.Graph(figure=make_monthly_heatmap())
-        elif graph_mode == "yearly-heatmap":
-            graph = dcc.Graph(figure=make_yearly_heatmap())
+        if graph_mode == "lookthrough":
+            graph = dcc.Graph(id="lookthrough-graph", figure=flow.get('figure:lookthrough', state=state), style={"height": "80vh"})
+        elif graph_mode in FIGURES:
+            graph = dcc.Graph(figure=flow.get('figure:' + graph_mode, state=state))
 
     return status, container, graph
 
-def make_impact_graph(graph_type='daily'):
+def make_impact_graph(state, graph_type='daily'):
     # Build bar chart of weighted impact
-    tickers = [etf.ticker for etf in portfolio]
+    tickers = [etf.ticker for etf in state.holdings]
 
     if graph_type == 'daily':
-        impacts = [etf.daily_change_pct * etf.weight for etf in portfolio]  # in %
-        title = "Daily Portfolio Impact by ETF"
+        impacts = [etf.daily_change_pct * etf.weight for etf in state.holdings]  # in %
+        graph_title = "Daily Portfolio Impact by ETF"
     elif graph_type == 'total':
-        impacts = [etf.grand_total_pct * etf.weight for etf in portfolio] # in %
-        title = "Total Portfolio Impact by ETF"
+        impacts = [etf.grand_total_pct * etf.weight for etf in state.holdings] # in %
+        graph_title = "Total Portfolio Impact by ETF"
 
     colors = ["green" if val > 0 else "red" if val < 0 else "white" for val in impacts]
     labels = [f"{val:+.2f}%" for val in impacts]
 
-    figure = {
-        "data": [
-            {
-                "x": tickers,
-                "y": impacts,
-                "type": "bar",
-                "text": labels,
-                "textposition": "auto",
-                "marker": {"color": colors},
-            }
-        ],
-        "layout": {
-            "plot_bgcolor": "#222",
-            "paper_bgcolor": "#222",
-            "font": {"color": "#ccc"},
-            "title": {"text": title, "font": {"size": 20}},
-            "yaxis": {"title": "Impact (%)"},
-        },
-    }
-    return figure
-
-def make_weights_treemap():
-    tickers = [etf.ticker for etf in portfolio]
-    weights = [etf.weight for etf in portfolio]
-
-    data = {'Ticker': tickers, 'Weight': weights}
-    figure = px.treemap(data, path=["Ticker"], values="Weight", custom_data=["Ticker", "Weight"], 
-                        title="ETF Portfolio Weights")
-
-    figure.update_traces(
-        texttemplate="%{customdata[0]}<br>%{customdata[1]:.1%}",  # Custom text
-        textfont=dict(color="black", size=16),
-        marker=dict(cornerradius=10),
-        hovertemplate="%{customdata[0]}<br>%{customdata[1]:.1%}"
+    return figure(
+        [bar(tickers, impacts, text=labels, textposition="auto", marker={"color": colors})],
+        title=title(graph_title),
+        yaxis={"title": {"text": "Impact (%)"}},
     )
 
-    figure.update_layout(
-        plot_bgcolor="#222",  # Inside the plot area
-        paper_bgcolor="#222",  # Outside the plot area (like the margin)
-        font=dict(color="#ccc"),  # All text (title, labels, etc.)
-        margin = dict(t=35, l=10, r=10, b=10)
-    )
+def make_weights_treemap(state):
+    tickers = [etf.ticker for etf in state.holdings]
+    weights = [etf.weight for etf in state.holdings]
+
+    treemap = {
+        'type': 'treemap', 'ids': tickers, 'labels': tickers, 'parents': [''] * len(tickers),
+        'values': array(weights), 'branchvalues': 'total',
+        'customdata': [[t, round(w, ROUND_DIGITS)] for t, w in zip(tickers, weights)],
+        'texttemplate': "%{customdata[0]}<br>%{customdata[1]:.1%}",  # Custom text
+        'textfont': dict(color="black", size=16),
+        'marker': dict(cornerradius=10),
+        'hovertemplate': "%{customdata[0]}<br>%{customdata[1]:.1%}",
+    }
+    return figure([treemap], title=dict(text="ETF Portfolio Weights"), margin=dict(t=35, l=10, r=10, b=10))
+
+# look-through: the constituent index is rebuilt only when holdings files change,
+# quotes once per TTL, and a new portfolio snapshot only reweights the result
+flow.derived('lookthrough_index', ['holdings', 'config'], lambda state: constituent_index(state.holdings, DATA_DIR))
+flow.derived('constituent_changes', ['lookthrough_index', 'constituent_quotes'],
+             lambda state: constituent_quotes(flow.get('lookthrough_index', state=state)['Symbol'].unique().tolist(),
+                                              get_constituent_cache_path()))
+flow.derived('lookthrough', ['lookthrough_index', 'constituent_changes', 'prices'],
+             lambda state: apply_changes(read_constituents(state.holdings, DATA_DIR, flow.get('lookthrough_index', state=state)),
+                                         flow.get('constituent_changes', state=state)))
+
+def get_lookthrough_data(state):
+    # constituent frame for the look-through treemap, reused by drill-down clicks
+    return flow.get('lookthrough', state=state)
+
+def make_lookthrough_treemap(state, focus=None):
+    df = get_lookthrough_data(state)
+    if df.empty:
+        return empty_figure("Look-through Daily Movers — no holdings data")
+    return build_treemap(df, focus)
 
-    return figure
+@app.callback(
+    Output("lookthrough-graph", "figure"),
+    Input("lookthrough-graph", "clickData"),
+    prevent_initial_call=True,
+)
+def drill_lookthrough(click_data):
+    # fetch only the clicked branch's children, keeping the initial payload small
+    return make_lookthrough_treemap(use_latest_portfolio(), treemap_focus_from_click(click_data))
 
-def make_top_holdings_graph():
-    top_holdings = read_holding_csvs('holdings', 25)
+def make_top_holdings_graph(state):
+    top_holdings = read_holding_csvs(state, 'holdings', 25)
     holdings, weights = zip(*top_holdings)
     holdings = [x + ' ' for x in holdings]
 
-    fig = go.Figure(go.Bar(
-    x=weights,
-    y=holdings,
-    orientation='h',  # 'h' for horizontal bars
-    ))
-
-    fig.update_layout(
-        plot_bgcolor="#222",  # Inside the plot area
-        paper_bgcolor="#222",  # Outside the plot area (like the margin)
-        font=dict(color="#ccc"),  # All text (title, labels, etc.)
-        margin = dict(t=35, l=10, r=10, b=10),
+    return figure(
+        [bar(weights, holdings, orientation='h')],  # 'h' for horizontal bars
+        margin=dict(t=35, l=10, r=10, b=10),
         yaxis=dict(
             autorange='reversed',
             ticklabelposition="outside",
             automargin=True
         )
     )
-    return fig
 
-def make_top_countries_graph():
-    top_countries = read_holding_csvs('countries', 20)
+def make_top_countries_graph(state):
+    top_countries = read_holding_csvs(state, 'countries', 20)
     countries, weights = zip(*top_countries)
     emerging_markets = ['Hong Kong', 'India', 'Taiwan', 'Brazil', 'Saudi Arabia', 'South Africa']
     bar_colours =  ['#EF553B' if c in emerging_markets else '#636EFA' for c in countries]
     # add spacing to name to avoid butting up against axis
     countries = [x + ' ' for x in countries] 
 
-    fig = go.Figure(go.Bar(
-    x=weights,
-    y=countries,
-    orientation='h',  # 'h' for horizontal bars
-    marker=dict(color=bar_colours)
-    ))
-
-    fig.update_layout(
-        plot_bgcolor="#222",  # Inside the plot area
-        paper_bgcolor="#222",  # Outside the plot area (like the margin)
-        font=dict(color="#ccc"),  # All text (title, labels, etc.)
-        margin = dict(t=35, l=100, r=10, b=10),
+    return figure(
+        [bar(weights, countries, orientation='h', marker=dict(color=bar_colours))],
+        margin=dict(t=35, l=100, r=10, b=10),
         yaxis=dict(
             autorange='reversed',
             ticklabelposition="outside",
@@ -1375,25 +1992,16 @@ def make_top_countries_graph():
             automargin=True
         )
     )
-    return fig
 
-def make_top_sectors_graph():
-    top_sectors = read_holding_csvs('sectors', 11)
+def make_top_sectors_graph(state):
+    top_sectors = read_holding_csvs(state, 'sectors', 11)
     sectors, weights = zip(*top_sectors)
     # add spacing to name to avoid butting up against axis
     sectors = [x + ' ' for x in sectors] 
 
-    fig = go.Figure(go.Bar(
-    x=weights,
-    y=sectors,
-    orientation='h',  # 'h' for horizontal bars
-    ))
-
-    fig.update_layout(
-        plot_bgcolor="#222",  # Inside the plot area
-        paper_bgcolor="#222",  # Outside the plot area (like the margin)
-        font=dict(color="#ccc"),  # All text (title, labels, etc.)
-        margin = dict(t=35, l=100, r=10, b=10),
+    return figure(
+        [bar(weights, sectors, orientation='h')],
+        margin=dict(t=35, l=100, r=10, b=10),
         yaxis=dict(
             autorange='reversed',
             ticklabelposition="outside",
@@ -1401,16 +2009,15 @@ def make_top_sectors_graph():
             automargin=True
         )
     )
-    return fig
     
-def make_efficiency_graph():
+def make_efficiency_graph(state):
     perfs = {}
 
-    for p in portfolio:
-        if summary_data.grand_total_val == 0 or summary_data.total_paid == 0:
+    for p in state.holdings:
+        if state.summary.grand_total_val == 0 or state.summary.total_paid == 0:
             continue
-        contribution_pct = p.grand_total_val / summary_data.grand_total_val * 100
-        original_weight_pct = p.total_paid / summary_data.total_paid * 100
+        contribution_pct = p.grand_total_val / state.summary.grand_total_val * 100
+        original_weight_pct = p.total_paid / state.summary.total_paid * 100
         if original_weight_pct == 0:
             continue
         perf_ratio = contribution_pct / original_weight_pct
@@ -1420,17 +2027,9 @@ def make_efficiency_graph():
     etfs = [x[0] + '  ' for x in perfs]
     perf = [x[1] for x in perfs]
 
-    fig = go.Figure(go.Bar(
-    x=perf,
-    y=etfs,
-    orientation='h',  # 'h' for horizontal bars
-    ))
-
-    fig.update_layout(
-        plot_bgcolor="#222",  # Inside the plot area
-        paper_bgcolor="#222",  # Outside the plot area (like the margin)
-        font=dict(color="#ccc"),  # All text (title, labels, etc.)
-        margin = dict(t=35, l=100, r=10, b=10),
+    return figure(
+        [bar(perf, etfs, orientation='h')],
+        margin=dict(t=35, l=100, r=10, b=10),
         yaxis=dict(
             autorange='reversed',
             ticklabelposition="outside",
@@ -1438,116 +2037,33 @@ def make_efficiency_graph():
             automargin=True
         )
     )
-    return fig
-
-
-def translate_country_code(code):
-    codes = {'HK': 'Hong Kong', 'IN': 'India', 'TW': 'Taiwan', 'US': 'United States',
-             'SA': 'Saudi Arabia', 'BR': 'Brazil', 'MX': 'Mexico', 'CA': 'Canada', 
-             'ZA': 'South Africa', 'DE': 'Germany', 'FR': 'France', 'ES': 'Spain',
-             'GB': 'United Kingdom', 'IT': 'Italy', 'NL': 'Netherlands', 'BE': 'Belgium',
-             'AU': 'Australia', 'AT': 'Austria', 'CH': 'Switzerland', 'SE': 'Sweden',
-             'NO': 'Norway', 'DK': 'Denmark', 'FI': 'Finland', 'IE': 'Ireland',
-             'PT': 'Portugal', 'GR': 'Greece', 'CY': 'Cyprus', 'IL': 'Israel',
-             'SG': 'Singapore', 'MY': 'Malaysia', 'PH': 'Philippines', 'ID': 'Indonesia', 
-    }
-    return codes.get(code, code)
-
-def translate_sector(sector):
-    sectors = {'Consumer Staples Distribution & Retail': 'Consumer Staples',
-               "Health Care Providers & Services": 'Healthcare',
-               "Software & Computer Services": 'Information Technology',
-               'Banks': 'Financials', "Technology Hardware & Equipment": 'Information Technology',
-               "Telecommunications Service Providers": 'Communication Services',
-               "Precious Metals & Mining": 'Materials',  'Retailers': 'Consumer Discretionary',
-               "Leisure Goods": 'Consumer Discretionary', "Travel & Leisure": 'Consumer Discretionary',
-               "Industrial Metals & Mining": 'Materials', 'Software': 'Information Technology',
-               "Textiles, Apparel & Luxury Goods": 'Consumer Discretionary',
-               "Construction & Engineering": 'Industrials', 'Insurance': 'Financials',
-               'Life Insurance': 'Financials', 'Metals & Mining': 'Materials',
-               'Telecommunications Equipment': 'Communication Services',
-               'Beverages': 'Consumer Staples', 'Electricity': 'Utilities',
-               'Pharmaceuticals & Biotechnology': 'Healthcare',
-               "Real Estate Management & Development": 'Real Estate',
-               'Aerospace & Defense': 'Industrials', 'Oil, Gas & Coal': 'Energy',
-               '"Health Care Equipment & Supplies"': 'Healthcare',
-               "Diversified Telecommunication Services": 'Communication Services',
-               'Finance & Credit Services': 'Financials', 'Chemicals': 'Materials',
-               'Food Producers': 'Consumer Staples', 'Machinery': 'Industrials',
-               'Industrial Transportation': 'Industrials',
-               'Construction & Materials': 'Industrials',
-               "Personal Care, Drug & Grocery Stores": 'Consumer Staples',
-               "Real Estate Investment & Services": 'Real Estate',
-               "Investment Banking & Brokerage Services": 'Financials',
-               'Health Care Providers': 'Healthcare', 'General Industrials': 'Industrials',
-               'Electronic & Electrical Equipment': 'Industrials',
-               'Non-life Insurance': 'Financials', 'Personal Goods': 'Consumer Staples',
-               'Media': 'Communication Services', 'Consumer Services': 'Consumer Staples',
-    }
-    return sectors.get(sector, sector)
 
-def read_holding_csvs(mode, num_returned=20):
+
+def read_holding_csvs(state, mode, num_returned=20):
     # mode determines returned data - can be holdings, countries or sectors
-    '''
-    betashares header:
-    Ticker,Name,Asset Class,Sector,Country,Currency,Weight (%),Shares/Units (#),Market Value (AUD),Notional Value (AUD)
-    vanguard header:
-    "Holding Name",Ticker,Sector,"Country code","% of net assets","Market value (AUD)","# of units"
-    '''
-    #etd, stock name, weight, sector, country
-    etfs, names, weights = [], [], []
+    names, weights = [], []
     countries, sectors = {}, {}
 
-    # this is the number of lines to skip at the top of each file
-    skiprows = {'betashares': 6, 'vanguard': 3}
-
-    total = sum(p.weight for p in portfolio)
+    total = sum(p.weight for p in state.holdings)
     if total == 0:
         return []
-    port_weights = {p.ticker: (p.weight / total) for p in portfolio if p.weight > 0}
-
-    for p in portfolio:
-
-        # correct paths for Linux vs Windows
-        filepath = DATA_DIR + p.holdings_file
-
-        with open(filepath, 'r', encoding='cp1252') as infile:
-            for _ in range(skiprows[p.issuer]):
-                next(infile)
-            
-            reader = csv.DictReader(infile)
-            currnames = []
-
-            if p.issuer == 'betashares':
-                for row in reader:
-                    try:
-                        if row['Name'] and row['Weight (%)']:
-                            if row['Name'] != 'AUD - AUSTRALIA DOLLAR':
-                                holdname = f'{row["Name"].title()} ({row["Ticker"]})'
-                                currnames.append(holdname) 
-                                wght = round(float(row['Weight (%)'])  * port_weights[p.ticker], 2)
-                                weights.append(wght)
-                                countries[row['Country']] = countries.get(row['Country'], 0) + wght
-                                sectors[row['Sector']] = sectors.get(row['Sector'], 0) + wght
-                                #ticker = normalize_ticker(row['Ticker'], None, source='betashares')
-                    except Exception as err:
-                        print(f'{row} - {err}')
-            else:
-                for row in reader:
-                    try:
-                        if row['Holding Name'] and row['% of net assets']:
-                            currnames.append(row['Holding Name'])
-                            wght = round(float(row['% of net assets'][:-1])  * port_weights[p.ticker], 2)
-                            weights.append(wght)
-                            country = translate_country_code(row['Country code'])
-                            countries[country] = countries.get(country, 0) + wght
-                            sector = translate_sector(row['Sector'])
-                            sectors[sector] = sectors.get(sector, 0) + wght
-                    except Exception as err:
-                        print(f'{row} - {err}')
-
-        #etfs += [etf_name] * len(currnames)
-        names += currnames
+    port_weights = {p.ticker: (p.weight / total) for p in state.holdings if p.weight > 0}
+
+    for p in state.holdings:
+        df = read_holdings(DATA_DIR + p.holdings_file, p.issuer)
+        if df.empty or p.ticker not in port_weights:
+            continue
+        if ISSUERS[df.attrs['issuer']].ticker_style == 'betashares':
+            names += [f'{name} ({ticker})' for name, ticker in zip(df['Name'], df['Ticker'])]
+        else:
+            names += df['Name'].tolist()
+
+        port_weight = port_weights[p.ticker]
+        for w, country, sector in zip(df['Weight'].tolist(), df['Country'], df['Sector']):
+            wght = round(w * port_weight, 2)
+            weights.append(wght)
+            countries[country] = countries.get(country, 0) + wght
+            sectors[sector] = sectors.get(sector, 0) + wght
 
     if mode == 'holdings':
         combined = list(zip(names, weights))
@@ -1579,13 +2095,54 @@ def get_yahoo_data(tickers):
 
     return prices
 
+# graph-selector mode -> (figure maker, the artefacts it reads)
+FIGURES = {
+    'daily-impact': (make_impact_graph, ['prices']),
+    'total-impact': (lambda state: make_impact_graph(state, 'total'), ['prices']),
+    'weights': (make_weights_treemap, ['prices']),
+    'top-holdings': (make_top_holdings_graph, ['holdings', 'prices']),
+    'lookthrough': (make_lookthrough_treemap, ['lookthrough']),
+    'top-countries': (make_top_countries_graph, ['holdings', 'prices']),
+    'top-sectors': (make_top_sectors_graph, ['holdings', 'prices']),
+    'efficiency': (make_efficiency_graph, ['prices']),
+    'history': (make_history_graph, ['history', 'positions', 'dividend_index', 'config']),
+    'profit': (make_profit_graph, ['history', 'positions', 'dividend_index', 'config']),
+    'dividends-bar': (make_dividends_bar_graph, ['dividend_index', 'config']),
+    'dividends-efficiency': (make_dividend_efficiency_graph, ['prices']),
+    'dividends-t12m': (make_dividend_income_graph, ['dividend_index', 'config']),
+    'drawdown': (make_drawdown_graph, ['history', 'positions', 'config']),
+    'etf-returns': (make_etf_returns_graph, ['history', 'positions', 'config']),
+    'cumulative-dividends': (make_cumulative_dividends_graph, ['dividend_index', 'config']),
+    'avg-cost': (make_avg_cost_graph, ['positions', 'config']),
+    'avg-cost-norm': (make_avg_cost_normalised_graph, ['positions', 'config']),
+    'correlation': (make_correlation_heatmap, ['history', 'config']),
+    'overlap': (make_overlap_heatmap, ['overlap_matrix', 'prices']),
+    'what-if': (make_what_if_graph, ['price_matrix', 'exposures', 'prices']),
+    'projection': (make_projection_graph, ['projection', 'dividend_index', 'prices']),
+    'backtest': (make_backtest_graph, ['price_matrix', 'positions', 'config']),
+    'benchmarks': (make_benchmark_graph, ['price_matrix', 'positions', 'dividend_index', 'config']),
+    'rolling': (make_rolling_graph, ['rolling', 'config']),
+    'monthly-heatmap': (make_monthly_heatmap, ['value_series']),
+    'yearly-heatmap': (make_yearly_heatmap, ['value_series']),
+}
+for mode, (maker, inputs) in FIGURES.items():
+    flow.derived('figure:' + mode, inputs, maker)
+
 # init
-load_portfolio()
+current = PortfolioState(None, tuple(load_portfolio()), Holding(ticker="Total..."))
 #fetch_etf_data()
 #make_top_holdings_graph()
 #refresh_data(None)
 
 if __name__ == "__main__":
+    # python dashtest.py --bootstrap-history: populate the whole history cache, then exit
+    if '--bootstrap-history' in sys.argv:
+        def progress(state):
+            print(f"  {state['done']}/{state['total']} ticker chunks done, {state['failed']}/{HISTORY_CHUNKS} chunks with failures", flush=True)
+        with FileLock(BACKFILL_LOCK):
+            bootstrap_history_cache(load_portfolio(), progress)
+        sys.exit()
+
     #app.run(debug=False, port=8050)
     if os.name == 'nt':
         hostaddr = '127.0.0.1'
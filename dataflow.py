@@ -0,0 +1,68 @@
+'''
+Dependency-tracked caching for data derived from the dashboard's sources.
+
+A source is anything with a cheap version: a file's (mtime, size), the
+published portfolio snapshot, a quote TTL bucket. A derived artefact declares
+the sources or other artefacts it reads, and its cached value is reused until
+the version of something upstream changes. So a new dividends.csv only
+recomputes what reads dividends, and a price refresh leaves artefacts built
+from the holdings files alone.
+
+A lookup is made against one state - the portfolio snapshot the caller
+resolved for its request. Version and compute functions are all handed that
+same state, so nothing in one lookup can mix two snapshots.
+'''
+
+class Dataflow:
+    def __init__(self):
+        self.sources = {}    # name -> version function of the state
+        self.nodes = {}      # name -> (inputs, compute function)
+        self.values = {}     # (name, args) -> (upstream versions, value)
+        self.computed = {}   # name -> number of recomputes, for logging
+
+    def source(self, name, version):
+        self.sources[name] = version
+
+    def derived(self, name, inputs, fn=None):
+        """Register fn as the artefact name, computed from inputs.
+
+        Usable as a decorator. fn is called with the lookup's state, then any
+        extra arguments given to get(), which are cached separately, e.g. one
+        price matrix per ticker list.
+        """
+        def register(fn):
+            unknown = [i for i in inputs if i not in self.sources and i not in self.nodes]
+            if unknown:
+                raise KeyError(f"{name} depends on unregistered {unknown}")
+            self.nodes[name] = (tuple(inputs), fn)
+            return fn
+        return register(fn) if fn else register
+
+    def version(self, name, state=None, seen=None):
+        # sources are asked for their version once per lookup, however many paths reach them
+        seen = {} if seen is None else seen
+        if name not in seen:
+            if name in self.sources:
+                seen[name] = self.sources[name](state)
+            else:
+                seen[name] = tuple(self.version(i, state, seen) for i in self.nodes[name][0])
+        return seen[name]
+
+    def get(self, name, *args, state=None):
+        inputs, fn = self.nodes[name]
+        version = self.version(name, state)
+        cached = self.values.get((name, args))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        value = fn(state, *args)
+        self.values[(name, args)] = (version, value)
+        self.computed[name] = self.computed.get(name, 0) + 1
+        return value
+
+    def dependents(self, name):
+        # every artefact that would be recomputed after a change to name
+        out = set()
+        for node, (inputs, _) in self.nodes.items():
+            if name in inputs:
+                out |= {node} | self.dependents(node)
+        return out
@@ -0,0 +1,92 @@
+import base64
+import numpy as np
+import plotly.colors
+import plotly.graph_objs as go
+import plotly.io as pio
+
+'''
+Plain-dict figure specs for the dashboard graphs.
+
+dcc.Graph accepts a figure dict as-is, so building graphs from these helpers skips
+go.Figure's per-property validation and the conversion back to JSON on every
+request. The dark theme is compiled once into DARK_LAYOUT and shared by every
+figure; data arrays are rounded, and long numeric ones are sent as base64
+typed arrays, which plotly.js decodes natively.
+'''
+
+# Apply a consistent hover label style across all figures
+pio.templates["portdash"] = go.layout.Template(
+    layout=dict(hoverlabel=dict(bgcolor='black', font=dict(color='white', size=13)))
+)
+pio.templates.default = "plotly+portdash"
+
+# the merged template go.Figure would embed, resolved once instead of per figure
+TEMPLATE = pio.templates[pio.templates.default].to_plotly_json()
+
+DARK_LAYOUT = {
+    'template': TEMPLATE,
+    'plot_bgcolor': '#222',
+    'paper_bgcolor': '#222',
+    'font': {'color': '#ccc'},
+}
+
+PALETTE = ['#636EFA', '#EF553B', '#00CC96', '#FECB52', '#AB63FA', '#FFA15A']
+LEGEND = {'bgcolor': '#333', 'bordercolor': '#555', 'borderwidth': 1}
+MARGIN = {'t': 50, 'l': 80, 'r': 20, 'b': 50}
+
+ROUND_DIGITS = 6        # decimals kept for floats sent as JSON numbers
+TYPED_ARRAY_MIN = 64    # numeric arrays at least this long go out as base64 float64
+
+def _rounded(values):
+    return [round(v, ROUND_DIGITS) if isinstance(v, float) else v for v in values]
+
+def array(values):
+    """Data array for a trace: rounded floats, or a base64 typed array when long.
+
+    Accepts lists, tuples and numpy arrays; None entries (gaps) keep the array
+    a plain list so plotly still sees them as missing.
+    """
+    if isinstance(values, np.ndarray):
+        values = values.tolist()
+    values = list(values)
+    if len(values) >= TYPED_ARRAY_MIN and all(isinstance(v, (int, float)) for v in values):
+        data = np.asarray(values, dtype='<f8').tobytes()
+        return {'dtype': 'f8', 'bdata': base64.b64encode(data).decode('ascii')}
+    return _rounded(values)
+
+def grid(z):
+    # heatmap z stays nested lists
+    return [_rounded(row) for row in z]
+
+def layout(**kwargs):
+    return {**DARK_LAYOUT, **kwargs}
+
+def figure(traces, **layout_kwargs):
+    return {'data': list(traces), 'layout': layout(**layout_kwargs)}
+
+def empty_figure(text):
+    # placeholder shown when a graph has nothing to plot yet
+    return figure([], title=title(text, 14))
+
+def title(text, size=20):
+    return {'text': text, 'font': {'size': size}}
+
+def scatter(x, y, **kwargs):
+    return {'type': 'scatter', 'x': array(x), 'y': array(y), **kwargs}
+
+def bar(x, y, **kwargs):
+    return {'type': 'bar', 'x': array(x), 'y': array(y), **kwargs}
+
+def heatmap(z, **kwargs):
+    return {'type': 'heatmap', 'z': grid(z), **kwargs}
+
+def colorscale(name):
+    # named scales expanded as go.Figure would; plotly.js only knows a few names, and not always the same colours
+    return plotly.colors.get_colorscale(name)
+
+def hline(y, **line):
+    # same shape add_hline produces: spans the full plot width at data y
+    return {'type': 'line', 'xref': 'x domain', 'x0': 0, 'x1': 1, 'yref': 'y', 'y0': y, 'y1': y, 'line': line}
+
+def vline(x, **line):
+    return {'type': 'line', 'xref': 'x', 'x0': x, 'x1': x, 'yref': 'y domain', 'y0': 0, 'y1': 1, 'line': line}
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from cachelock import FileLock, atomic_write_json, read_json
+
+# Issuer holdings files change at most daily, so only ask the server every few
+# hours and even then use conditional requests - an unchanged file costs a 304.
+SYNC_INTERVAL = 6 * 60 * 60
+KEEP_VERSIONS = 5
+REQUEST_TIMEOUT = 10
+
+BETASHARES_URL = 'https://www.betashares.com.au/files/csv/{code}_Portfolio_Holdings.csv'
+
+def default_holdings_url(ticker, issuer):
+    # Vanguard has no stable direct CSV link; set HoldingsURL in etf_config.csv instead
+    if issuer == 'betashares':
+        return BETASHARES_URL.format(code=ticker.split('.')[0])
+    return None
+
+class HoldingsSync:
+    """Keeps local issuer holdings files current with conditional downloads.
+
+    The manifest (holdings_sync.json in data_dir) records the ETag,
+    Last-Modified and sha256 of each file keyed by its path relative to
+    data_dir. A download whose hash matches the current copy is discarded
+    without touching the file, so its mtime - and anything parsed from it -
+    stays valid. Changed content is written to the live path and also kept as
+    a timestamped copy under .versions/, pruned to the newest `keep`.
+    """
+
+    def __init__(self, data_dir, interval=SYNC_INTERVAL, keep=KEEP_VERSIONS):
+        self.data_dir = data_dir
+        self.interval = interval
+        self.keep = keep
+        self.manifest_path = data_dir + 'holdings_sync.json'
+        self.manifest = self.load()
+
+    def load(self):
+        return read_json(self.manifest_path)
+
+    def save(self, holdings_file):
+        # merge our entry into whatever is on disk now, so concurrent syncs keep each other's entries
+        with FileLock(self.manifest_path):
+            manifest = self.load()
+            manifest[holdings_file] = self.manifest[holdings_file]
+            atomic_write_json(self.manifest_path, manifest, indent=1)
+        self.manifest = manifest
+
+    def content_hash(self, holdings_file):
+        return self.manifest.get(holdings_file, {}).get('sha256')
+
+    def sync(self, url, holdings_file, force=False):
+        """Fetch url into holdings_file if it changed. Returns True when new content was written."""
+        path = self.data_dir + holdings_file
+        entry = self.manifest.setdefault(holdings_file, {})
+        now = time.time()
+        if not force and now - entry.get('checked', 0) < self.interval:
+            return False
+
+        headers = {'User-Agent': 'Mozilla/5.0 (portdash holdings sync)'}
+        if os.path.exists(path) and entry.get('url') == url:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=REQUEST_TIMEOUT) as resp:
+                body = resp.read()
+                etag = resp.headers.get('ETag')
+                last_modified = resp.headers.get('Last-Modified')
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                entry['checked'] = now
+                self.save(holdings_file)
+                return False
+            print(f"Error fetching holdings {url}: HTTP {e.code}")
+            return False
+        except (urllib.error.URLError, OSError) as e:
+            print(f"Error fetching holdings {url}: {e}")
+            return False
+
+        digest = hashlib.sha256(body).hexdigest()
+        entry.update({'url': url, 'etag': etag, 'last_modified': last_modified, 'checked': now})
+        if digest == entry.get('sha256') and os.path.exists(path):
+            # server ignored the conditional headers but nothing changed
+            self.save(holdings_file)
+            return False
+
+        self._write_version(holdings_file, body, digest)
+        entry['sha256'] = digest
+        self.save(holdings_file)
+        print(f"Updated holdings file {holdings_file}")
+        return True
+
+    def _write_version(self, holdings_file, body, digest):
+        path = self.data_dir + holdings_file
+        folder, filename = os.path.split(path)
+        stem, ext = os.path.splitext(filename)
+        versions_dir = os.path.join(folder, '.versions')
+        os.makedirs(versions_dir, exist_ok=True)
+
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        with open(os.path.join(versions_dir, f'{stem}.{stamp}.{digest[:8]}{ext}'), 'wb') as f:
+            f.write(body)
+
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+        old = sorted(v for v in os.listdir(versions_dir) if v.startswith(stem + '.') and v.endswith(ext))
+        for v in old[:-self.keep]:
+            os.remove(os.path.join(versions_dir, v))
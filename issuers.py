@@ -0,0 +1,172 @@
+import codecs
+import csv
+import hashlib
+import io
+from dataclasses import dataclass
+import pandas as pd
+from classify import classify_sectors, classify_countries
+
+'''
+Issuer holdings-file schemas.
+
+Each issuer publishes its holdings as CSV with its own preamble, column names and
+encoding. Instead of skipping a fixed number of lines, the header row is found by
+looking for the issuer's columns, and the file is mapped onto one canonical schema:
+
+    Ticker, Name, Sector, Country, CountryCode (str, '' when missing),
+    Weight (float, % of the fund)
+
+Sectors and countries are classified on the way in (see classify.py), so
+every issuer's holdings roll up under the same GICS sector and country names.
+
+Parsed files are cached by content hash, so each file version is parsed once. A new
+issuer only needs an IssuerSchema passed to register_issuer.
+'''
+
+CANONICAL_COLUMNS = ['Ticker', 'Name', 'Sector', 'Country', 'CountryCode', 'Weight']
+MAX_PREAMBLE_LINES = 50
+
+@dataclass(frozen=True)
+class IssuerSchema:
+    name: str
+    columns: dict               # issuer column -> canonical column; Name and Weight are required
+    ticker_style: str           # how lookthrough.normalize_tickers reads the tickers
+    weight_suffix: str = ''     # stripped from weights, e.g. '%'
+    country_codes: bool = False # Country holds ISO codes rather than names
+    title_names: bool = False   # names are published in capitals
+    exclude_names: tuple = ()   # cash and currency lines that aren't holdings
+
+    def required(self):
+        return {col for col, canonical in self.columns.items() if canonical in ('Name', 'Weight')}
+
+ISSUERS = {}
+
+def register_issuer(schema):
+    ISSUERS[schema.name] = schema
+    return schema
+
+register_issuer(IssuerSchema(
+    'betashares',
+    {'Ticker': 'Ticker', 'Name': 'Name', 'Sector': 'Sector', 'Country': 'Country', 'Weight (%)': 'Weight'},
+    ticker_style='betashares', title_names=True, exclude_names=('AUD - AUSTRALIA DOLLAR',),
+))
+register_issuer(IssuerSchema(
+    'vanguard',
+    {'Ticker': 'Ticker', 'Holding Name': 'Name', 'Sector': 'Sector', 'Country code': 'Country',
+     '% of net assets': 'Weight'},
+    ticker_style='vanguard', weight_suffix='%', country_codes=True,
+))
+register_issuer(IssuerSchema(
+    'ishares',
+    {'Ticker': 'Ticker', 'Name': 'Name', 'Sector': 'Sector', 'Location': 'Country', 'Weight (%)': 'Weight'},
+    ticker_style='plain',
+))
+register_issuer(IssuerSchema(
+    'spdr',
+    {'Ticker': 'Ticker', 'Name': 'Name', 'Sector': 'Sector', 'Weight': 'Weight'},
+    ticker_style='plain',
+))
+
+def decode(data):
+    """Text of a holdings file and the encoding it was read with."""
+    for bom, encoding in ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')):
+        if data.startswith(bom):
+            return data.decode(encoding), encoding
+    try:
+        return data.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        # issuer exports are usually Windows-1252
+        return data.decode('cp1252', errors='replace'), 'cp1252'
+
+def _header_cells(lines):
+    for i, line in enumerate(lines[:MAX_PREAMBLE_LINES]):
+        yield i, {c.strip() for c in next(csv.reader([line]), [])}
+
+def find_header(lines, schema):
+    # index of the first line containing all of the schema's required columns
+    required = schema.required()
+    for i, cells in _header_cells(lines):
+        if required <= cells:
+            return i
+    return None
+
+def sniff_issuer(lines):
+    # issuers share column names, so pick the schema whose header matches the most columns
+    best, best_score = None, 0
+    for i, cells in _header_cells(lines):
+        for schema in ISSUERS.values():
+            if schema.required() <= cells:
+                score = len(cells & schema.columns.keys())
+                if score > best_score:
+                    best, best_score = schema.name, score
+    return best
+
+def _empty_frame():
+    return pd.DataFrame({c: pd.Series(dtype=float if c == 'Weight' else object) for c in CANONICAL_COLUMNS})
+
+def parse_holdings(text, schema, label=''):
+    lines = text.splitlines()
+    header = find_header(lines, schema)
+    if header is None:
+        print(f'{label}: no {schema.name} header row in the first {MAX_PREAMBLE_LINES} lines')
+        return _empty_frame()
+
+    df = pd.read_csv(
+        io.StringIO(text), skiprows=header, usecols=lambda c: c.strip() in schema.columns,
+        dtype=str, keep_default_na=False, na_values=[''], on_bad_lines='skip',
+    )
+    df = df.rename(columns=lambda c: schema.columns[c.strip()])
+    for col in CANONICAL_COLUMNS:
+        if col not in df:
+            df[col] = ''
+
+    df = df[df['Name'].notna() & df['Weight'].notna()]
+    if schema.exclude_names:
+        df = df[~df['Name'].isin(schema.exclude_names)]
+    weights = df['Weight'].str.strip()
+    if schema.weight_suffix:
+        weights = weights.str.rstrip(schema.weight_suffix)
+    weights = pd.to_numeric(weights, errors='coerce')
+    if weights.isna().any():
+        print(f'{label}: skipped {int(weights.isna().sum())} rows with no numeric weight')
+
+    df = df[weights.notna()].fillna('')
+    df['Weight'] = weights[weights.notna()]
+    if schema.title_names:
+        df['Name'] = df['Name'].str.title()
+    df['Sector'] = classify_sectors(df['Sector'], label)
+    df['Country'], df['CountryCode'] = classify_countries(df['Country'], schema.country_codes, label)
+    return df[CANONICAL_COLUMNS].reset_index(drop=True)
+
+_parsed = {}   # path -> (issuer, sha256, frame)
+
+def read_holdings(path, issuer=None):
+    """Canonical holdings frame for an issuer file, sniffing the issuer if not given.
+
+    df.attrs['issuer'] names the schema that was used. The frame is cached until
+    the file's content changes and is shared between callers, so it must not be
+    modified in place.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        print(f'Error reading holdings file {path}: {e}')
+        return _empty_frame()
+
+    digest = hashlib.sha256(data).hexdigest()
+    cached = _parsed.get(path)
+    if cached and cached[1] == digest and (issuer is None or cached[0] == issuer):
+        return cached[2]
+
+    text, _ = decode(data)
+    if issuer not in ISSUERS:
+        sniffed = sniff_issuer(text.splitlines())
+        if sniffed is None:
+            print(f'{path}: unrecognised holdings file (issuer {issuer!r})')
+            return _empty_frame()
+        issuer = sniffed
+    df = parse_holdings(text, ISSUERS[issuer], path)
+    df.attrs['issuer'] = issuer
+    _parsed[path] = (issuer, digest, df)
+    return df
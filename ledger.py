@@ -0,0 +1,142 @@
+import os
+from bisect import bisect_right
+from datetime import date, timedelta
+from itertools import accumulate
+
+'''
+Indexes over the trade and dividend ledgers, built once per ledger file version.
+'''
+
+def file_version(path):
+    # changes whenever the file is rewritten; None if it doesn't exist
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _step_over(keys, prefix, dates):
+    # value of a step function (prefix[i] from keys[i] onwards) at each of the sorted dates
+    out = []
+    i, n, current = 0, len(keys), 0
+    for d in dates:
+        while i < n and keys[i] <= d:
+            current = prefix[i]
+            i += 1
+        out.append(current)
+    return out
+
+class PositionIndex:
+    """Per-ticker trades sorted by date, with running totals of units and cost.
+
+    units_at/cost_at answer "held at date d" in O(log n) by bisection, and the
+    *_over methods walk a sorted date range in O(n + m). Cost is the
+    signed cash paid in: buys add their total, sells subtract it.
+    """
+
+    def __init__(self, trades):
+        self.ledger = list(trades)
+        self.trades = {}
+        # sort is stable, so same-day trades keep their ledger order
+        for t in sorted(trades, key=lambda t: t['date']):
+            self.trades.setdefault(t['ticker'], []).append(t)
+
+        self.dates, self.units, self.cost = {}, {}, {}
+        for ticker, ts in self.trades.items():
+            self.dates[ticker] = [t['date'] for t in ts]
+            self.units[ticker] = list(accumulate(t['units'] for t in ts))
+            self.cost[ticker] = list(accumulate(t['total'] if t['units'] > 0 else -t['total'] for t in ts))
+
+    def holds_any(self, tickers):
+        return any(t in self.trades for t in tickers)
+
+    def units_at(self, ticker, d):
+        i = bisect_right(self.dates.get(ticker, []), d)
+        return self.units[ticker][i - 1] if i else 0
+
+    def cost_at(self, ticker, d):
+        i = bisect_right(self.dates.get(ticker, []), d)
+        return self.cost[ticker][i - 1] if i else 0
+
+    def units_over(self, ticker, dates):
+        return _step_over(self.dates.get(ticker, []), self.units.get(ticker, []), dates)
+
+    def cost_over(self, ticker, dates):
+        return _step_over(self.dates.get(ticker, []), self.cost.get(ticker, []), dates)
+
+    def total_cost_over(self, tickers, dates):
+        totals = [0] * len(dates)
+        for ticker in tickers:
+            if ticker in self.trades:
+                totals = [a + b for a, b in zip(totals, self.cost_over(ticker, dates))]
+        return totals
+
+    def running_position(self, ticker):
+        # (date, cumulative units, cumulative cost) after each trade
+        return list(zip(self.dates.get(ticker, []), self.units.get(ticker, []), self.cost.get(ticker, [])))
+
+class DividendIndex:
+    """Dividend payments grouped by (ticker, date), with running totals.
+
+    Also precomputes, at each of a ticker's payment dates, the income received
+    over the trailing 12 months and - given a PositionIndex - that income as a
+    yield on the cost basis held at the time.
+    """
+
+    def __init__(self, dividends, positions=None):
+        self.amounts = {}   # ticker -> {date: amount}
+        for dv in dividends:
+            by_date = self.amounts.setdefault(dv['ticker'], {})
+            by_date[dv['date']] = by_date.get(dv['date'], 0) + dv['amount']
+        self.tickers = sorted(self.amounts)
+        self.positions = positions
+        self._series = {}
+
+        self.ticker_totals = {t: sum(a.values()) for t, a in self.amounts.items()}
+
+        # portfolio-wide running total, for "dividends received up to date d" lookups
+        by_date = {}
+        for dv in dividends:
+            by_date[dv['date']] = by_date.get(dv['date'], 0) + dv['amount']
+        self.dates = sorted(by_date)
+        self.cumulative = list(accumulate(by_date[d] for d in self.dates))
+
+    def cumulative_total_over(self, dates):
+        # all dividends received on or before each of the sorted dates
+        return _step_over(self.dates, self.cumulative, dates)
+
+    def payment_dates(self, tickers):
+        return sorted({d for t in tickers for d in self.amounts.get(t, {})})
+
+    def payments(self, ticker, dates):
+        by_date = self.amounts.get(ticker, {})
+        return [by_date.get(d, 0) for d in dates]
+
+    def series(self, tickers):
+        """Payment dates, amounts, running total, trailing-12-month income and
+        yield on cost (%) for the combined tickers, one entry per payment date."""
+        key = tuple(sorted(tickers))
+        if key not in self._series:
+            self._series[key] = self._build_series(key)
+        return self._series[key]
+
+    def _build_series(self, tickers):
+        dates = self.payment_dates(tickers)
+        amounts = [sum(self.amounts.get(t, {}).get(d, 0) for t in tickers) for d in dates]
+        cumulative = list(accumulate(amounts))
+
+        # two-pointer window over the previous 365 days
+        trailing, window, start = [], 0, 0
+        for i, d in enumerate(dates):
+            window += amounts[i]
+            cutoff = (date.fromisoformat(d) - timedelta(days=365)).isoformat()
+            while dates[start] <= cutoff:
+                window -= amounts[start]
+                start += 1
+            trailing.append(window)
+
+        yield_on_cost = None
+        if self.positions is not None:
+            costs = self.positions.total_cost_over(tickers, dates)
+            yield_on_cost = [t / c * 100 if c > 0 else None for t, c in zip(trailing, costs)]
+        return dates, amounts, cumulative, trailing, yield_on_cost
@@ -0,0 +1,279 @@
+import numpy as np
+import pandas as pd
+from quotes import QuoteCache
+from figures import figure, array
+from issuers import ISSUERS, read_holdings
+
+'''
+Look-through of ETF holdings down to the underlying constituents.
+
+betashares header:
+Ticker,Name,Asset Class,Sector,Country,Currency,Weight (%),Shares/Units (#),Market Value (AUD),Notional Value (AUD)
+vanguard header:
+"Holding Name",Ticker,Sector,"Country code","% of net assets","Market value (AUD)","# of units"
+'''
+
+# Treemap sizing: constituents under the threshold (fraction of the whole
+# portfolio) are folded into a per-ETF "Other" node, and no branch shows more
+# than max_children leaves. A focused branch is drawn in more detail.
+TREEMAP_THRESHOLD = 0.001
+TREEMAP_MAX_CHILDREN = 40
+TREEMAP_FOCUS_MAX_CHILDREN = 400
+TREEMAP_COLOUR_EXTREME = 0.03   # daily change that maps to full red/green
+ALL_ETFS_ID = '__all__'
+
+# Bloomberg-style exchange codes (Betashares), also used for Vanguard country codes
+BLOOMBERG_TO_YAHOO = {
+    'AU': '.AX',   # Australia (ASX)
+    'AT': '.AX',   # Australia (ASX)
+    'UW': '',      # NASDAQ
+    'UN': '',      # NYSE
+    'LN': '.L',    # London
+    'FP': '.PA',   # Paris
+    'GR': '.DE',   # Xetra
+    'GY': '.DE',   # Frankfurt
+    'VX': '.SW',   # Switzerland
+    'SE': '.SW',   # Switzerland
+    'HK': '.HK',   # Hong Kong
+    'JP': '.T',    # Tokyo
+    'KS': '.KS',   # South Korea
+    'TW': '.TW',   # Taiwan
+    'CN': '.SS',   # Shanghai
+    'TI': '.MI',   # Italy (Borsa Italiana)
+    'CT': '.TO',   # Canada?
+}
+
+INDEX_COLUMNS = ['ETF', 'Stock', 'Symbol', 'ETF_Weight']
+CONSTITUENT_COLUMNS = ['ETF', 'Stock', 'Symbol', 'Portfolio_Weight']
+
+def normalize_ticker(raw_ticker, country_code=None, source='vanguard'):
+    """
+    Convert a raw ticker from Vanguard or Betashares into a valid Yahoo Finance ticker.
+
+    :param raw_ticker: e.g. '2330', 'BRK/B UN', 'NESN VX'
+    :param country_code: e.g. 'TW', 'US', 'JP' (from Vanguard CSV)
+    :param source: 'vanguard' or 'betashares'
+    :return: normalized ticker (e.g. '2330.TW', 'BRK-B', 'NESN.SW')
+    """
+    raw_ticker = raw_ticker.strip()
+
+    if source == 'betashares':
+        # Handle things like 'BRK/B UN'
+        raw_ticker = raw_ticker.replace('/', '-')
+        parts = raw_ticker.split()
+        if len(parts) == 2:
+            symbol, exch = parts
+            suffix = BLOOMBERG_TO_YAHOO.get(exch.upper(), '')
+            return symbol + suffix
+        else:
+            return raw_ticker
+
+    elif source == 'vanguard':
+        # e.g. 2330 (TW), or AAPL (US)
+        if raw_ticker.isdigit() and country_code:
+            suffix = BLOOMBERG_TO_YAHOO.get(country_code.upper(), '')
+            return raw_ticker + suffix
+        elif '/' in raw_ticker:
+            return raw_ticker.replace('/', '-')
+        else:
+            return raw_ticker
+
+    return raw_ticker
+
+def normalize_tickers(raw_tickers, country_codes=None, source='vanguard'):
+    """Vectorized normalize_ticker over a Series of raw tickers (and country codes)."""
+    raw = raw_tickers.fillna('').astype(str).str.strip()
+    suffixes = pd.Series(BLOOMBERG_TO_YAHOO)
+
+    if source == 'betashares':
+        # 'BRK/B UN' -> symbol 'BRK-B' on exchange 'UN'
+        raw = raw.str.replace('/', '-', regex=False)
+        parts = raw.str.extract(r'^(\S+)\s+(\S+)$')
+        suffix = parts[1].str.upper().map(suffixes).fillna('')
+        return raw.where(parts[0].isna(), parts[0] + suffix)
+
+    elif source == 'vanguard':
+        country = country_codes.fillna('').astype(str) if country_codes is not None else pd.Series('', index=raw.index)
+        numeric = raw.str.isdigit() & (country != '')
+        suffix = country.str.upper().map(suffixes).fillna('')
+        return raw.str.replace('/', '-', regex=False).where(~numeric, raw + suffix)
+
+    return raw
+
+def constituent_index(portfolio, data_dir=''):
+    """Every holdings file's constituents, independent of prices.
+
+    Returns a DataFrame of ETF, Stock, Symbol and ETF_Weight - the holding's
+    share of its ETF - with Symbol the normalized Yahoo ticker.
+    """
+    frames = []
+    for p in portfolio:
+        if not p.holdings_file:
+            continue
+        df = read_holdings(data_dir + p.holdings_file, p.issuer)
+        if df.empty:
+            continue
+        frames.append(pd.DataFrame({
+            'ETF': p.ticker,
+            'Stock': df['Name'],
+            'Symbol': normalize_tickers(df['Ticker'], df['CountryCode'], ISSUERS[df.attrs['issuer']].ticker_style),
+            'ETF_Weight': df['Weight'] / 100,
+        }))
+    if not frames:
+        return pd.DataFrame({c: pd.Series(dtype=float if c == 'ETF_Weight' else object) for c in INDEX_COLUMNS})
+    return pd.concat(frames, ignore_index=True)
+
+def read_constituents(portfolio, data_dir='', index=None):
+    """Read every holdings file in the portfolio into one row per constituent.
+
+    Returns a DataFrame of ETF, Stock, Symbol and Portfolio_Weight - the
+    holding's share of the whole portfolio (ETF weight x weight within the
+    ETF) - with Symbol the normalized Yahoo ticker. A constituent_index
+    already built for the portfolio can be passed in to skip the file reads.
+    """
+    total = sum(p.weight for p in portfolio)
+    port_weights = {p.ticker: (p.weight / total) for p in portfolio if p.weight > 0} if total else {}
+
+    index = constituent_index(portfolio, data_dir) if index is None else index
+    df = index[index['ETF'].isin(port_weights.keys())]
+    if df.empty:
+        return pd.DataFrame({c: pd.Series(dtype=float if c == 'Portfolio_Weight' else object) for c in CONSTITUENT_COLUMNS})
+    return pd.DataFrame({
+        'ETF': df['ETF'],
+        'Stock': df['Stock'],
+        'Symbol': df['Symbol'],
+        'Portfolio_Weight': df['ETF_Weight'] * df['ETF'].map(port_weights),
+    }).reset_index(drop=True)
+
+def constituent_quotes(symbols, cache_path):
+    # {symbol: daily change as a fraction}, for the symbols Yahoo could quote
+    quotes = QuoteCache(cache_path).get_many(list(symbols))
+    return {s: q['daily_change_pct'] for s, q in quotes.items() if q}
+
+def apply_changes(df, changes):
+    """Add each constituent's Change_Pct and weighted Contribution to a read_constituents frame."""
+    df = df.copy()
+    df['Change_Pct'] = df['Symbol'].map(changes) if len(df) else pd.Series(dtype=float)
+    df['Contribution'] = df['Portfolio_Weight'] * df['Change_Pct'].fillna(0)
+    return df
+
+def get_constituent_changes(portfolio, cache_path, data_dir=''):
+    """Weighted daily contribution of every look-through constituent.
+
+    Symbols are deduplicated across ETFs so a stock held by several funds is
+    quoted once, and quotes come from a TTL cache so repeated refreshes only
+    hit Yahoo for stale symbols. Contribution is the constituent's portfolio
+    weight times its daily change, both as fractions.
+    """
+    df = read_constituents(portfolio, data_dir)
+    if df.empty:
+        return df.assign(Change_Pct=[], Contribution=[])
+    return apply_changes(df, constituent_quotes(df['Symbol'].unique().tolist(), cache_path))
+
+def _change_colours(changes, extreme=TREEMAP_COLOUR_EXTREME):
+    # red - grey - green scale, clipped at +-extreme
+    x = np.clip(np.nan_to_num(np.asarray(changes, dtype=float) / extreme), -1, 1)[:, None]
+    grey = np.array([68, 68, 68])
+    target = np.where(x < 0, np.array([214, 39, 40]), np.array([44, 160, 44]))
+    rgb = (grey + (target - grey) * np.abs(x)).round().astype(int)
+    return [f'#{r:02x}{g:02x}{b:02x}' for r, g, b in rgb]
+
+def _weighted_change(df, keys):
+    quoted = df[df['Change_Pct'].notna()]
+    num = (quoted['Portfolio_Weight'] * quoted['Change_Pct']).groupby([quoted[k] for k in keys]).sum()
+    den = quoted.groupby(keys)['Portfolio_Weight'].sum()
+    return num / den
+
+def build_treemap(df, focus=None, threshold=TREEMAP_THRESHOLD):
+    """Build a look-through treemap figure dict from get_constituent_changes output.
+
+    Only the largest constituents of each ETF become leaves; the long tail is
+    aggregated server-side into "<ETF>/Other" nodes so a full look-through of
+    thousands of stocks stays a few hundred nodes. With focus set to an ETF
+    ticker only that branch is drawn, in finer detail, under an "All ETFs"
+    node that returns to the overview when clicked.
+    """
+    if focus is not None:
+        df = df[df['ETF'] == focus]
+        threshold, max_children = 0, TREEMAP_FOCUS_MAX_CHILDREN
+    else:
+        max_children = TREEMAP_MAX_CHILDREN
+
+    df = df.sort_values('Portfolio_Weight', ascending=False)
+    rank = df.groupby('ETF').cumcount()
+    keep = (df['Portfolio_Weight'] >= threshold) & (rank < max_children)
+    leaves, tail = df[keep], df[~keep]
+
+    etf_weights = df.groupby('ETF', sort=False)['Portfolio_Weight'].sum()
+    etf_changes = _weighted_change(df, ['ETF']).reindex(etf_weights.index)
+    tail_weights = tail.groupby('ETF', sort=False)['Portfolio_Weight'].sum()
+    tail_changes = _weighted_change(tail, ['ETF']).reindex(tail_weights.index)
+    tail_counts = tail.groupby('ETF', sort=False).size()
+
+    root = ALL_ETFS_ID if focus is not None else ''
+    ids = ([ALL_ETFS_ID] if focus is not None else []) \
+        + etf_weights.index.tolist() \
+        + (leaves['ETF'] + '/' + leaves.index.astype(str)).tolist() \
+        + (tail_weights.index + '/Other').tolist()
+    parents = ([''] if focus is not None else []) \
+        + [root] * len(etf_weights) \
+        + leaves['ETF'].tolist() \
+        + tail_weights.index.tolist()
+    names = (['\u25c0 All ETFs'] if focus is not None else []) \
+        + [t.split('.')[0] for t in etf_weights.index] \
+        + leaves['Stock'].tolist() \
+        + [f'Other ({n} holdings)' for n in tail_counts.reindex(tail_weights.index)]
+    # parent nodes carry no value of their own (branchvalues='remainder')
+    values = np.concatenate([
+        np.zeros(len(parents) - len(leaves) - len(tail_weights)),
+        leaves['Portfolio_Weight'].to_numpy(),
+        tail_weights.to_numpy(),
+    ])
+    weights = np.concatenate([
+        [etf_weights.sum()] if focus is not None else [],
+        etf_weights.to_numpy(),
+        leaves['Portfolio_Weight'].to_numpy(),
+        tail_weights.to_numpy(),
+    ])
+    changes = np.concatenate([
+        [np.nan] if focus is not None else [],
+        etf_changes.to_numpy(),
+        leaves['Change_Pct'].to_numpy(dtype=float),
+        tail_changes.to_numpy(),
+    ])
+
+    change_text = np.where(np.isnan(changes), 'n/a', np.char.mod('%+.2f%%', np.nan_to_num(changes) * 100))
+    weight_text = np.char.mod('%.2f%%', weights * 100)
+    text = [f'{n}<br>{c}' for n, c in zip(names, change_text)]
+    hover = [f'{n}<br>Weight: {w}<br>Daily: {c}' for n, w, c in zip(names, weight_text, change_text)]
+
+    treemap = {
+        "type": "treemap",
+        "ids": ids,
+        "labels": names,
+        "parents": parents,
+        "values": array(values),
+        "branchvalues": "remainder",
+        "text": text,
+        "textinfo": "text",
+        "customdata": hover,
+        "hovertemplate": "%{customdata}<extra></extra>",
+        "marker": {"colors": _change_colours(changes), "cornerradius": 5},
+        "textfont": {"color": "white"},
+        "maxdepth": 3,
+    }
+    return figure(
+        [treemap],
+        margin={"t": 35, "l": 10, "r": 10, "b": 10},
+        title={"text": f"Look-through Daily Movers{' - ' + focus.split('.')[0] if focus else ''}"},
+    )
+
+def treemap_focus_from_click(click_data):
+    """Map a treemap click to the branch to draw next (None = overview)."""
+    try:
+        node = click_data['points'][0]['id']
+    except (TypeError, KeyError, IndexError):
+        return None
+    if node == ALL_ETFS_ID:
+        return None
+    return node.split('/')[0]
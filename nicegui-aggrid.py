@@ -1,5 +1,6 @@
+import asyncio
 import csv
-from nicegui import events, ui
+from nicegui import app, events, run, ui
 from dataclasses import dataclass, asdict
 from yahooquery import Ticker as Ticker
 import plotly.graph_objects as go
@@ -28,9 +29,17 @@ portfolio = [
     Holding('VISM', 82, 5254, 81.62, 6, 0, 0, 9.86, 512.14),
 ]
 '''
+# portfolio state is shared by every connected client and refreshed in the background
 portfolio = []
 summary_data = Holding(ticker="Total...")
-ui_refs = {}
+REFRESH_INTERVAL = 5 * 60   # seconds between automatic price refreshes
+refresh_lock = asyncio.Lock()
+# element refs for each open page, so a refresh can redraw all of them
+views = []
+# bumped whenever prices are refetched; figures are cached per (graph type, data version)
+data_version = 0
+figure_cache = {}
+table_cache = {'version': None, 'rows': {}}
 
 def load_portfolio():
     # returns a dict with current portfolio holdings and weights from a csv with following format:
@@ -66,7 +75,12 @@ def get_yahoo_data(tickers):
 
 def fetch_etf_data():
     print('Updating ETF data.')
-    curr_prices = get_yahoo_data([etf.ticker for etf in portfolio])
+    apply_prices(get_yahoo_data([etf.ticker for etf in portfolio]))
+
+def apply_prices(curr_prices):
+    global data_version
+    if not portfolio:
+        return
 
     for etf in portfolio:
         etf.daily_change_pct = curr_prices[etf.ticker]["daily_change_pct"] * 100
@@ -86,17 +100,22 @@ def fetch_etf_data():
 
     summary_data.daily_change_pct = (summary_data.daily_change_dollars / overall_total_value) * 100
     summary_data.total_change_pct = (summary_data.total_change_dollars / overall_total_paid) * 100
+    data_version += 1
+
+def get_table_rows() -> dict:
+    # {ticker: row}, built once per data version and shared by every page
+    if table_cache['version'] != data_version:
+        rows = {}
+        for p in portfolio:
+            p_dict = asdict(p)
+            p_dict['daily_display'] = format_change(p.daily_change_pct, p.daily_change_dollars)
+            p_dict['total_display'] = format_change(p.total_change_pct, p.total_change_dollars)
+            rows[p.ticker] = p_dict
+        table_cache['version'], table_cache['rows'] = data_version, rows
+    return table_cache['rows']
 
 def calc_table_data():
-    row_data = []
-    for p in portfolio:
-        p_dict = asdict(p)
-        p_dict['daily_change_pct'] = p.daily_change_pct
-        p_dict['daily_change_dollars'] = p.daily_change_dollars
-        p_dict['daily_display'] = format_change(p.daily_change_pct, p.daily_change_dollars)
-        p_dict['total_display'] = format_change(p.total_change_pct, p.total_change_dollars)
-        row_data.append(p_dict)
-    return row_data
+    return list(get_table_rows().values())
 
 def format_change(pct: float, dollars: float) -> str:
     arrow = '▲' if pct > 0 else '▼' if pct < 0 else ''
@@ -113,26 +132,69 @@ def get_total_row() -> dict:
         'total_change_pct': summary_data.total_change_pct,
     }
 
-def refresh_data():
-    print('Refreshing data.')
-
-    button = ui_refs['refresh_button']
-    button.props(add='loading')
-    button.disable()
-
-    try:
-        fetch_etf_data()
-        grid = ui_refs['grid']
-        grid.options['rowData'] = calc_table_data()
-        grid.options['pinnedBottomRowData'] = [get_total_row()]
-        grid.update()
-        new_fig = make_impact_graph()
-        ui_refs['plot'].figure = new_fig
-    except Exception as err:
-        print(f'Error updating data: {err}')
-    finally:
-        button.props(remove='loading')
-        button.enable()
+def set_loading(loading: bool):
+    for refs in views:
+        button = refs['refresh_button']
+        if loading:
+            button.props(add='loading')
+            button.disable()
+        else:
+            button.props(remove='loading')
+            button.enable()
+
+def sync_grid(refs):
+    """Send the grid only what changed since this page's last update.
+
+    Rows are keyed by ticker (getRowId), so added, changed and removed holdings
+    go out as one AG Grid transaction instead of re-sending the whole grid.
+    """
+    grid = refs['grid']
+    rows = get_table_rows()
+    sent = refs['rows']
+    transaction = {
+        'add': [row for ticker, row in rows.items() if ticker not in sent],
+        'update': [row for ticker, row in rows.items() if ticker in sent and sent[ticker] != row],
+        'remove': [{'ticker': ticker} for ticker in sent if ticker not in rows],
+    }
+    if any(transaction.values()):
+        grid.run_grid_method('applyTransaction', transaction)
+
+    total_row = get_total_row()
+    if total_row != refs['total_row']:
+        grid.run_grid_method('setGridOption', 'pinnedBottomRowData', [total_row])
+
+    # keep the element's options current for any later full render, without re-sending them now
+    with grid.props.suspend_updates():
+        grid.options['rowData'] = list(rows.values())
+        grid.options['pinnedBottomRowData'] = [total_row]
+    refs['rows'], refs['total_row'] = rows, total_row
+
+def update_view(refs):
+    sync_grid(refs)
+    update_plot(refs)
+
+async def refresh_data():
+    # the network calls run in a worker thread so the event loop keeps serving every client;
+    # callers arriving mid-refresh (button clicks, the timer) just wait for it to finish
+    if refresh_lock.locked():
+        async with refresh_lock:
+            return
+    async with refresh_lock:
+        print('Refreshing data.')
+        set_loading(True)
+        try:
+            if not portfolio:
+                await run.io_bound(load_portfolio)
+            curr_prices = await run.io_bound(get_yahoo_data, [etf.ticker for etf in portfolio])
+            if curr_prices is None:
+                return  # shutting down
+            apply_prices(curr_prices)
+            for refs in views:
+                update_view(refs)
+        except Exception as err:
+            print(f'Error updating data: {err}')
+        finally:
+            set_loading(False)
 
 def make_weights_treemap():
     tickers = [etf.ticker for etf in portfolio]
@@ -183,14 +245,22 @@ def generate_figure(graph_type: str):
     else:
         return px.line(x=[1, 2, 3], y=[1, 4, 9], title="Value Over Time")
 
-def update_plot(event=None):
-    graph_type = ui_refs['dropdown'].value
+def get_figure(graph_type: str) -> dict:
+    key = (graph_type, data_version)
+    if key not in figure_cache:
+        # figures from an older data version can't be shown again
+        for old_key in [k for k in figure_cache if k[1] != data_version]:
+            del figure_cache[old_key]
+        fig = generate_figure(graph_type)
+        # convert once here rather than on every send
+        figure_cache[key] = fig.to_plotly_json() if isinstance(fig, go.Figure) else fig
+    return figure_cache[key]
+
+def update_plot(refs):
+    # swap the figure on the existing plot element instead of rebuilding it
+    graph_type = refs['dropdown'].value
     print(f'Updating graph to {graph_type}')
-    fig = generate_figure(graph_type)
-    
-    ui_refs['plot'].delete()
-    with ui_refs['plot_container']:
-        ui_refs['plot'] = ui.plotly(fig)
+    refs['plot'].update_figure(get_figure(graph_type))
 
 ui.add_head_html('''
 <style>
@@ -223,9 +293,9 @@ ui.add_head_html('''
 
 @ui.page('/')
 def main():
+    # renders straight from the shared state; the background refresh keeps it current
     ui.dark_mode().value = True
-    load_portfolio()
-    fetch_etf_data()
+    ui_refs = {}
 
     ui.add_head_html('''
     <style>
@@ -262,23 +332,32 @@ def main():
                         {'headerName': 'Weight', 'field': 'weight', 'width': 50}],
                     'rowData': calc_table_data(),
                     'pinnedBottomRowData': [get_total_row()],
+                    ':getRowId': 'params => params.data.ticker',
                     'domLayout': 'autoHeight',
                 }).classes('ag-theme-balham-dark max-w-screen-md mx-auto text-lg')
 
             ui_refs['refresh_button'] = ui.button('Refresh', on_click=refresh_data, icon='refresh')
+            if refresh_lock.locked():
+                ui_refs['refresh_button'].props(add='loading')
+                ui_refs['refresh_button'].disable()
 
 
         # right column
         with ui.column().classes('w-1/3'):
             ui_refs['dropdown'] = ui.select(
                 ["Daily % Impact by ETF", "ETF Portfolio Weights","Total $ Impact by ETF", "Total Value Over Time"],
-                value="Daily % Impact by ETF", on_change=update_plot, label='Select graph type:')
+                value="Daily % Impact by ETF", on_change=lambda e: update_plot(ui_refs), label='Select graph type:')
             #ui_refs['plot'] = ui.plotly(make_impact_graph())
-            ui_refs['plot_container'] = ui.column()
-            with ui_refs['plot_container']:
-                ui_refs['plot'] = ui.plotly(generate_figure("Daily % Impact by ETF"))
+            ui_refs['plot'] = ui.plotly(get_figure("Daily % Impact by ETF"))
+
+    # what this page's grid currently shows, for sync_grid to diff against
+    ui_refs['rows'], ui_refs['total_row'] = get_table_rows(), get_total_row()
+    views.append(ui_refs)
+    ui.context.client.on_delete(lambda: views.remove(ui_refs))
 
                               
             
+# one shared refresh loop for all clients, starting as soon as the server is up
+app.timer(REFRESH_INTERVAL, refresh_data)
 
 ui.run()
\ No newline at end of file
@@ -0,0 +1,152 @@
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from issuers import ISSUERS, read_holdings
+from lookthrough import BLOOMBERG_TO_YAHOO, normalize_tickers
+
+'''
+Overlap between the portfolio's ETFs.
+
+Each ETF's holdings file becomes one row of a sparse ETF x constituent weight
+matrix, stored as COO triplets (row, col, weight) in numpy arrays. Only
+non-zero weights are stored, so tens of thousands of constituents cost
+memory in proportion to the holdings, not the grid. The pairwise statistics
+come from products over the shared columns only.
+
+Constituents are matched across issuers by their normalized Yahoo ticker
+(without the exchange suffix) plus country, since the same listing can be
+written 'BHP AT' by one issuer and 'BHP', 'AU' by another.
+'''
+
+@dataclass
+class WeightMatrix:
+    etfs: list              # row labels
+    keys: np.ndarray        # column labels (constituent identity)
+    names: np.ndarray       # display name per column
+    rows: np.ndarray        # COO entries, one per (row, col)
+    cols: np.ndarray
+    weights: np.ndarray     # fraction of the ETF, each row sums to ~1
+
+    @property
+    def shape(self):
+        return len(self.etfs), len(self.keys)
+
+    def row_totals(self):
+        return np.bincount(self.rows, weights=self.weights, minlength=len(self.etfs))
+
+    def dot(self, vector):
+        # vector (one value per ETF) x matrix -> one value per constituent
+        vector = np.asarray(vector, dtype=float)
+        return np.bincount(self.cols, weights=vector[self.rows] * self.weights, minlength=len(self.keys))
+
+# exchange suffixes normalize_tickers adds, stripped so listings match across issuers
+SUFFIX_PATTERN = r'(?:' + '|'.join(sorted({s.replace('.', r'\.') for s in BLOOMBERG_TO_YAHOO.values() if s})) + r')$'
+
+def identity_keys(symbols, country_codes, names):
+    root = symbols.str.upper().str.replace(SUFFIX_PATTERN, '', regex=True)
+    keys = root + '|' + country_codes.fillna('').str.upper()
+    # no usable ticker: fall back to the holding's name
+    return keys.where(root != '', 'name|' + names.fillna('').str.casefold())
+
+def weight_matrix(portfolio, data_dir=''):
+    """Sparse ETF x constituent weight matrix from the portfolio's holdings files."""
+    frames, etfs = [], []
+    for p in portfolio:
+        if not p.holdings_file:
+            continue
+        df = read_holdings(data_dir + p.holdings_file, p.issuer)
+        if df.empty:
+            continue
+        symbols = normalize_tickers(df['Ticker'], df['CountryCode'], ISSUERS[df.attrs['issuer']].ticker_style)
+        frames.append(pd.DataFrame({
+            'row': len(etfs),
+            'key': identity_keys(symbols, df['CountryCode'], df['Name']),
+            'name': df['Name'],
+            'weight': df['Weight'].to_numpy() / 100,
+        }))
+        etfs.append(p.ticker)
+
+    if not frames:
+        empty = np.array([], dtype=int)
+        return WeightMatrix(etfs, np.array([], dtype=object), np.array([], dtype=object), empty, empty, np.array([]))
+
+    entries = pd.concat(frames, ignore_index=True)
+    entries = entries[entries['weight'] != 0]
+    cols, keys = pd.factorize(entries['key'])
+    entries['col'] = cols
+    # a constituent listed twice in one fund (share classes, lines) is one entry
+    summed = entries.groupby(['row', 'col'], sort=False)['weight'].sum()
+    names = entries.drop_duplicates('col').set_index('col')['name'].sort_index()
+    return WeightMatrix(
+        etfs, np.asarray(keys, dtype=object), names.to_numpy(dtype=object),
+        summed.index.get_level_values('row').to_numpy(), summed.index.get_level_values('col').to_numpy(),
+        summed.to_numpy(),
+    )
+
+def _shared_pairs(matrix):
+    # (row_a, row_b, weight_a, weight_b) for every constituent held by both a and b, a < b
+    entries = pd.DataFrame({'row': matrix.rows, 'col': matrix.cols, 'weight': matrix.weights})
+    counts = np.bincount(matrix.cols, minlength=matrix.shape[1])
+    shared = entries[counts[matrix.cols] > 1]
+    pairs = shared.merge(shared, on='col', suffixes=('_a', '_b'))
+    return pairs[pairs['row_a'] < pairs['row_b']]
+
+def overlap_stats(matrix):
+    """Pairwise overlap between the matrix's ETFs.
+
+    Returns a dict of n x n arrays:
+      overlap - sum over shared constituents of the smaller weight, i.e. the
+                fraction of either fund that is held in common (1 on the diagonal)
+      shared  - number of constituents both funds hold
+      cosine  - similarity of the weight vectors, W W^T normalised
+    """
+    n = matrix.shape[0]
+    overlap, shared, gram = np.zeros((n, n)), np.zeros((n, n), dtype=int), np.zeros((n, n))
+
+    # diagonal of W W^T, i.e. each fund's Herfindahl index
+    np.fill_diagonal(gram, np.bincount(matrix.rows, weights=matrix.weights ** 2, minlength=n))
+    np.fill_diagonal(overlap, np.minimum(matrix.row_totals(), 1))
+    np.fill_diagonal(shared, np.bincount(matrix.rows, minlength=n))
+
+    pairs = _shared_pairs(matrix)
+    if not pairs.empty:
+        a, b = pairs['row_a'].to_numpy(), pairs['row_b'].to_numpy()
+        wa, wb = pairs['weight_a'].to_numpy(), pairs['weight_b'].to_numpy()
+        flat = a * n + b
+        for out, values in ((overlap, np.minimum(wa, wb)), (shared, np.ones(len(a), dtype=int)), (gram, wa * wb)):
+            upper = np.bincount(flat, weights=values, minlength=n * n).reshape(n, n).astype(out.dtype)
+            out += upper + upper.T
+
+    norms = np.sqrt(np.diag(gram))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosine = np.nan_to_num(gram / np.outer(norms, norms))
+    return {'overlap': overlap, 'shared': shared, 'cosine': cosine}
+
+def effective_holdings(weights):
+    # inverse Herfindahl index: how many equal-weight holdings give the same concentration
+    weights = np.asarray(weights, dtype=float)
+    total = weights.sum()
+    if total <= 0:
+        return 0.0
+    return 1 / np.sum((weights / total) ** 2)
+
+def concentration(matrix, etf_weights):
+    """Look-through concentration of the portfolio.
+
+    etf_weights maps ETF ticker to its share of the portfolio. Returns the
+    effective number of holdings for each fund and for the whole portfolio,
+    and the portfolio weight in constituents held by more than one fund.
+    """
+    allocation = np.array([etf_weights.get(etf, 0) for etf in matrix.etfs], dtype=float)
+    combined = matrix.dot(allocation)
+    per_etf = {
+        etf: effective_holdings(matrix.weights[matrix.rows == i])
+        for i, etf in enumerate(matrix.etfs)
+    }
+    held_by = np.bincount(matrix.cols[allocation[matrix.rows] > 0], minlength=matrix.shape[1])
+    return {
+        'per_etf': per_etf,
+        'portfolio': effective_holdings(combined),
+        'duplicated_weight': combined[held_by > 1].sum() / combined.sum() if combined.sum() > 0 else 0.0,
+        'weights': combined,
+    }
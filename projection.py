@@ -0,0 +1,65 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+'''
+Monte Carlo projection of portfolio value.
+
+Paths are stepped a month at a time: each month's growth is either a
+bootstrap of TRADING_DAYS_PER_MONTH historical daily returns or a draw from a
+normal fitted to them, then contributions and reinvested dividends are added.
+All paths move together as one numpy array.
+
+Paths are simulated in fixed-size chunks, each with its own seed spawned from
+the caller's seed, so the result for a given seed is the same whether the
+chunks run in this process or across a process pool.
+'''
+
+TRADING_DAYS_PER_MONTH = 21
+PATH_CHUNK = 2500
+PERCENTILES = (5, 25, 50, 75, 95)
+
+def _simulate_chunk(log_returns, start_value, months, paths, method, contribution, dividend_yield, seed):
+    rng = np.random.default_rng(seed)
+    values = np.empty((paths, months + 1))
+    values[:, 0] = start_value
+    mean, std = log_returns.mean(), log_returns.std()
+    monthly_dividend = dividend_yield / 12
+
+    for m in range(1, months + 1):
+        if method == 'bootstrap':
+            draws = rng.integers(0, len(log_returns), (paths, TRADING_DAYS_PER_MONTH))
+            growth = np.exp(log_returns[draws].sum(axis=1))
+        else:
+            growth = np.exp(rng.normal(mean * TRADING_DAYS_PER_MONTH, std * np.sqrt(TRADING_DAYS_PER_MONTH), paths))
+        value = values[:, m - 1] * growth
+        values[:, m] = value * (1 + monthly_dividend) + contribution
+    return values
+
+def project(daily_returns, start_value, years, paths=10000, method='bootstrap',
+            contribution=0, dividend_yield=0, seed=0, workers=0):
+    """Percentile bands of simulated portfolio value, one point per month.
+
+    daily_returns are the portfolio's historical simple daily returns.
+    contribution is added at the end of every month, and dividend_yield
+    (annual, as a fraction) is reinvested monthly. workers > 1 spreads the
+    path chunks over a process pool.
+
+    Returns {percentile: array of months + 1 values} plus 'invested', the
+    start value with contributions added.
+    """
+    log_returns = np.log1p(np.asarray(daily_returns, dtype=float))
+    months = int(years * 12)
+    seeds = np.random.SeedSequence(seed).spawn(-(-paths // PATH_CHUNK))
+    chunks = [min(PATH_CHUNK, paths - i * PATH_CHUNK) for i in range(len(seeds))]
+    args = [(log_returns, start_value, months, n, method, contribution, dividend_yield, s) for n, s in zip(chunks, seeds)]
+
+    if workers > 1 and len(args) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_simulate_chunk, *zip(*args)))
+    else:
+        results = [_simulate_chunk(*a) for a in args]
+
+    values = np.vstack(results)
+    bands = dict(zip(PERCENTILES, np.percentile(values, PERCENTILES, axis=0)))
+    bands['invested'] = start_value + contribution * np.arange(months + 1)
+    return bands
@@ -0,0 +1,182 @@
+import json
+import time
+from datetime import date, datetime, timedelta, time as dtime
+from functools import lru_cache
+from yahooquery import Ticker as Ticker
+from cachelock import atomic_write_json
+
+try:
+    from zoneinfo import ZoneInfo
+    ASX_TZ = ZoneInfo('Australia/Sydney')
+except Exception:
+    # no tz database (e.g. Windows without tzdata) - assume the host runs on Sydney time
+    ASX_TZ = None
+
+# Yahoo's batch quote endpoint takes many symbols per request, so thousands of
+# look-through constituents cost tens of requests rather than thousands.
+# Keep well inside the ~1-2K requests/hr budget for IP-authenticated access.
+QUOTE_BATCH_SIZE = 100
+QUOTE_BATCH_INTERVAL = 1.5   # minimum seconds between batch requests
+QUOTE_TTL = 15 * 60          # seconds before a cached quote is considered stale
+
+# ASX session, with the close pushed past the closing auction so prices are final
+ASX_OPEN = dtime(10, 0)
+ASX_CLOSE = dtime(16, 15)
+OPEN_QUOTE_TTL = 60                      # seconds a quote stays fresh while the ASX trades
+STALE_WHILE_REVALIDATE = 3 * 24 * 60 * 60   # how old an expired quote may be and still be served
+
+def _parse_quote(data):
+    price = data.get('regularMarketPrice')
+    yesterday_price = data.get('regularMarketPreviousClose')
+    if price is None:
+        return None
+    # derive the change from prices - the batch endpoint reports the percent
+    # change in different units to the quoteSummary 'price' module
+    change_pct = (price - yesterday_price) / yesterday_price if yesterday_price else 0
+    return {
+        'price': price,
+        'yesterday_price': yesterday_price,
+        'daily_change_pct': change_pct,
+    }
+
+def fetch_quotes_batched(symbols, batch_size=QUOTE_BATCH_SIZE, min_interval=QUOTE_BATCH_INTERVAL):
+    """Fetch current quotes for symbols in rate-limited batches.
+
+    Returns {symbol: {'price', 'yesterday_price', 'daily_change_pct'}}. Symbols
+    Yahoo does not recognise map to None; symbols from failed batches are left
+    out so they get retried.
+    """
+    quotes = {}
+    last_request = None
+    for i in range(0, len(symbols), batch_size):
+        batch = symbols[i:i + batch_size]
+        if last_request is not None:
+            wait = min_interval - (time.monotonic() - last_request)
+            if wait > 0:
+                time.sleep(wait)
+        last_request = time.monotonic()
+        try:
+            data = Ticker(batch).quotes
+        except Exception as e:
+            print(f"Error fetching quotes for batch {i // batch_size + 1}: {e}")
+            continue
+        if not isinstance(data, dict):
+            print(f"No quote data for batch {i // batch_size + 1}: {data}")
+            continue
+        for symbol in batch:
+            quote = data.get(symbol)
+            quotes[symbol] = _parse_quote(quote) if isinstance(quote, dict) else None
+    return quotes
+
+class QuoteCache:
+    """Per-symbol quote cache persisted as JSON, entries expire after ttl seconds.
+
+    Symbols Yahoo could not resolve are cached as None so they are not retried
+    on every refresh.
+    """
+
+    def __init__(self, path, ttl=QUOTE_TTL, fetch=fetch_quotes_batched):
+        self.path = path
+        self.ttl = ttl
+        self.fetch = fetch
+        self.entries = self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save(self):
+        atomic_write_json(self.path, self.entries)
+
+    def is_fresh(self, symbol, now=None):
+        entry = self.entries.get(symbol)
+        if entry is None:
+            return False
+        now = time.time() if now is None else now
+        return now - entry.get('fetched', 0) < self.ttl
+
+    def get_many(self, symbols):
+        """Return {symbol: quote or None}, fetching only missing or stale symbols."""
+        symbols = sorted(set(symbols))
+        now = time.time()
+        stale = [s for s in symbols if not self.is_fresh(s, now)]
+        if stale:
+            print(f"Fetching {len(stale)} of {len(symbols)} quotes ({len(symbols) - len(stale)} cached)")
+            fetched = self.fetch(stale)
+            fetched_at = time.time()
+            for s, quote in fetched.items():
+                self.entries[s] = {'fetched': fetched_at, 'quote': quote}
+            self.save()
+        return {s: self.entries[s]['quote'] for s in symbols if s in self.entries}
+
+def _easter_sunday(year):
+    # anonymous Gregorian algorithm
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _next_weekday(d):
+    while d.weekday() >= 5:
+        d += timedelta(days=1)
+    return d
+
+@lru_cache(maxsize=None)
+def asx_holidays(year):
+    """ASX non-trading weekdays for a year."""
+    easter = _easter_sunday(year)
+    june_first = date(year, 6, 1)
+    kings_birthday = june_first + timedelta(days=(7 - june_first.weekday()) % 7 + 7)
+    holidays = {
+        _next_weekday(date(year, 1, 1)),
+        _next_weekday(date(year, 1, 26)),
+        easter - timedelta(days=2),
+        easter + timedelta(days=1),
+        date(year, 4, 25),          # Anzac Day is not moved when it falls on a weekend
+        kings_birthday,
+    }
+    christmas = _next_weekday(date(year, 12, 25))
+    holidays.add(christmas)
+    holidays.add(_next_weekday(max(date(year, 12, 26), christmas + timedelta(days=1))))
+    return frozenset(holidays)
+
+def is_trading_day(d):
+    return d.weekday() < 5 and d not in asx_holidays(d.year)
+
+def asx_now():
+    return datetime.now(ASX_TZ)
+
+def market_is_open(now=None):
+    now = now or asx_now()
+    return is_trading_day(now.date()) and ASX_OPEN <= now.time() < ASX_CLOSE
+
+def next_market_open(now=None):
+    now = now or asx_now()
+    d = now.date()
+    if now.time() >= ASX_OPEN or not is_trading_day(d):
+        d += timedelta(days=1)
+        while not is_trading_day(d):
+            d += timedelta(days=1)
+    return datetime.combine(d, ASX_OPEN, tzinfo=now.tzinfo)
+
+def quote_expiry(fetched_at):
+    """Epoch time after which a quote fetched at fetched_at may have changed.
+
+    While the ASX trades that is OPEN_QUOTE_TTL later; a quote taken while it
+    is closed (nights, weekends, public holidays) holds until the next open.
+    """
+    fetched = datetime.fromtimestamp(fetched_at, ASX_TZ)
+    if market_is_open(fetched):
+        return fetched_at + OPEN_QUOTE_TTL
+    return next_market_open(fetched).timestamp()
+
+def quote_is_fresh(fetched_at, now=None):
+    return (time.time() if now is None else now) < quote_expiry(fetched_at)
@@ -0,0 +1,155 @@
+import math
+from bisect import bisect_right
+from cachelock import FileLock, atomic_write_json, read_json, read_json_snapshot
+from quotes import ASX_CLOSE, asx_now
+
+'''
+Rolling volatility, return and beta, maintained incrementally.
+
+For each ticker and window the state keeps the last `window` daily log
+returns (paired with the benchmark's) and windowed running moments: a
+Welford mean/M2 for variance, and plain sums for the return and the beta
+regression. Each new close adds one return and retires the one leaving the
+window, so a refresh costs O(1) per new day; the results are appended to
+stored series, so rendering only reads them.
+
+Only final closes are folded in - a date that is still trading today may be
+revised by the next fetch. If an already-processed close changes, or earlier
+history is backfilled, that ticker's state is rebuilt from the cache.
+'''
+
+WINDOWS = (30, 90, 250)
+TRADING_DAYS = 252
+
+def is_final(d, now=None):
+    # closes before today's ASX session ends can still change
+    now = now or asx_now()
+    today = now.date().isoformat()
+    return d < today or (d == today and now.time() >= ASX_CLOSE)
+
+def _new_window():
+    return {'n': 0, 'mean': 0.0, 'm2': 0.0, 'sum': 0.0,
+            'pairs': 0, 'sx': 0.0, 'sy': 0.0, 'sxy': 0.0, 'sxx': 0.0}
+
+def _add(w, r, b):
+    w['n'] += 1
+    delta = r - w['mean']
+    w['mean'] += delta / w['n']
+    w['m2'] += delta * (r - w['mean'])
+    w['sum'] += r
+    if b is not None:
+        w['pairs'] += 1
+        w['sx'] += b
+        w['sy'] += r
+        w['sxy'] += b * r
+        w['sxx'] += b * b
+
+def _remove(w, r, b):
+    w['n'] -= 1
+    if w['n'] == 0:
+        w['mean'] = w['m2'] = w['sum'] = 0.0
+    else:
+        delta = r - w['mean']
+        w['mean'] -= delta / w['n']
+        w['m2'] = max(w['m2'] - delta * (r - w['mean']), 0.0)
+        w['sum'] -= r
+    if b is not None:
+        w['pairs'] -= 1
+        w['sx'] -= b
+        w['sy'] -= r
+        w['sxy'] -= b * r
+        w['sxx'] -= b * b
+
+def _values(w):
+    volatility = math.sqrt(w['m2'] / (w['n'] - 1) * TRADING_DAYS) if w['n'] > 1 else None
+    beta = None
+    if w['pairs'] > 1:
+        var = w['sxx'] - w['sx'] ** 2 / w['pairs']
+        if var > 1e-12:
+            beta = (w['sxy'] - w['sx'] * w['sy'] / w['pairs']) / var
+    return volatility, math.exp(w['sum']) - 1, beta
+
+def _new_state():
+    return {
+        'last_date': None, 'last_close': None, 'count': 0, 'returns': [],
+        'windows': {str(n): _new_window() for n in WINDOWS},
+        'series': {str(n): {'dates': [], 'volatility': [], 'return': [], 'beta': []} for n in WINDOWS},
+    }
+
+def _advance(state, d, close, bench_return):
+    # fold one new close into a ticker's state
+    if state['last_close']:
+        r = math.log(close / state['last_close'])
+        state['returns'].append([r, bench_return])
+        for n in WINDOWS:
+            w = state['windows'][str(n)]
+            _add(w, r, bench_return)
+            if w['n'] > n:
+                _remove(w, *state['returns'][-n - 1])
+            if w['n'] == n:
+                series = state['series'][str(n)]
+                vol, ret, beta = _values(w)
+                series['dates'].append(d)
+                series['volatility'].append(vol)
+                series['return'].append(ret)
+                series['beta'].append(beta)
+        del state['returns'][:-max(WINDOWS)]
+    state['last_date'], state['last_close'] = d, close
+    state['count'] += 1
+
+class RollingStats:
+    """Persisted rolling statistics for a set of tickers against one benchmark."""
+
+    def __init__(self, path, benchmark):
+        self.path = path
+        self.benchmark = benchmark
+
+    def load(self):
+        return read_json_snapshot(self.path)
+
+    def series(self, ticker, window):
+        return self.load().get('tickers', {}).get(ticker, {}).get('series', {}).get(str(window))
+
+    def _benchmark_returns(self, cache, now):
+        closes = cache.get(self.benchmark, {})
+        dates = sorted(d for d in closes if is_final(d, now))
+        return {d: math.log(closes[d] / closes[p]) for p, d in zip(dates, dates[1:]) if closes[p]}
+
+    def update(self, cache, tickers, now=None):
+        """Fold closes added to the history cache since the last update.
+
+        Returns the number of (ticker, day) updates made.
+        """
+        with FileLock(self.path):
+            stored = read_json(self.path)
+            bench = self._benchmark_returns(cache, now)
+            bench_dates = sorted(bench)
+            last = stored.get('benchmark_last')
+            seen = bisect_right(bench_dates, last) if last else len(bench_dates)
+            # betas pair each return with the benchmark's, so any change to its past resets everything
+            if stored.get('benchmark') != self.benchmark or seen != stored.get('benchmark_count', 0):
+                stored = {'benchmark': self.benchmark, 'tickers': {}}
+            stored['benchmark_last'] = bench_dates[-1] if bench_dates else None
+            stored['benchmark_count'] = len(bench_dates)
+            updated = 0
+            for ticker in tickers:
+                closes = cache.get(ticker, {})
+                dates = sorted(d for d in closes if len(d) == 10 and is_final(d, now))
+                if bench_dates:
+                    # wait for the benchmark's close so every return has its pair
+                    dates = dates[:bisect_right(dates, bench_dates[-1])]
+                state = stored['tickers'].get(ticker)
+                if state and state['last_date']:
+                    # backfilled history or a revised close: start this ticker again
+                    revised = closes.get(state['last_date']) != state['last_close']
+                    if revised or bisect_right(dates, state['last_date']) != state['count']:
+                        state = None
+                if not state:
+                    state = stored['tickers'][ticker] = _new_state()
+                start = state['count']
+                for d in dates[start:]:
+                    _advance(state, d, closes[d], bench.get(d))
+                updated += len(dates) - start
+            if updated:
+                atomic_write_json(self.path, stored)
+        return updated
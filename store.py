@@ -0,0 +1,98 @@
+import json
+import os
+import time
+from dataclasses import dataclass
+from cachelock import FileLock, atomic_write_json, read_json, read_json_snapshot
+
+'''
+Shared store for computed portfolio state.
+
+Each refresh publishes a complete snapshot under a new version number, unless
+nothing in it changed; readers only ever see whole snapshots. The default backend
+is a JSON file in the data directory, which every worker on the host (or on any
+host sharing the data mount) can read.
+Set PORTDASH_REDIS_URL to use a Redis-compatible server instead.
+'''
+
+@dataclass(frozen=True)
+class PortfolioSnapshot:
+    version: int
+    created: float
+    holdings: tuple     # one dict per Holding, as produced by dataclasses.asdict
+    summary: dict
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['version'], data['created'], tuple(data['holdings']), data['summary'])
+
+    def to_json(self):
+        return {'version': self.version, 'created': self.created,
+                'holdings': list(self.holdings), 'summary': self.summary}
+
+def _unchanged(snap, holdings, summary):
+    # republishing identical state would only bump the version and invalidate everything derived from it
+    return snap.holdings == tuple(holdings) and snap.summary == summary
+
+class FileSnapshotStore:
+    def __init__(self, path):
+        self.path = path
+
+    def publish(self, holdings, summary):
+        with FileLock(self.path):
+            data = read_json(self.path)
+            if data and _unchanged(PortfolioSnapshot.from_json(data), holdings, summary):
+                return PortfolioSnapshot.from_json(data)
+            version = data.get('version', 0) + 1
+            snap = PortfolioSnapshot(version, time.time(), tuple(holdings), summary)
+            atomic_write_json(self.path, snap.to_json())
+        return snap
+
+    def latest(self):
+        data = read_json_snapshot(self.path)
+        return PortfolioSnapshot.from_json(data) if data else None
+
+class RedisSnapshotStore:
+    # publish only replaces the stored snapshot if it is newer, so racing publishers can't go backwards
+    PUBLISH_SCRIPT = """
+    local current = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+    if tonumber(ARGV[1]) > current then
+        redis.call('HSET', KEYS[1], 'version', ARGV[1], 'data', ARGV[2])
+    end
+    return current
+    """
+
+    def __init__(self, url, key='portdash:portfolio'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+        self.publish_script = self.client.register_script(self.PUBLISH_SCRIPT)
+        self.cached = None
+
+    def publish(self, holdings, summary):
+        latest = self.latest()
+        if latest and _unchanged(latest, holdings, summary):
+            return latest
+        version = self.client.incr(self.key + ':version')
+        snap = PortfolioSnapshot(version, time.time(), tuple(holdings), summary)
+        self.publish_script(keys=[self.key], args=[version, json.dumps(snap.to_json())])
+        return snap
+
+    def latest(self):
+        # the version alone is enough to reuse the cached snapshot; a new one is
+        # read with its version in one HMGET so a publish in between can't split them
+        version = self.client.hget(self.key, 'version')
+        if version is None:
+            return None
+        if self.cached and self.cached.version == int(version):
+            return self.cached
+        version, data = self.client.hmget(self.key, 'version', 'data')
+        if version is None or not data:
+            return None
+        self.cached = PortfolioSnapshot.from_json(json.loads(data))
+        return self.cached
+
+def open_store(data_dir):
+    url = os.environ.get('PORTDASH_REDIS_URL')
+    if url:
+        return RedisSnapshotStore(url)
+    return FileSnapshotStore(data_dir + 'portfolio_snapshot.json')
@@ -0,0 +1,202 @@
+import base64
+import csv
+import importlib
+import json
+import math
+import os
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import plotly.graph_objects as go
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from figures import array, figure, hline, vline, scatter, TYPED_ARRAY_MIN
+
+'''
+The plain-dict figures must be exactly what plotly itself would send: every
+make_* builder is rendered from a fixed portfolio and compared, with base64
+typed arrays decoded, against go.Figure(...).to_plotly_json().
+'''
+
+ETFS = {
+    # ticker: (issuer, holdings rows as (ticker, name, sector, country, weight %))
+    'A200.AX': ('betashares', [('BHP AU', 'BHP GROUP LTD', 'Materials', 'Australia', 10.5),
+                               ('CBA AU', 'COMMONWEALTH BANK', 'Banks', 'Australia', 9.25),
+                               ('CSL AU', 'CSL LTD', 'Health Care', 'Australia', 6.0)]),
+    'BGBL.AX': ('betashares', [('AAPL UW', 'APPLE INC', 'Information Technology', 'United States', 5.0),
+                               ('MSFT UW', 'MICROSOFT CORP', 'Information Technology', 'United States', 4.5),
+                               ('BHP AU', 'BHP GROUP LTD', 'Materials', 'Australia', 0.5)]),
+    'VGE.AX': ('vanguard', [('TSM', 'Taiwan Semiconductor', 'Information Technology', 'TW', 8.1),
+                            ('INFY', 'Infosys Ltd', 'Information Technology', 'IN', 1.25),
+                            ('VALE3', 'Vale SA', 'Materials', 'BR', 0.75)]),
+}
+BENCHMARK_SYMBOLS = ['^AXJO', '^AXJT', 'VAF.AX']
+
+def _write_holdings(path, issuer, rows):
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f)
+        if issuer == 'betashares':
+            w.writerow(['Ticker', 'Name', 'Asset Class', 'Sector', 'Country', 'Weight (%)'])
+            w.writerows([t, n, 'Equity', s, c, wt] for t, n, s, c, wt in rows)
+        else:
+            w.writerow(['Holding Name', 'Ticker', 'Sector', 'Country code', '% of net assets'])
+            w.writerows([n, t, s, c, f'{wt}%'] for t, n, s, c, wt in rows)
+
+def _write_fixture(data_dir):
+    rng = np.random.default_rng(7)
+    end = date.today()
+    days = [end - timedelta(days=i) for i in range(420)][::-1]
+    days = [d.isoformat() for d in days if d.weekday() < 5]
+
+    history = {'_meta': {'fetch_chunks_done': 10}, '_columns': {'adjclose': {}}}
+    for symbol in list(ETFS) + BENCHMARK_SYMBOLS:
+        closes = 100 * np.cumprod(1 + rng.normal(0.0003, 0.01, len(days)))
+        history[symbol] = dict(zip(days, closes.round(4).tolist()))
+        history['_columns']['adjclose'][symbol] = dict(zip(days, (closes * np.linspace(1, 1.04, len(days))).round(4).tolist()))
+    (data_dir / 'history_cache.json').write_text(json.dumps(history))
+
+    (data_dir / 'holdings').mkdir()
+    with open(data_dir / 'etf_config.csv', 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(['Ticker', 'Issuer', 'HoldingsFile'])
+        for ticker, (issuer, rows) in ETFS.items():
+            name = f"holdings/{ticker.split('.')[0]}.csv"
+            w.writerow([ticker, issuer, name])
+            _write_holdings(data_dir / name, issuer, rows)
+
+    with open(data_dir / 'purchases.csv', 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(['Symbol', 'Closing Time', 'Qty', 'Side', 'Total'])
+        for i, d in enumerate(days[5::40]):
+            ticker = list(ETFS)[i % len(ETFS)].split('.')[0]
+            w.writerow([ticker, date.fromisoformat(d).strftime('%d/%m/%Y'), 20 + i, 'Buy', f'${(20 + i) * 100:,.2f}'])
+
+    with open(data_dir / 'dividends.csv', 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(['Date', 'Ticker', 'Amount'])
+        for i, d in enumerate(days[60::60]):
+            w.writerow([d, list(ETFS)[i % len(ETFS)].split('.')[0], 50 + 10 * i])
+
+    prices = {t: {'daily_change_pct': 0.4 - 0.3 * i, 'daily_change_val': 12.5 - 9 * i, 'current_value': 5000 + 1500 * i}
+              for i, t in enumerate(ETFS)}
+    (data_dir / 'price_cache.json').write_text(json.dumps(prices))
+
+@pytest.fixture(scope='module')
+def dashboard(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp('portdash')
+    _write_fixture(data_dir)
+    saved = os.environ.get('PORTDASH_DATA')
+    os.environ['PORTDASH_DATA'] = str(data_dir)
+    sys.modules.pop('dashtest', None)
+    try:
+        dashtest = importlib.import_module('dashtest')
+    finally:
+        if saved is None:
+            os.environ.pop('PORTDASH_DATA')
+        else:
+            os.environ['PORTDASH_DATA'] = saved
+    state = dashtest.use_latest_portfolio()
+    # as a history refresh would, so the rolling panels have series to read
+    dashtest.rolling_stats.update(dashtest.load_history_cache(), dashtest.rolling_tickers(state.holdings))
+
+    # fresh constituent quotes, so the look-through never goes to Yahoo
+    symbols = dashtest.flow.get('lookthrough_index', state=state)['Symbol'].unique()
+    quotes = {s: {'fetched': time.time(), 'quote': {'daily_change_pct': 0.01 * (i % 5 - 2)}} for i, s in enumerate(symbols)}
+    Path(dashtest.get_constituent_cache_path()).write_text(json.dumps(quotes))
+    return dashtest, state
+
+def _decoded(value):
+    # typed arrays back to plain lists, so dict and plotly output compare element by element
+    if isinstance(value, dict):
+        if set(value) >= {'dtype', 'bdata'}:
+            return np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype']).tolist()
+        return {k: _decoded(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_decoded(v) for v in value]
+    return value
+
+def _assert_same(ours, plotly, path='figure'):
+    if isinstance(ours, dict):
+        assert isinstance(plotly, dict), path
+        assert set(ours) == set(plotly), f"{path}: {set(ours) ^ set(plotly)}"
+        for k in ours:
+            _assert_same(ours[k], plotly[k], f'{path}.{k}')
+    elif isinstance(ours, list):
+        assert isinstance(plotly, list) and len(ours) == len(plotly), path
+        for i, (a, b) in enumerate(zip(ours, plotly)):
+            _assert_same(a, b, f'{path}[{i}]')
+    elif isinstance(ours, float) or isinstance(plotly, float):
+        assert ours is not None and plotly is not None, path
+        assert math.isclose(ours, plotly, rel_tol=1e-9, abs_tol=1e-12) or (math.isnan(ours) and math.isnan(plotly)), path
+    else:
+        assert ours == plotly, path
+
+def test_figures_match_plotly(dashboard):
+    dashtest, state = dashboard
+    for mode, (maker, _) in dashtest.FIGURES.items():
+        fig = maker(state)
+        assert isinstance(fig, dict) and set(fig) == {'data', 'layout'}, mode
+        # go.Figure validates every property, and raises on anything plotly doesn't know
+        expected = go.Figure(fig).to_plotly_json()
+        _assert_same(_decoded(json.loads(json.dumps(fig))), _decoded(json.loads(json.dumps(expected, default=list))), mode)
+
+def test_array_encoding_round_trips():
+    short = [0.1234567891, 2, None]
+    assert array(short) == [0.123457, 2, None]
+
+    values = np.linspace(-1, 1, TYPED_ARRAY_MIN) ** 3
+    encoded = array(values)
+    assert encoded['dtype'] == 'f8'
+    assert _decoded(encoded) == values.tolist()
+    # a gap keeps the array a plain list, so plotly still sees the missing point
+    assert isinstance(array(values.tolist()[:-1] + [None]), list)
+
+def test_fixture_fills_the_graphs(dashboard):
+    # the comparison is only as good as what the fixture draws
+    dashtest, state = dashboard
+    empty = [mode for mode, (maker, _) in dashtest.FIGURES.items() if not maker(state)['data']]
+    assert empty == []
+
+def test_backtest_without_purchase_totals(dashboard):
+    # load_purchases allows a ledger with no Total column; purchases are then valued at the close
+    dashtest, state = dashboard
+    path = Path(dashtest.DATA_DIR) / 'purchases.csv'
+    original = path.read_text()
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    try:
+        with open(path, 'w', newline='') as f:
+            w = csv.DictWriter(f, ['Symbol', 'Closing Time', 'Qty', 'Side'], extrasaction='ignore')
+            w.writeheader()
+            w.writerows(rows)
+        fig = dashtest.make_backtest_graph(state)
+        names = [trace['name'] for trace in fig['data']]
+        assert any(name.startswith('Fixed monthly DCA') for name in names)
+        go.Figure(fig)
+    finally:
+        path.write_text(original)
+
+def test_lines_match_plotly_shapes():
+    fig = go.Figure(scatter(['2025-01-01', '2025-01-02'], [1, 2]))
+    fig.add_hline(y=100, line=dict(color='#555', width=1, dash='dash'))
+    fig.add_vline(x='2025-01-02', line=dict(color='white'))
+    ours = figure([scatter(['2025-01-01', '2025-01-02'], [1, 2])],
+                  shapes=[hline(100, color='#555', width=1, dash='dash'), vline('2025-01-02', color='white')])
+    _assert_same(_decoded(ours['layout']['shapes']), _decoded(fig.to_plotly_json()['layout']['shapes']))
+
+def test_position_point_queries_match_ranges(dashboard):
+    # holdings use the bisect lookups, the graphs the range walk; both must agree
+    dashtest, state = dashboard
+    positions = dashtest.get_position_index()
+    dates = sorted({t['date'] for t in positions.ledger} | {'2000-01-01', date.today().isoformat()})
+    for ticker in ETFS:
+        assert [positions.units_at(ticker, d) for d in dates] == positions.units_over(ticker, dates)
+        assert [positions.cost_at(ticker, d) for d in dates] == positions.cost_over(ticker, dates)
+    by_ticker = {etf.ticker: etf for etf in state.holdings}
+    for ticker in ETFS:
+        assert by_ticker[ticker].units == int(round(positions.units_over(ticker, dates)[-1]))